@@ -0,0 +1,124 @@
+"""Compiled alias expander.
+
+An alias is expanded where its key is the command word of a segment: at the
+start of the line or after one of ;, &&, || and |, the whitespace in between
+being folded into a single space. Aliases apply in their configured order, so
+an alias also expands inside the value of an earlier alias, but never inside
+its own value: 'ls = ls --color' does not loop.
+
+AliasExpander resolves that order once, when it is compiled: the value of
+each alias is stored already expanded with the aliases that follow it. A line
+is then expanded in a single scan over its command positions, each command
+word being looked up in a dict, instead of searching the whole line again for
+every alias and after every substitution. CheckConfig compiles the expander
+of the configured aliases when the configuration is loaded, and for_conf()
+returns it from conf.
+"""
+
+import re
+from functools import lru_cache
+
+
+# a command word: at the line start or after an operator, and followed by a
+# separator or the line end
+_COMMAND_WORD = re.compile(r"(^|;|&&|\|\||\|)(\s*)([^\s;&|]+)(?=[ ;&|]|$)")
+# keys that are not a single word, and blank values or values ending with an
+# operator (which make the next word a command word), are left to the legacy
+# expansion
+_NOT_A_WORD = re.compile(r"[\s;&|]")
+_OPEN_END = re.compile(r"[;&|]\s*\Z|\n\Z")
+_CACHE_SIZE = 32
+# conf key holding (aliases, size, expander) of the configured aliases
+EXPANDER_KEY = "_alias_expander"
+
+
+class AliasExpander:
+    """Single pass expansion of an ordered alias mapping."""
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, aliases):
+        # alias key -> its position in the configured order
+        self._index = {key: index for index, key in enumerate(aliases)}
+        self._values = list(aliases.values())
+        # the values of the last aliases are expanded first
+        for index in range(len(self._values) - 1, -1, -1):
+            self._values[index] = self._expand(
+                self._values[index], index + 1, nested=True
+            )
+
+    @staticmethod
+    def supports(aliases):
+        """True when the aliases can be expanded in a single pass."""
+        for key, value in aliases.items():
+            if not isinstance(key, str) or not isinstance(value, str):
+                return False
+            if not key or _NOT_A_WORD.search(key):
+                return False
+            if not value.strip() or _OPEN_END.search(value):
+                return False
+        return True
+
+    def _expand(self, text, first, nested=False):
+        """Expand the aliases from position 'first' on in text.
+
+        Nested text is an alias value: it already follows a command position
+        and its own leading command word is replaced without adding a space.
+        """
+        parts = []
+        position = 0
+        for match in _COMMAND_WORD.finditer(text):
+            index = self._index.get(match.group(3))
+            if index is None or index < first:
+                continue
+            before = match.group(1)
+            parts.append(text[position : match.start()])
+            if nested and not before:
+                parts.append(self._values[index])
+            else:
+                parts.append(f"{before} {self._values[index]}")
+            position = match.end()
+        if not parts:
+            return text
+        parts.append(text[position:])
+        return "".join(parts)
+
+    def expand(self, line):
+        """Return line with its aliases expanded."""
+        return self._expand(line, 0).replace(";;", ";")
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _compile(items):
+    aliases = dict(items)
+    if not AliasExpander.supports(aliases):
+        return None
+    return AliasExpander(aliases)
+
+
+def compile_aliases(aliases):
+    """Return the AliasExpander of aliases, or None when the aliases need the
+    legacy expansion. Expanders are shared by alias mappings with the same
+    items.
+    """
+    try:
+        return _compile(tuple(aliases.items()))
+    except TypeError:
+        # unhashable values
+        return None
+
+
+def for_conf(conf):
+    """Return the expander of conf["aliases"] (see compile_aliases),
+    compiling it when missing or stale.
+    """
+    alias_map = conf["aliases"]
+    compiled = conf.get(EXPANDER_KEY)
+    if (
+        compiled is None
+        or compiled[0] is not alias_map
+        or compiled[1] != len(alias_map)
+    ):
+        compiled = (alias_map, len(alias_map), compile_aliases(alias_map))
+        conf[EXPANDER_KEY] = compiled
+    return compiled[2]
@@ -5,6 +5,8 @@ import logging
 import os
 from datetime import datetime, timezone
 
+from lshell import decisioncache
+
 
 ECS_VERSION = "8.11.0"
 LAST_REASON_KEY = "_last_security_decision_reason"
@@ -82,6 +84,9 @@ class EcsJsonFormatter(logging.Formatter):
         allowed = getattr(record, "lshell_security_allowed", None)
         if allowed is not None:
             payload["lshell.security.allowed"] = bool(allowed)
+        decision_cache = getattr(record, "lshell_decision_cache", None)
+        if decision_cache:
+            payload["lshell.decision_cache"] = decision_cache
 
         return json.dumps(payload, sort_keys=True)
 
@@ -106,6 +111,7 @@ def log_command_event(conf, command, allowed, reason, level=None):
         command=command,
         level=level,
         message="lshell command authorization decision",
+        decision_cache=decisioncache.stats(conf),
     )
 
 
@@ -117,28 +123,30 @@ def log_security_event(
     command="",
     level=None,
     message="lshell security decision",
+    decision_cache=None,
 ):
-    """Emit one ECS-aligned runtime security event."""
+    """Emit one ECS-aligned runtime security event, with the statistics of
+    the decision cache when it is enabled.
+    """
     if not enabled(conf):
         return
 
     logger = conf["logpath"]
     log_method = str(level or ("info" if allowed else "warning")).lower()
     log_level = getattr(logging, log_method.upper(), logging.INFO)
-    logger.log(
-        log_level,
-        message,
-        extra={
-            "session_id": str(conf.get("session_id", "")),
-            "source_ip": _source_ip(),
-            "username": str(conf.get("username", "")),
-            "event_kind": "event",
-            "event_category": ["authentication", "process"],
-            "event_type": ["access"],
-            "event_action": str(action),
-            "event_outcome": "success" if allowed else "failure",
-            "event_reason": str(reason),
-            "process_command_line": str(command or ""),
-            "lshell_security_allowed": bool(allowed),
-        },
-    )
+    extra = {
+        "session_id": str(conf.get("session_id", "")),
+        "source_ip": _source_ip(),
+        "username": str(conf.get("username", "")),
+        "event_kind": "event",
+        "event_category": ["authentication", "process"],
+        "event_type": ["access"],
+        "event_action": str(action),
+        "event_outcome": "success" if allowed else "failure",
+        "event_reason": str(reason),
+        "process_command_line": str(command or ""),
+        "lshell_security_allowed": bool(allowed),
+    }
+    if decision_cache is not None:
+        extra["lshell_decision_cache"] = decision_cache
+    logger.log(log_level, message, extra=extra)
@@ -0,0 +1,79 @@
+"""Compiled index of the 'allowed' command list.
+
+Authorization checks ask whether a command, or a full command line, is an
+entry of conf["allowed"]. That list holds thousands of entries with
+``allowed: 'all'``, and each pipeline segment is checked more than once. The
+index answers the same exact-membership question in constant time:
+
+- entries without a space (bare executables) go into a frozenset;
+- entries with arguments (e.g. 'echo hello') go into a dict keyed by their
+  executable, so a command line is only compared with entries starting with
+  the same word.
+"""
+
+
+INDEX_KEY = "_allowed_index"
+
+
+class AuthorizationIndex:
+    """Exact-membership index of a list of allowed commands."""
+
+    __slots__ = ("source", "size", "executables", "full_commands")
+
+    def __init__(self, entries):
+        self.source = entries
+        self.size = len(entries)
+        executables = set()
+        full_commands = {}
+        for entry in entries:
+            if not isinstance(entry, str):
+                executables.add(entry)
+                continue
+            executable, separator, _ = entry.partition(" ")
+            if separator:
+                full_commands.setdefault(executable, set()).add(entry)
+            else:
+                executables.add(entry)
+        self.executables = frozenset(executables)
+        self.full_commands = {
+            executable: frozenset(commands)
+            for executable, commands in full_commands.items()
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, AuthorizationIndex):
+            return NotImplemented
+        return (self.executables, self.full_commands) == (
+            other.executables,
+            other.full_commands,
+        )
+
+    __hash__ = None
+
+    def __contains__(self, command):
+        executable, separator, _ = command.partition(" ")
+        if not separator:
+            return command in self.executables
+        commands = self.full_commands.get(executable)
+        return commands is not None and command in commands
+
+    def matches(self, entries):
+        """True when the index was compiled from entries, as they are now."""
+        return entries is self.source and len(entries) == self.size
+
+    def permits(self, command, full_command):
+        """True when the command or the full command line is allowed."""
+        return full_command in self or command in self
+
+
+def for_conf(conf):
+    """Return the index of conf["allowed"], compiling it when missing or stale.
+
+    The index is kept in conf, and compiled again whenever conf["allowed"] was
+    replaced or extended since (e.g. with the overssh list over SSH).
+    """
+    index = conf.get(INDEX_KEY)
+    if index is None or not index.matches(conf["allowed"]):
+        index = AuthorizationIndex(conf["allowed"])
+        conf[INDEX_KEY] = index
+    return index
@@ -4,17 +4,19 @@ import glob
 import sys
 import os
 import re
-import shlex
-import readline
 import signal
 
 # import lshell specifics
+from lshell import decisioncache
+from lshell import fsmemo
+from lshell import jobtable
+from lshell import lexer
 from lshell import variables
 from lshell import utils
 
 
 # Store background jobs
-BACKGROUND_JOBS = []
+BACKGROUND_JOBS = jobtable.JobTable()
 
 POLICY_COMMANDS = [
     "policy-show",
@@ -45,7 +47,7 @@ builtins_list = [
 
 
 def _cancel_job_timeout(job):
-    """Cancel a watchdog timer attached to a background job, if any."""
+    """Cancel the command_timeout deadline of a background job, if any."""
     timer = getattr(job, "lshell_timeout_timer", None)
     if timer is not None:
         timer.cancel()
@@ -100,6 +102,9 @@ def cmd_lsudo(conf):
 
 def cmd_history(conf, log):
     """print the commands history"""
+    # pylint: disable-next=import-outside-toplevel
+    import readline
+
     try:
         try:
             readline.write_history_file(conf["history_file"])
@@ -123,10 +128,10 @@ def cmd_history(conf, log):
 
 def cmd_export(args):
     """export environment variables"""
-    try:
-        tokens = shlex.split(args, posix=True)
-    except ValueError:
+    segment = lexer.parse_segment(args)
+    if segment.error:
         return 0, None
+    tokens = segment.values
 
     if len(tokens) >= 2 and "=" in tokens[1]:
         var, value = tokens[1].split("=", 1)
@@ -137,10 +142,15 @@ def cmd_export(args):
     return 0, None
 
 
+def env_file_path(envfile):
+    """Return the path of an environment file as given in the configuration"""
+    envfile = envfile.strip().strip("'").strip('"')
+    return os.path.expanduser(os.path.expandvars(envfile))
+
+
 def cmd_source(envfile):
     """Source a file in the current shell context"""
-    envfile = envfile.strip().strip("'").strip('"')
-    envfile = os.path.expanduser(os.path.expandvars(envfile))
+    envfile = env_file_path(envfile)
     try:
         with open(envfile, encoding="utf-8") as env_vars:
             for env_var in env_vars.readlines():
@@ -171,7 +181,7 @@ def cmd_cd(directory, conf):
             wilddir = []
             # filter to only directories
             for item in wildall:
-                if os.path.isdir(item):
+                if fsmemo.isdir(item):
                     wilddir.append(item)
             # sort results
             wilddir.sort()
@@ -187,26 +197,24 @@ def cmd_cd(directory, conf):
 
         # change directory
         try:
-            os.chdir(os.path.realpath(directory))
+            fsmemo.chdir(fsmemo.realpath(directory))
+            decisioncache.invalidate(conf)
             conf["promptprint"] = utils.updateprompt(os.getcwd(), conf)
         except OSError as excp:
             sys.stdout.write(f"lshell: {directory}: {excp.strerror}\n")
             return excp.errno, conf
     else:
-        os.chdir(conf["home_path"])
+        fsmemo.chdir(conf["home_path"])
+        decisioncache.invalidate(conf)
         conf["promptprint"] = utils.updateprompt(os.getcwd(), conf)
 
     return 0, conf
 
 
 def check_background_jobs():
-    """Check the status of background jobs and print a completion message if done."""
-    active_jobs = []
-    for idx, job in enumerate(BACKGROUND_JOBS, start=1):
-        if job.poll() is None:
-            active_jobs.append(job)
-            continue
-
+    """Print the completion messages of the background jobs that finished."""
+    BACKGROUND_JOBS.collect()
+    for idx, job in BACKGROUND_JOBS.notices():
         _cancel_job_timeout(job)
         if getattr(job, "lshell_timeout_triggered", False):
             print(f"[{idx}]+  Timed Out               {_job_command(job)}")
@@ -218,8 +226,6 @@ def check_background_jobs():
         if job.returncode != -2:
             print(f"[{idx}]+  {status}                    {args}")
 
-    BACKGROUND_JOBS[:] = active_jobs
-
 
 def get_job_status(job):
     """Return the status of a background job."""
@@ -240,22 +246,14 @@ def _job_command(job):
 
 
 def jobs():
-    """Return a list of background jobs."""
-    joblist = []
-    active_jobs = []
-    for job in BACKGROUND_JOBS:
-        if job.poll() is not None:
-            _cancel_job_timeout(job)
-            continue
-
-        active_jobs.append(job)
-        idx = len(active_jobs)
-        status = get_job_status(job)
-        cmd = _job_command(job)
-        joblist.append([idx, status, cmd])
-
-    BACKGROUND_JOBS[:] = active_jobs
-    return joblist
+    """Return the [job ID, status, command] of the background jobs; the
+    finished ones are reported at the next prompt.
+    """
+    BACKGROUND_JOBS.collect()
+    return [
+        [idx, get_job_status(job), _job_command(job)]
+        for idx, job in BACKGROUND_JOBS.items()
+    ]
 
 
 def cmd_jobs():
@@ -296,14 +294,13 @@ def cmd_bg_fg(job_type, job_id):
             return 1
     else:
         # Use the last job if no specific job_id is provided
-        if BACKGROUND_JOBS:
-            job_id = len(BACKGROUND_JOBS)
-        else:
+        job_id = BACKGROUND_JOBS.current()
+        if job_id is None:
             print(f"lshell: {job_type}: current: no such job")
             return 1
 
-    if 0 < job_id <= len(BACKGROUND_JOBS):
-        job = BACKGROUND_JOBS[job_id - 1]
+    job = BACKGROUND_JOBS.get(job_id)
+    if job is not None:
         if job.poll() is None:
             if job_type == "fg":
                 class CtrlZForeground(Exception):
@@ -315,11 +312,7 @@ def cmd_bg_fg(job_type, job_id):
                     """Suspend the foreground job and keep/update its jobs list entry."""
                     if job.poll() is None:
                         os.killpg(os.getpgid(job.pid), signal.SIGSTOP)
-                        if job in BACKGROUND_JOBS:
-                            current_job_id = BACKGROUND_JOBS.index(job) + 1
-                        else:
-                            BACKGROUND_JOBS.append(job)
-                            current_job_id = len(BACKGROUND_JOBS)
+                        current_job_id = BACKGROUND_JOBS.add(job)
                         sys.stdout.write(
                             f"\n[{current_job_id}]+  Stopped        {_job_command(job)}\n"
                         )
@@ -335,13 +328,14 @@ def cmd_bg_fg(job_type, job_id):
                     job.wait()
                     # Remove the job from the list if it has completed
                     if job.poll() is not None:
-                        BACKGROUND_JOBS.pop(job_id - 1)
+                        _cancel_job_timeout(job)
+                        BACKGROUND_JOBS.remove(job)
                     return 0
                 except CtrlZForeground:
                     return 0
                 except KeyboardInterrupt:
                     os.killpg(os.getpgid(job.pid), signal.SIGINT)
-                    BACKGROUND_JOBS.pop(job_id - 1)
+                    BACKGROUND_JOBS.remove(job)
                     return 130
                 finally:
                     signal.signal(signal.SIGTSTP, previous_sigtstp_handler)
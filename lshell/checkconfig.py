@@ -1,3 +1,4 @@
+# pylint: disable=too-many-lines
 """This module contains the checkconfig class of lshell"""
 
 import sys
@@ -8,11 +9,10 @@ import string
 import re
 import getopt
 import logging
-import grp
 import time
 import glob
+import shutil
 import subprocess
-from logging.handlers import SysLogHandler
 
 # import lshell specifics
 from lshell import utils
@@ -20,14 +20,63 @@ from lshell import variables
 from lshell import builtincmd
 from lshell import configschema
 from lshell import audit
+from lshell import aliases
+from lshell import authindex
+from lshell import forbidden
 from lshell import containment
+from lshell import groupcache
+from lshell import includeindex
+from lshell import pathcatalog
+from lshell import policyresolver
+from lshell import sec
+from lshell import statecache
+
+
+# noexec verdicts of this process, by library, bash and their fingerprints
+_NOEXEC_VERDICTS = {}
 
 
 class CheckConfig:
     """Check the configuration file."""
 
     def noexec_library_usable(self, path_noexec):
-        """Return True when a noexec library can be safely preloaded."""
+        """Return True when a noexec library can be safely preloaded.
+
+        Probing spawns bash, so the result is cached per library and bash
+        binary and only re-probed when either of them changes. The verdict
+        decides whether commands run under LD_PRELOAD: verdicts written by
+        root are trusted either way, while the private verdicts of other users
+        are only trusted when they say the library is usable. Forging one
+        can only keep LD_PRELOAD on, never turn it off.
+        """
+        bash_path = shutil.which("bash")
+        markers = [
+            statecache.fingerprint(path_noexec),
+            statecache.fingerprint(bash_path) if bash_path else None,
+        ]
+        cache_name = f"{path_noexec}:{bash_path}"
+        cacheable = None not in markers
+        if cacheable:
+            verdict_key = (cache_name, *map(tuple, markers))
+            if verdict_key in _NOEXEC_VERDICTS:
+                return _NOEXEC_VERDICTS[verdict_key]
+            cached = statecache.load("noexec", cache_name, system=True)
+            if (
+                isinstance(cached, dict)
+                and cached.get("markers") == markers
+                and isinstance(cached.get("usable"), bool)
+            ):
+                _NOEXEC_VERDICTS[verdict_key] = cached["usable"]
+                return cached["usable"]
+            cached = statecache.load("noexec", cache_name)
+            if (
+                isinstance(cached, dict)
+                and cached.get("markers") == markers
+                and cached.get("usable") is True
+            ):
+                _NOEXEC_VERDICTS[verdict_key] = True
+                return True
+
         probe_env = dict(os.environ)
         probe_env["LD_PRELOAD"] = path_noexec
         probe_env.pop("BASH_ENV", None)
@@ -44,10 +93,21 @@ class CheckConfig:
         except OSError:
             return False
 
-        return probe.returncode == 0
-
-    def __init__(self, args, refresh=None, stdin=None, stdout=None, stderr=None):
-        """Force the calling of the methods below"""
+        usable = probe.returncode == 0
+        if cacheable:
+            _NOEXEC_VERDICTS[verdict_key] = usable
+            verdict = {"markers": markers, "usable": usable}
+            if not statecache.store("noexec", cache_name, verdict, system=True):
+                if usable:
+                    statecache.store("noexec", cache_name, verdict)
+        return usable
+
+    def __init__(
+        self, args, refresh=None, stdin=None, stdout=None, stderr=None, logger=None
+    ):
+        """Force the calling of the methods below. On reload (refresh), the
+        session's logger can be passed to keep it when logging is unchanged.
+        """
         if stdin is None:
             self.stdin = sys.stdin
         else:
@@ -62,6 +122,7 @@ class CheckConfig:
             self.stderr = stderr
 
         self.refresh = refresh
+        self.previous_logger = logger
         self.conf = {}
         self.conf, self.arguments = self.getoptions(args, self.conf)
         configfile = self.conf["configfile"]
@@ -76,6 +137,11 @@ class CheckConfig:
         self.get_config_user()
         self.check_env()
         self.set_noexec()
+        authindex.for_conf(self.conf)
+        forbidden.for_conf(self.conf)
+        sec.path_acl(self.conf)
+        if isinstance(self.conf.get("aliases"), dict):
+            aliases.for_conf(self.conf)
 
     def check_config_file_exists(self, configfile):
         """Check if the configuration file exists, else exit with error"""
@@ -144,8 +210,9 @@ class CheckConfig:
             for key in env_vars.keys():
                 os.environ[key] = str(env_vars[key])
 
-        # Check paths to files that contain env vars
-        if "env_vars_files" in self.conf:
+        # Check paths to files that contain env vars. On reload, the shell
+        # only re-sources the files that changed (see ShellCmd.reload_config)
+        if "env_vars_files" in self.conf and self.refresh is None:
             for envfile in self.conf["env_vars_files"]:
                 builtincmd.cmd_source(envfile)
 
@@ -198,26 +265,6 @@ class CheckConfig:
         else:
             logname = "lshell"
 
-        logger = logging.getLogger(f"{logname}.{self.conf['config_mtime']}")
-
-        # close any logger handler/filters if exists
-        # this is useful if configuration is reloaded
-        for loghandler in logger.handlers:
-            try:
-                logging.shutdown(loghandler)
-            except TypeError:
-                pass
-        for logfilter in logger.filters:
-            logger.removeFilter(logfilter)
-
-        logger.setLevel(logging.DEBUG)
-
-        # set log to output error on stderr
-        logsterr = logging.StreamHandler()
-        logger.addHandler(logsterr)
-        logsterr.setFormatter(logging.Formatter("%(message)s"))
-        logsterr.setLevel(logging.CRITICAL)
-
         # log level must be 1, 2, 3 , 4 or 0
         if "loglevel" not in self.conf:
             self.conf["loglevel"] = 0
@@ -264,9 +311,52 @@ class CheckConfig:
 
         log_directory = self.conf["logpath"]
 
+        # on reload, keep the session's logger and handlers if the logging
+        # settings did not change
+        log_settings = [
+            logname,
+            logfilename,
+            log_directory,
+            self.conf["loglevel"],
+            structured_audit_enabled,
+        ]
+        previous = self.previous_logger
+        if previous is not None:
+            if getattr(previous, "lshell_settings", None) == log_settings:
+                self.logfile = getattr(previous, "lshell_logfile", None)
+                self.conf["logpath"] = previous
+                self.log = previous
+                return
+            for loghandler in list(previous.handlers):
+                previous.removeHandler(loghandler)
+                loghandler.close()
+
+        logger = logging.getLogger(f"{logname}.{self.conf['config_mtime']}")
+
+        # close any logger handler/filters if exists
+        # this is useful if configuration is reloaded
+        for loghandler in logger.handlers:
+            try:
+                logging.shutdown(loghandler)
+            except TypeError:
+                pass
+        for logfilter in logger.filters:
+            logger.removeFilter(logfilter)
+
+        logger.setLevel(logging.DEBUG)
+
+        # set log to output error on stderr
+        logsterr = logging.StreamHandler()
+        logger.addHandler(logsterr)
+        logsterr.setFormatter(logging.Formatter("%(message)s"))
+        logsterr.setLevel(logging.CRITICAL)
+
         if self.conf["loglevel"] > 0:
             try:
                 if logfilename == "syslog":
+                    # pylint: disable-next=import-outside-toplevel
+                    from logging.handlers import SysLogHandler
+
                     syslog = SysLogHandler(address="/dev/log")
                     syslog.setFormatter(syslogformatter)
                     syslog.setLevel(self.levels[self.conf["loglevel"]])
@@ -292,6 +382,8 @@ class CheckConfig:
             except IOError:
                 pass
 
+        logger.lshell_settings = log_settings
+        logger.lshell_logfile = getattr(self, "logfile", None)
         self.conf["logpath"] = logger
         self.log = logger
 
@@ -304,179 +396,77 @@ class CheckConfig:
         """
         self.config.read(self.conf["configfile"])
 
-        # list the include_dir directory and read configuration files
-        if "include_dir" in self.conf:
-            self.conf["include_dir_conf"] = glob.glob(f"{self.conf['include_dir']}*")
-            self.config.read(self.conf["include_dir_conf"])
-
         self.user = getuser()
 
-        self.conf_raw = {}
-
-        # get 'default' configuration if any
-        self.get_config_sub("default")
-
-        # get groups configuration if any.
+        # sections to merge, from lowest to highest priority.
         # for each group the user belongs to, check if specific configuration
         # exists.  The primary group has the highest priority.
+        sections = ["default"]
         grplist = os.getgroups()
         grplist.reverse()
+        group_cache = groupcache.GroupCache(self.conf.get("group_cache_ttl", 0))
         for gid in grplist:
-            try:
-                grpname = grp.getgrgid(gid)[0]
-                section = "grp:" + grpname
-                self.get_config_sub(section)
-            except KeyError:
-                pass
-
-        # get user configuration if any
-        self.get_config_sub(self.user)
+            grpname = group_cache.group_name(gid)
+            if grpname is not None:
+                sections.append("grp:" + grpname)
+        sections.append(self.user)
+        if group_cache.enabled:
+            group_cache.flush()
+            self.log.debug(
+                f"lshell: group cache: {group_cache.hits} hits, "
+                f"{group_cache.misses} misses"
+            )
 
-    def get_config_sub(self, section):
-        """this function is used to interpret the configuration +/-,
-        'all' etc.
-        """
-        # convert commandline options from dict to list of tuples, in order to
-        # merge them with the output of the config parser
-        conf = []
-        for key in self.conf:
-            if key not in ["config_mtime", "logpath"]:
-                conf.append((key, self.conf[key]))
-
-        if self.config.has_section(section):
-            conf = list(self.config.items(section)) + conf
-            for item in conf:
-                key = item[0]
-                value = item[1]
-                # if string, then split
-                split = [""]
-                if isinstance(value, str):
-                    split = re.split(r"((?:\+|-)\s*\[[^\]]+\])", value)
-                if len(split) > 1 and key in [
-                    "path",
-                    "overssh",
-                    "allowed",
-                    "allowed_shell_escape",
-                    "allowed_file_extensions",
-                    "forbidden",
-                ]:
-                    for stuff in split:
-                        if not stuff.strip():
-                            continue
-                        if stuff.startswith("-") or stuff.startswith("+"):
-                            self.conf_raw.update(
-                                self.minusplus(self.conf_raw, key, stuff)
-                            )
-                        elif configschema.is_all_literal(stuff):
-                            if key == "allowed":
-                                self.conf_raw.update({key: self.expand_all()})
-                            else:
-                                self.log.critical(
-                                    f"lshell: config: '{key}' cannot be set to 'all'"
-                                )
-                                sys.exit(1)
-                        elif stuff and key == "path":
-                            liste = ["", ""]
-                            for path in self._parse_config_value(stuff, key):
-                                for item in glob.glob(path):
-                                    liste[0] += os.path.realpath(item) + "/|"
-                            # remove double slashes
-                            liste[0] = liste[0].replace("//", "/")
-                            self.conf_raw.update({key: str(liste)})
-                        elif stuff and isinstance(
-                            self._parse_config_value(stuff, key), list
-                        ):
-                            self.conf_raw.update({key: stuff})
-                # case allowed/sudo_commands is set to all
-                elif key == "allowed" and configschema.is_all_literal(split[0]):
-                    self.conf_raw.update({key: self.expand_all()})
-                elif key == "allowed_shell_escape" and configschema.is_all_literal(
-                    split[0]
-                ):
-                    self.log.critical(
-                        "lshell: config: 'allowed_shell_escape' cannot be set to 'all'"
-                    )
-                    sys.exit(1)
-                elif key == "path":
-                    liste = ["", ""]
-                    for path in self._parse_config_value(value, "path"):
-                        for item in glob.glob(path):
-                            liste[0] += os.path.realpath(item) + "/|"
-                    # remove double slashes
-                    liste[0] = liste[0].replace("//", "/")
-                    self.conf_raw.update({key: str(liste)})
-                else:
-                    self.conf_raw.update(dict([item]))
-
-    def minusplus(self, confdict, key, extra):
-        """update configuration lists containing -/+ operators"""
-        if key in confdict:
-            liste = self._parse_config_value(confdict[key], key)
-        elif key == "path":
-            liste = ["", ""]
-        else:
-            liste = []
+        # list the include_dir directory and read configuration files
+        if "include_dir" in self.conf:
+            self.conf["include_dir_conf"] = glob.glob(
+                includeindex.include_pattern(self.conf["include_dir"])
+            )
+            self.read_include_files(sections)
 
-        sublist = self._parse_config_value(extra[1:], key)
-        if extra.startswith("+"):
-            if key == "path":
-                for path in sublist:
-                    liste[0] += os.path.realpath(path) + "/|"
-            else:
-                for item in sublist:
-                    liste.append(item)
-        elif extra.startswith("-"):
-            if key == "path":
-                for path in sublist:
-                    liste[1] += os.path.realpath(path) + "/|"
-            else:
-                for item in sublist:
-                    if item in liste:
-                        liste.remove(item)
-                    else:
-                        self.log.error(
-                            f"lshell: config: -['{item}'] ignored in '{key}' list."
-                        )
-        return {key: str(liste)}
-
-    def expand_all(self):
-        """expand allowed, if set to 'all'"""
-        # initialize list to common shell built-ins
-        expanded_all = [
-            "bg",
-            "break",
-            "case",
-            "cd",
-            "continue",
-            "eval",
-            "exec",
-            "exit",
-            "fg",
-            "if",
-            "jobs",
-            "kill",
-            "login",
-            "logout",
-            "set",
-            "shift",
-            "stop",
-            "suspend",
-            "umask",
-            "unset",
-            "wait",
-            "while",
+        # command line options override every section they are merged with
+        overrides = [
+            (key, value)
+            for key, value in self.conf.items()
+            if key not in ["config_mtime", "logpath"]
         ]
-        for directory in os.environ["PATH"].split(":"):
-            if os.path.exists(directory):
-                for item in os.listdir(directory):
-                    if os.access(os.path.join(directory, item), os.X_OK):
-                        expanded_all.append(item)
-            else:
-                self.log.error(
-                    f'lshell: config: PATH entry "{directory}" does not exist'
+        resolver = policyresolver.PolicyResolver(
+            {
+                section: dict(self.config.items(section))
+                for section in sections
+                if self.config.has_section(section)
+            },
+            overrides=overrides,
+        )
+        try:
+            resolution = resolver.resolve(sections)
+        except ValueError as exception:
+            self.log.critical(f"lshell: config: {exception}")
+            sys.exit(1)
+        for warning in resolution.warnings:
+            self.log.error(f"lshell: config: {warning}")
+        self.conf_raw = resolution.conf_raw
+
+    def read_include_files(self, sections):
+        """Read the include_dir configuration. When include_dir has an up to
+        date index, only the given sections are read from the include files.
+        """
+        include_files = self.conf["include_dir_conf"]
+        indexed = includeindex.indexed_sections(
+            self.conf["include_dir"], include_files, sections
+        )
+        if indexed is None:
+            index_path = includeindex.index_path(self.conf["include_dir"])
+            if index_path and os.path.exists(index_path):
+                self.log.warning(
+                    f"lshell: include_dir index {index_path} is stale, "
+                    "run 'lshell include-index' to rebuild it"
                 )
+            self.config.read(include_files)
+            return
 
-        return str(expanded_all)
+        for include_file, text in indexed:
+            self.config.read_string(text, source=include_file)
 
     def _parse_config_value(self, value, key=""):
         """Safely parse config values and enforce key schema."""
@@ -535,12 +525,6 @@ class CheckConfig:
             elif self.conf["loglevel"] < 0:
                 self.conf["loglevel"] = 0
 
-            # if log file exists:
-            try:
-                self.logfile.setLevel(self.levels[self.conf["loglevel"]])
-            except AttributeError:
-                pass
-
         for item in [
             "allowed",
             "allowed_shell_escape",
@@ -573,6 +557,9 @@ class CheckConfig:
             "max_background_jobs",
             "command_timeout",
             "max_processes",
+            "wildcard_max_dirs",
+            "wildcard_timeout",
+            "decision_cache",
         ]:
             try:
                 if len(self.conf_raw[item]) == 0:
@@ -595,6 +582,10 @@ class CheckConfig:
                     self.conf[item] = -1
                 elif item in ["policy_commands"]:
                     self.conf[item] = 1
+                elif item in ["wildcard_max_dirs"]:
+                    self.conf[item] = sec.WILDCARD_MAX_DIRS
+                elif item in ["wildcard_timeout"]:
+                    self.conf[item] = sec.WILDCARD_TIMEOUT
                 # default scp is allowed
                 elif item in ["scp_upload", "scp_download"]:
                     self.conf[item] = 1
@@ -615,6 +606,13 @@ class CheckConfig:
             self.log.critical("lshell: config: 'prompt_short' must be 0, 1, or 2")
             sys.exit(1)
 
+        for item in ["wildcard_max_dirs", "wildcard_timeout", "decision_cache"]:
+            if not isinstance(self.conf[item], int) or self.conf[item] < 0:
+                self.log.critical(
+                    f"lshell: config: '{item}' must be a non-negative integer"
+                )
+                sys.exit(1)
+
         try:
             containment.validate_runtime_config(self.conf)
         except ValueError as exception:
@@ -632,7 +630,6 @@ class CheckConfig:
                 )
                 sys.exit(1)
             self.conf["umask"] = umask_raw.zfill(4)
-            os.umask(int(self.conf["umask"], 8))
 
         if "home_path" in self.conf_raw:
             home_path = self.conf_raw["home_path"]
@@ -680,19 +677,6 @@ class CheckConfig:
         else:
             self.conf["intro"] = variables.INTRO
 
-        if os.path.isdir(self.conf["home_path"]):
-            # change dir to home when initially loading the configuration
-            if self.refresh is None:
-                os.chdir(self.conf["home_path"])
-            # if reloading the configuration, do not change directory
-            else:
-                pass
-        else:
-            self.log.critical(
-                f'lshell: home directory "{self.conf["home_path"]}" does not exist'
-            )
-            sys.exit(1)
-
         if "history_file" in self.conf_raw:
             try:
                 self.conf["history_file"] = self._parse_history_file()
@@ -708,20 +692,6 @@ class CheckConfig:
                 f"{self.conf['home_path']}/{self.conf['history_file']}"
             )
 
-        if self.conf["env_path"]:
-            new_path = f"{self.conf['env_path']}:{os.environ['PATH']}"
-
-            # Check if the new path is valid
-            if all(
-                c in string.ascii_letters + string.digits + "/:-_." for c in new_path
-            ) and not new_path.startswith(":"):
-                os.environ["PATH"] = new_path
-            else:
-                self.stderr.write(
-                    f"lshell: config: env_path must be a valid $PATH: {self.conf['env_path']}\n"
-                )
-                sys.exit(1)
-
         # append default commands to allowed list
         self.conf["allowed"] += list(set(builtincmd.builtins_list) - set(["export"]))
 
@@ -740,13 +710,8 @@ class CheckConfig:
         # add all commands present in allowed_cmd_path if specified
         if self.conf["allowed_cmd_path"]:
             for path in self.conf["allowed_cmd_path"]:
-                # add path to PATH env variable
-                os.environ["PATH"] += f":{path}"
                 # find executable file, and add them to allowed commands
-                for item in os.listdir(path):
-                    cmd = os.path.join(path, item)
-                    if os.access(cmd, os.X_OK):
-                        self.conf["allowed"].append(item)
+                self.conf["allowed"].extend(pathcatalog.executables(path))
 
         # case sudo_commands set to 'all', expand to all 'allowed' commands
         if "sudo_commands" in self.conf_raw and configschema.is_all_literal(
@@ -797,6 +762,56 @@ class CheckConfig:
             if ";" in self.conf["forbidden"]:
                 self.conf["forbidden"].remove(";")
 
+        self.apply_runtime_environment()
+
+    def apply_runtime_environment(self):
+        """Apply the process-wide side effects of the resolved configuration
+        (log level, umask, working directory and $PATH). This runs for both
+        freshly resolved and cached configurations.
+        """
+        if "loglevel" in self.conf_raw:
+            # if log file exists:
+            try:
+                self.logfile.setLevel(self.levels[self.conf["loglevel"]])
+            except AttributeError:
+                pass
+
+        if "umask" in self.conf_raw:
+            os.umask(int(self.conf["umask"], 8))
+
+        if os.path.isdir(self.conf["home_path"]):
+            # change dir to home when initially loading the configuration
+            if self.refresh is None:
+                os.chdir(self.conf["home_path"])
+            # if reloading the configuration, do not change directory
+            else:
+                pass
+        else:
+            self.log.critical(
+                f'lshell: home directory "{self.conf["home_path"]}" does not exist'
+            )
+            sys.exit(1)
+
+        if self.conf["env_path"]:
+            new_path = f"{self.conf['env_path']}:{os.environ['PATH']}"
+
+            # Check if the new path is valid
+            if all(
+                c in string.ascii_letters + string.digits + "/:-_." for c in new_path
+            ) and not new_path.startswith(":"):
+                os.environ["PATH"] = new_path
+            else:
+                self.stderr.write(
+                    f"lshell: config: env_path must be a valid $PATH: {self.conf['env_path']}\n"
+                )
+                sys.exit(1)
+
+        # add allowed_cmd_path directories to PATH env variable
+        if self.conf["allowed_cmd_path"]:
+            for path in self.conf["allowed_cmd_path"]:
+                os.environ["PATH"] += f":{path}"
+
+        if self.conf.get("winscp") == 1:
             self.log.error("WinSCP session started")
 
     def set_noexec(self):
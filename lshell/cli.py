@@ -1,28 +1,69 @@
-"""CLI entry points for lshell."""
+"""CLI entry points for lshell.
+
+Each entry point only imports the modules it needs: subcommands do not load
+the shell, and the shell does not load the subcommand implementations.
+"""
 
 import ast
+import importlib
 import os
 import signal
 import sys
 import uuid
 
-from lshell import policy as policy_mode
-from lshell import systemsetup as system_setup
-from lshell import hardeninit as harden_init
-from lshell import audit
-from lshell import containment
-from lshell.checkconfig import CheckConfig
-from lshell.shellcmd import LshellTimeOut, ShellCmd
+# attributes resolved on first use, see __getattr__
+_LAZY_ATTRIBUTES = {
+    "policy_mode": ("lshell.policy", None),
+    "system_setup": ("lshell.systemsetup", None),
+    "harden_init": ("lshell.hardeninit", None),
+    "include_index": ("lshell.includeindex", None),
+    "group_cache": ("lshell.groupcache", None),
+    "audit": ("lshell.audit", None),
+    "containment": ("lshell.containment", None),
+    "CheckConfig": ("lshell.checkconfig", "CheckConfig"),
+    "ShellCmd": ("lshell.shellcmd", "ShellCmd"),
+    "LshellTimeOut": ("lshell.shellcmd", "LshellTimeOut"),
+}
+
+# subcommand name -> module attribute exposing main(argv)
+SUBCOMMANDS = {
+    "policy-show": "policy_mode",
+    "setup-system": "system_setup",
+    "harden-init": "harden_init",
+    "include-index": "include_index",
+    "group-cache": "group_cache",
+}
+
+
+def __getattr__(name):
+    """Import lazily loaded modules and classes on first access."""
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    """Return a lazily loaded attribute, honoring values already bound."""
+    if name in globals():
+        return globals()[name]
+    return __getattr__(name)
 
 
 def main():
     """Main CLI entry point."""
-    if len(sys.argv) > 1 and sys.argv[1] == "policy-show":
-        sys.exit(policy_mode.main(sys.argv[2:]))
-    if len(sys.argv) > 1 and sys.argv[1] == "setup-system":
-        sys.exit(system_setup.main(sys.argv[2:]))
-    if len(sys.argv) > 1 and sys.argv[1] == "harden-init":
-        sys.exit(harden_init.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(_lazy(SUBCOMMANDS[sys.argv[1]]).main(sys.argv[2:]))
+
+    audit = _lazy("audit")
+    containment = _lazy("containment")
+    shell_class = _lazy("ShellCmd")
+    timeout_error = _lazy("LshellTimeOut")
 
     # Set SHELL and process LSHELL_ARGS env variables.
     os.environ["SHELL"] = os.path.realpath(sys.argv[0])
@@ -39,7 +80,7 @@ def main():
     else:
         args = sys.argv[1:]
 
-    userconf = CheckConfig(args).returnconf()
+    userconf = _lazy("CheckConfig")(args).returnconf()
     userconf["session_id"] = os.environ.get("LSHELL_SESSION_ID", uuid.uuid4().hex)
     os.environ["LSHELL_SESSION_ID"] = userconf["session_id"]
     session_accountant = containment.SessionAccountant(userconf)
@@ -66,7 +107,7 @@ def main():
 
     signal.signal(signal.SIGTSTP, disable_ctrl_z)
 
-    cli = ShellCmd(userconf, args)
+    cli = shell_class(userconf, args)
     try:
         while True:
             try:
@@ -80,7 +121,7 @@ def main():
             except EOFError:
                 sys.stdout.write("\nExited on user request\n")
                 sys.exit(0)
-    except LshellTimeOut:
+    except timeout_error:
         userconf["logpath"].error("Timer expired")
         sys.stdout.write("\nTime is up.\n")
     finally:
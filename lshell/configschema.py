@@ -39,6 +39,7 @@ INT_VALUE_KEYS = {
     "winscp",
     "disable_exit",
     "policy_commands",
+    "group_cache_ttl",
     "quiet",
     "loglevel",
     "security_audit_json",
@@ -46,6 +47,9 @@ INT_VALUE_KEYS = {
     "max_background_jobs",
     "command_timeout",
     "max_processes",
+    "wildcard_max_dirs",
+    "wildcard_timeout",
+    "decision_cache",
 }
 DICT_VALUE_KEYS = {"aliases", "env_vars", "messages"}
 STRING_VALUE_KEYS = {
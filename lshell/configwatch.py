@@ -0,0 +1,194 @@
+"""Watch configuration sources so running sessions can hot-reload them.
+
+The watcher tracks the main configuration file, the include_dir files (and
+the directory itself, to notice added or removed files) and env_vars_files.
+Changes are detected with one stat pass over these sources. On Linux, an
+inotify descriptor on the parent directories is checked first, so that the
+stat pass only runs when something in those directories actually changed.
+Without inotify, the stat pass runs at most once every POLL_INTERVAL
+seconds: with thousands of include files, stating all of them before every
+command would cost more than the command.
+"""
+
+import ctypes
+import errno
+import fnmatch
+import glob
+import os
+import struct
+import time
+import weakref
+
+from lshell import builtincmd
+from lshell import statecache
+
+
+# minimum delay in seconds between two stat passes without inotify
+POLL_INTERVAL = 1.0
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+# events after which the watch can no longer be trusted
+_WATCH_LOST = _IN_Q_OVERFLOW | _IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal non-blocking inotify reader for a set of directories."""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._finalizer = weakref.finalize(self, os.close, self.fd)
+
+        self.watches = {}
+        for directory in directories:
+            watch = libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), _WATCH_MASK
+            )
+            if watch < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+            self.watches[watch] = directory
+
+    def close(self):
+        """Release the inotify descriptor."""
+        self._finalizer()
+
+    def read_events(self):
+        """Return pending (directory, name) events, or None if events were lost."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as exception:
+                if exception.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return events
+                raise
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                watch, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & _WATCH_LOST:
+                    return None
+                events.append((self.watches.get(watch), os.fsdecode(name)))
+
+
+def env_file_paths(conf):
+    """Return the resolved paths of the env_vars_files of a configuration."""
+    return [
+        builtincmd.env_file_path(envfile) for envfile in conf.get("env_vars_files") or []
+    ]
+
+
+class ConfigWatcher:
+    """Report which configuration sources changed since the last poll."""
+
+    def __init__(self, conf, use_inotify=True):
+        self.policy_paths = [conf["configfile"]] + list(
+            conf.get("include_dir_conf") or []
+        )
+        self.include_pattern = None
+        self.include_directory = None
+        if conf.get("include_dir"):
+            self.include_pattern = f"{conf['include_dir']}*"
+            directory = os.path.dirname(self.include_pattern) or "."
+            if not glob.has_magic(directory):
+                self.include_directory = directory
+        self.env_paths = env_file_paths(conf)
+
+        self.inotify = None
+        if use_inotify:
+            self.inotify = self._open_inotify()
+        self.snapshot = self._stat_pass()
+        self.last_pass = time.monotonic()
+
+    def _sources(self):
+        sources = list(self.policy_paths) + list(self.env_paths)
+        if self.include_directory is not None:
+            sources.append(self.include_directory)
+        return sources
+
+    def _open_inotify(self):
+        directories = {os.path.dirname(path) or "." for path in self._sources()}
+        if self.include_directory is not None:
+            directories.add(self.include_directory)
+        directories = [path for path in directories if os.path.isdir(path)]
+        try:
+            return Inotify(sorted(directories))
+        except (OSError, AttributeError, TypeError):
+            # no inotify (non-Linux, no libc symbol or out of watches)
+            return None
+
+    def _stat_pass(self):
+        snapshot = {path: statecache.fingerprint(path) for path in self._sources()}
+        if self.include_pattern is not None and self.include_directory is None:
+            snapshot[self.include_pattern] = statecache.probe(
+                "glob", self.include_pattern
+            )
+        return snapshot
+
+    def _is_relevant(self, directory, name):
+        if directory is None:
+            return True
+        path = os.path.join(directory, name) if name else directory
+        if path in self.snapshot:
+            return True
+        return bool(
+            self.include_pattern and fnmatch.fnmatch(path, self.include_pattern)
+        )
+
+    def poll(self):
+        """Return (policy_changed, changed_env_files) since the last poll."""
+        if self.inotify is not None:
+            try:
+                events = self.inotify.read_events()
+            except OSError:
+                events = None
+            if events is None:
+                # events were lost: fall back to stat polling for good
+                self.inotify.close()
+                self.inotify = None
+            elif not any(self._is_relevant(*event) for event in events):
+                return False, []
+        elif time.monotonic() - self.last_pass < POLL_INTERVAL:
+            # changes are kept for the next pass, nothing is lost
+            return False, []
+
+        current = self._stat_pass()
+        self.last_pass = time.monotonic()
+        changed = {path for path in current if current[path] != self.snapshot.get(path)}
+        self.snapshot = current
+        changed_env = [path for path in self.env_paths if path in changed]
+        return bool(changed - set(changed_env)), changed_env
+
+    def close(self):
+        """Stop watching."""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
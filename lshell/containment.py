@@ -29,6 +29,9 @@ RUNTIME_LIMIT_INT_KEYS = (
 )
 
 _DEFAULT_SESSION_STATE_ROOT = os.path.join(tempfile.gettempdir(), "lshell", "sessions")
+# trusted locations of util-linux prlimit, see rlimit_wrapper()
+PRLIMIT_PATHS = ("/usr/bin/prlimit", "/bin/prlimit")
+_PRLIMIT = None
 
 
 @dataclass(frozen=True)
@@ -333,6 +336,37 @@ def unsupported_rlimits(limits, resource_module=None):
     return unsupported
 
 
+def _prlimit_path():
+    """Return the path of the util-linux prlimit binary, or None."""
+    global _PRLIMIT
+    if _PRLIMIT is None:
+        _PRLIMIT = next(
+            (
+                path
+                for path in PRLIMIT_PATHS
+                if os.path.isfile(path) and os.access(path, os.X_OK)
+            ),
+            "",
+        )
+    return _PRLIMIT or None
+
+
+def rlimit_wrapper(limits):
+    """Return the argv prefix executing a command under the configured
+    rlimits, so they apply without a Python callback in the child.
+
+    [] when no rlimit is configured, None when prlimit is not available
+    and build_preexec_fn() has to apply them instead.
+    """
+    if limits.max_processes <= 0 or resource is None:
+        return []
+    prlimit = _prlimit_path()
+    if prlimit is None:
+        return None
+    nproc = limits.max_processes
+    return [prlimit, f"--nproc={nproc}:{nproc}", "--"]
+
+
 def build_preexec_fn(detached_session, limits):
     """Build subprocess pre-exec hook to apply process/session limits."""
 
@@ -0,0 +1,129 @@
+"""Opt-in cache of the security decisions of repeated command lines.
+
+Sessions of automation accounts send the same few command lines over and
+over, and each one goes through check_secure and check_path again. With
+'decision_cache' set to a number of entries, the commands these checks
+allowed are remembered in a bounded LRU cache and allowed again without
+running them.
+
+Only decisions that cannot change with the filesystem are cached: lines with
+path-like operands, quotes, escapes or substitutions, and lines checked for
+file extensions, are always checked (see sec.depends_on_filesystem). Denials
+are never cached, so that warnings and the warning counter still apply.
+
+An entry is keyed by the exact line and the current directory: the checks
+look at more than the words of a line (e.g. control characters, or spacing
+around forbidden entries), so lines that only differ there are checked on
+their own. Variables are expanded before the checks, so the environment the
+line depends on is part of the line. The cache lives in the memory of the
+session configuration, so each SSH command, run by its own lshell process,
+starts empty. A reloaded configuration starts with an empty cache, cd
+empties it, and it is emptied whenever one of the compiled policies the
+checks use (allowed commands, forbidden characters, path ACL, sudo
+commands) changed.
+"""
+
+import os
+from collections import OrderedDict
+
+from lshell import authindex
+from lshell import forbidden
+from lshell import sec
+
+
+CACHE_KEY = "_decision_cache"
+
+
+def _policy(conf):
+    """Return the policies the cached decisions were made with."""
+    return (
+        authindex.for_conf(conf),
+        forbidden.for_conf(conf),
+        sec.path_acl(conf),
+        tuple(conf.get("sudo_commands") or ()),
+    )
+
+
+def _same_policy(policy, cached):
+    """True when policy is the one the cached decisions were made with."""
+    if cached is None:
+        return False
+    compiled = all(current is previous for current, previous in zip(policy[:3], cached))
+    return compiled and policy[3] == cached[3]
+
+
+class DecisionCache:
+    """Bounded LRU set of the command lines allowed by the checks."""
+
+    def __init__(self, size):
+        self.size = size
+        # lookups answered from the cache / by the checks
+        self.hits = 0
+        self.misses = 0
+        self._policy = None
+        self._entries = OrderedDict()
+
+    def key(self, line, conf):
+        """Return the cache key of line, or None when it may not be cached."""
+        if sec.depends_on_filesystem(line, conf):
+            return None
+        policy = _policy(conf)
+        if not _same_policy(policy, self._policy):
+            self.clear()
+            self._policy = policy
+        return line, os.getcwd()
+
+    def allows(self, key):
+        """True when the line of key was allowed already."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key):
+        """Remember that the line of key is allowed."""
+        self._entries[key] = True
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every decision, keep the counters."""
+        self._entries.clear()
+
+    def stats(self):
+        """Return the hit statistics of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def for_conf(conf):
+    """Return the decision cache of conf, or None when it is disabled."""
+    size = conf.get("decision_cache") or 0
+    if size <= 0:
+        return None
+    cache = conf.get(CACHE_KEY)
+    if cache is None or cache.size != size:
+        cache = DecisionCache(size)
+        conf[CACHE_KEY] = cache
+    return cache
+
+
+def invalidate(conf):
+    """Forget the decisions of conf, e.g. after the directory changed."""
+    cache = conf.get(CACHE_KEY)
+    if cache is not None:
+        cache.clear()
+
+
+def stats(conf):
+    """Return the statistics of the decision cache of conf, or None."""
+    cache = conf.get(CACHE_KEY)
+    return cache.stats() if cache is not None else None
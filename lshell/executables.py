@@ -0,0 +1,118 @@
+"""Cached resolution of command names through PATH.
+
+Before running a command line, every pipeline segment is looked up in PATH.
+shutil.which() tries each PATH directory in turn, joining and stat'ing a
+candidate file at every step; sessions running the same few commands again
+and again repeat exactly the same work.
+
+ExecutableCache remembers the resolution of (name, PATH). An entry records
+the modification time of each directory it looked in, up to the one holding
+the executable. Adding, removing or renaming a file changes the mtime of its
+directory, but a chmod or chown of the file does not: the entry also records
+the mode and change time of each file named like the command in those
+directories, executable or not. The entry is used as long as none of them changed and
+resolved again otherwise. A PATH with relative directories depends on the
+current directory and is not cached.
+"""
+
+import os
+import shutil
+
+
+MAX_ENTRIES = 512
+
+
+def _mtime(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _state(path):
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return None
+    return path_stat.st_mode, path_stat.st_ctime_ns
+
+
+def _unchanged(name, stamps):
+    """True when no directory, nor file named name in it, changed."""
+    for directory, mtime, state in stamps:
+        if _mtime(directory) != mtime:
+            return False
+        # a file created later changes the mtime of its directory
+        if state is not None and _state(os.path.join(directory, name)) != state:
+            return False
+    return True
+
+
+class ExecutableCache:
+    """Per-session cache of shutil.which() results."""
+
+    def __init__(self):
+        # lookups answered from the cache / by searching PATH
+        self.hits = 0
+        self.misses = 0
+        # (name, PATH) -> (path or None, ((directory, mtime, state), ...))
+        self._entries = {}
+
+    def which(self, name, path=None):
+        """Return the absolute path of the executable name, or None."""
+        if path is None:
+            path = os.environ.get("PATH", os.defpath)
+        directories = path.split(os.pathsep)
+        if not all(os.path.isabs(directory) for directory in directories):
+            self.misses += 1
+            resolved = shutil.which(name, path=path)
+            return os.path.abspath(resolved) if resolved else None
+
+        key = (name, path)
+        entry = self._entries.get(key)
+        if entry is not None and _unchanged(name, entry[1]):
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        resolved, stamps = self._resolve(name, directories)
+        if len(self._entries) >= MAX_ENTRIES:
+            self._entries.clear()
+        self._entries[key] = (resolved, stamps)
+        return resolved
+
+    @staticmethod
+    def _resolve(name, directories):
+        """Search directories for name and record the ones looked in, with
+        the file named name in each of them.
+        """
+        stamps = []
+        seen = set()
+        for directory in directories:
+            if directory in seen:
+                continue
+            seen.add(directory)
+            stamps.append(
+                (directory, _mtime(directory), _state(os.path.join(directory, name)))
+            )
+            resolved = shutil.which(name, path=directory)
+            if resolved is not None:
+                return os.path.abspath(resolved), tuple(stamps)
+        return None, tuple(stamps)
+
+    def flush(self):
+        """Forget every resolution."""
+        self._entries.clear()
+
+
+_SESSION_CACHE = ExecutableCache()
+
+
+def which(name, path=None):
+    """Resolve name through PATH with the session cache."""
+    return _SESSION_CACHE.which(name, path)
+
+
+def session_cache():
+    """Return the session ExecutableCache."""
+    return _SESSION_CACHE
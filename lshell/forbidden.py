@@ -0,0 +1,99 @@
+"""Compiled matcher of the 'forbidden' character list.
+
+Every command line is searched for each entry of conf["forbidden"], one
+substring scan or freshly built regex per entry. The matcher compiles the
+whole list into a single regex that searches the line once.
+
+The regex is an alternation, in list order, inside a lookahead: at each
+position of the line it reports the first entry found there, and the entry
+reported for the line is the one coming first in the list, exactly as when
+the entries were tried one after the other.
+
+'&' and '|' are forbidden on their own only, so that '&&' and '||' stay
+allowed. check_forbidden_chars and check_secure have historically matched
+them slightly differently, hence two flavours:
+
+- standalone: not next to the same character (start and end of line count);
+- enclosed: between two other characters, as check_secure always did.
+"""
+
+import re
+
+
+MATCHER_KEY = "_forbidden_matcher"
+OPERATORS = ("&", "|")
+
+
+def _standalone(escaped):
+    return rf"(?<!{escaped}){escaped}(?!{escaped})"
+
+
+def _enclosed(escaped):
+    return rf"(?<=[^{escaped}]){escaped}(?=[^{escaped}])"
+
+
+def _compile(entries, operator):
+    """Return the lookahead alternation of entries, or None when empty."""
+    alternatives = []
+    for position, entry in enumerate(entries):
+        escaped = re.escape(str(entry))
+        fragment = operator(escaped) if entry in OPERATORS else escaped
+        alternatives.append(f"(?P<e{position}>{fragment})")
+    if not alternatives:
+        return None
+    return re.compile("(?=" + "|".join(alternatives) + ")")
+
+
+class ForbiddenMatcher:
+    """Single pass search of a line for forbidden entries."""
+
+    __slots__ = ("source", "size", "entries", "_standalone", "_enclosed")
+
+    def __init__(self, entries):
+        self.source = entries
+        self.size = len(entries)
+        self.entries = list(entries)
+        self._standalone = _compile(self.entries, _standalone)
+        self._enclosed = _compile(self.entries, _enclosed)
+
+    def __eq__(self, other):
+        if not isinstance(other, ForbiddenMatcher):
+            return NotImplemented
+        return self.entries == other.entries
+
+    __hash__ = None
+
+    def matches(self, entries):
+        """True when the matcher was compiled from entries, as they are now."""
+        return entries is self.source and len(entries) == self.size
+
+    def _first(self, regex, line):
+        if regex is None:
+            return None
+        first = None
+        for match in regex.finditer(line):
+            position = int(match.lastgroup[1:])
+            if first is None or position < first:
+                first = position
+                if first == 0:
+                    break
+        return None if first is None else self.entries[first]
+
+    def first(self, line):
+        """Return the first forbidden entry of line, '&' and '|' standalone."""
+        return self._first(self._standalone, line)
+
+    def first_enclosed(self, line):
+        """Return the first forbidden entry of line, '&' and '|' enclosed."""
+        return self._first(self._enclosed, line)
+
+
+def for_conf(conf):
+    """Return the matcher of conf["forbidden"], compiling it when missing or
+    stale (e.g. after ';' was removed from the list for WinSCP).
+    """
+    matcher = conf.get(MATCHER_KEY)
+    if matcher is None or not matcher.matches(conf["forbidden"]):
+        matcher = ForbiddenMatcher(conf["forbidden"])
+        conf[MATCHER_KEY] = matcher
+    return matcher
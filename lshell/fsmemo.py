@@ -0,0 +1,133 @@
+"""Filesystem metadata memo scoped to the evaluation of one command.
+
+Checking a command line resolves the same paths several times: check_secure
+tests quoted items for existence, check_path resolves every candidate and the
+current directory, check_allowed_file_extensions resolves and stats each
+operand, and cmd_cd resolves its target again. Within a scope(), realpath()
+and stat() answer repeated lookups of a path from an FSMemo instead of the
+filesystem.
+
+A memo only lives for the evaluation of one command: cmd_parse_execute opens
+a scope and resets it before each pipeline, so nothing resolved before a
+command ran is trusted after it. chdir() clears it too, since relative paths
+then resolve differently. Outside a scope, every lookup goes to the
+filesystem. totals() reports the lookups done and saved in the session, and
+log_totals() logs them when the session ends.
+"""
+
+import contextlib
+import os
+import stat as stat_module
+
+
+class FSMemo:
+    """realpath() and stat() results of one command evaluation."""
+
+    def __init__(self):
+        # lookups answered from the memo / by the filesystem
+        self.saved = 0
+        self.calls = 0
+        self._realpaths = {}
+        # path -> os.stat_result, or None when stat failed
+        self._stats = {}
+
+    def realpath(self, path):
+        """Return os.path.realpath(path)."""
+        try:
+            resolved = self._realpaths[path]
+        except KeyError:
+            self.calls += 1
+            resolved = self._realpaths[path] = os.path.realpath(path)
+        else:
+            self.saved += 1
+        return resolved
+
+    def stat(self, path):
+        """Return os.stat(path), or None when it fails."""
+        try:
+            result = self._stats[path]
+        except KeyError:
+            self.calls += 1
+            try:
+                result = os.stat(path)
+            except (OSError, ValueError):
+                result = None
+            self._stats[path] = result
+        else:
+            self.saved += 1
+        return result
+
+    def reset(self):
+        """Forget every lookup, keep the counters."""
+        self._realpaths.clear()
+        self._stats.clear()
+
+
+_ACTIVE = None
+# lookups of the session's closed scopes: [calls, saved]
+_TOTALS = [0, 0]
+
+
+@contextlib.contextmanager
+def scope():
+    """Memoize filesystem lookups until the end of the block."""
+    global _ACTIVE
+    previous = _ACTIVE
+    memo = _ACTIVE = FSMemo()
+    try:
+        yield memo
+    finally:
+        _ACTIVE = previous
+        _TOTALS[0] += memo.calls
+        _TOTALS[1] += memo.saved
+
+
+def totals():
+    """Return (calls, saved) of the lookups of the session so far."""
+    return tuple(_TOTALS)
+
+
+def log_totals(log):
+    """Log the lookups of the session at debug level."""
+    calls, saved = totals()
+    log.debug(f"lshell: fsmemo: {saved} filesystem lookups saved, {calls} done")
+
+
+def reset():
+    """Forget the lookups of the active scope, if any."""
+    if _ACTIVE is not None:
+        _ACTIVE.reset()
+
+
+def realpath(path):
+    """os.path.realpath(), memoized in the active scope."""
+    if _ACTIVE is None:
+        return os.path.realpath(path)
+    return _ACTIVE.realpath(path)
+
+
+def stat(path):
+    """os.stat() returning None on failure, memoized in the active scope."""
+    if _ACTIVE is None:
+        try:
+            return os.stat(path)
+        except (OSError, ValueError):
+            return None
+    return _ACTIVE.stat(path)
+
+
+def exists(path):
+    """os.path.exists(), memoized in the active scope."""
+    return stat(path) is not None
+
+
+def isdir(path):
+    """os.path.isdir(), memoized in the active scope."""
+    result = stat(path)
+    return result is not None and stat_module.S_ISDIR(result.st_mode)
+
+
+def chdir(path):
+    """os.chdir(), forgetting the lookups of the active scope."""
+    reset()
+    os.chdir(path)
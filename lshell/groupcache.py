@@ -0,0 +1,212 @@
+"""Cached group database (NSS) lookups.
+
+Group names come from NSS, which may be backed by a slow directory service
+(sssd, LDAP). When 'group_cache_ttl' is set, gid -> name and user -> groups
+mappings are kept in the lshell state cache (see statecache). Group names
+select the [grp:...] sections of a user, so only mappings written by root
+are used; sessions of other users read them, and keep the lookups they make
+themselves in memory. Root fills the mappings of the lshell users with
+``lshell group-cache``, e.g. from cron at an interval below the TTL:
+
+- entries younger than the TTL are used without querying NSS;
+- expired entries are refreshed in a background thread; the lookup waits
+  REFRESH_GRACE seconds for it and otherwise uses the expired value;
+- missing entries are looked up synchronously.
+
+Each mapping holds at most MAX_ENTRIES entries, the oldest are dropped.
+"""
+
+import grp
+import os
+import pwd
+import sys
+import threading
+import time
+
+from lshell import statecache
+
+
+CACHE_NAMESPACE = "groups"
+CACHE_NAME = "nss"
+MAX_ENTRIES = 1024
+REFRESH_GRACE = 0.05
+
+
+def query_group_name(gid):
+    """Return the name of gid from the group database, or None."""
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return None
+
+
+def query_user_groups(username):
+    """Return the groups of username, primary group first, from NSS."""
+    try:
+        user_entry = pwd.getpwnam(username)
+    except KeyError:
+        return []
+
+    discovered = []
+    primary_group = query_group_name(user_entry.pw_gid)
+    if primary_group is not None:
+        discovered.append(primary_group)
+
+    for group_entry in grp.getgrall():
+        if username in group_entry.gr_mem and group_entry.gr_name not in discovered:
+            discovered.append(group_entry.gr_name)
+    return discovered
+
+
+class GroupCache:
+    """TTL'd on-disk cache in front of group database lookups."""
+
+    def __init__(self, ttl=0):
+        try:
+            self.ttl = max(int(ttl), 0)
+        except (TypeError, ValueError):
+            self.ttl = 0
+        # lookups answered from the cache / from NSS
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """True when lookups go through the cache."""
+        return self.ttl > 0
+
+    def group_name(self, gid):
+        """Return the name of gid, or None if it has no group entry."""
+        return self._lookup("gid", str(gid), lambda: query_group_name(gid))
+
+    def user_groups(self, username):
+        """Return the group names of username, primary group first."""
+        return list(
+            self._lookup("user", username, lambda: query_user_groups(username))
+        )
+
+    def fill(self, usernames):
+        """Look up the groups of usernames, and their gids, in NSS."""
+        self._load()
+        for username in usernames:
+            groups = query_user_groups(username)
+            self._remember("user", username, groups)
+            for group_name in groups:
+                try:
+                    gid = grp.getgrnam(group_name).gr_gid
+                except KeyError:
+                    continue
+                self._remember("gid", str(gid), group_name)
+
+    def flush(self):
+        """Persist entries added since the cache was loaded.
+
+        Return False when they could not be stored (only root stores them).
+        """
+        with self._lock:
+            if not self._dirty:
+                return True
+            payload = {kind: dict(entries) for kind, entries in self._entries.items()}
+            self._dirty = False
+        return statecache.store(CACHE_NAMESPACE, CACHE_NAME, payload, system=True)
+
+    def _load(self):
+        with self._lock:
+            if self._entries is None:
+                self._entries = {"gid": {}, "user": {}}
+                payload = statecache.load(CACHE_NAMESPACE, CACHE_NAME, system=True)
+                if isinstance(payload, dict):
+                    for kind, entries in self._entries.items():
+                        if isinstance(payload.get(kind), dict):
+                            entries.update(payload[kind])
+            return self._entries
+
+    def _remember(self, kind, key, value):
+        with self._lock:
+            entries = self._entries[kind]
+            entries[key] = [value, time.time()]
+            if len(entries) > MAX_ENTRIES:
+                oldest = sorted(entries, key=lambda item: entries[item][1])
+                for item in oldest[: len(entries) - MAX_ENTRIES]:
+                    del entries[item]
+            self._dirty = True
+
+    def _lookup(self, kind, key, query):
+        if not self.enabled:
+            return query()
+
+        cached = self._load()[kind].get(key)
+        if not (
+            isinstance(cached, list)
+            and len(cached) == 2
+            and isinstance(cached[1], (int, float))
+        ):
+            self.misses += 1
+            value = query()
+            self._remember(kind, key, value)
+            return value
+
+        value, fetched = cached
+        if time.time() - fetched < self.ttl:
+            self.hits += 1
+            return value
+
+        refreshed = []
+
+        def refresh():
+            refreshed.append(query())
+            self._remember(kind, key, refreshed[0])
+            self.flush()
+
+        thread = threading.Thread(target=refresh, name="lshell-nss-refresh", daemon=True)
+        thread.start()
+        thread.join(REFRESH_GRACE)
+        if refreshed:
+            self.misses += 1
+            return refreshed[0]
+        # NSS is slow: use the expired value, the refresh persists itself
+        self.hits += 1
+        return value
+
+
+def lshell_users():
+    """Return the accounts whose login shell is lshell."""
+    return [
+        entry.pw_name
+        for entry in pwd.getpwall()
+        if os.path.basename(entry.pw_shell) == "lshell"
+    ]
+
+
+def main(argv):
+    """Entry point for `lshell group-cache`."""
+    # pylint: disable-next=import-outside-toplevel
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="lshell group-cache",
+        description="Fill the group database cache used by lshell sessions.",
+    )
+    parser.add_argument(
+        "usernames",
+        nargs="*",
+        help="users to look up (default: accounts whose login shell is lshell)",
+    )
+    args = parser.parse_args(argv)
+
+    if os.geteuid() != 0:
+        sys.stderr.write("lshell: group-cache must be run as root\n")
+        return 1
+    usernames = args.usernames or lshell_users()
+    cache = GroupCache()
+    cache.fill(usernames)
+    if not cache.flush():
+        sys.stderr.write(
+            f"lshell: cannot write the group cache under {statecache.state_root()}\n"
+        )
+        return 1
+    sys.stdout.write(f"lshell: cached the groups of {len(usernames)} users\n")
+    return 0
@@ -0,0 +1,276 @@
+"""Section index for include_dir configuration files.
+
+With one include file per user, reading every file of include_dir on each
+login parses a lot of configuration that does not apply to the user. The
+index maps each section name to the files and byte ranges defining it, so
+logins only read the sections of the user's precedence chain.
+
+The index is stored next to the include files (``.lshell-index.json``, which
+include_dir patterns do not match) and built with ``lshell include-index``.
+It records the fingerprint of every indexed file: when files are added,
+removed or modified, the index is stale and logins read every file again
+until it is rebuilt.
+"""
+
+import configparser
+import glob
+import io
+import json
+import os
+import stat
+import sys
+
+from lshell import statecache
+from lshell import variables
+
+
+INDEX_NAME = ".lshell-index.json"
+INDEX_FORMAT = 1
+
+# configparser's implicit section, which applies to every section of a file
+DEFAULT_SECTION = configparser.DEFAULTSECT
+
+
+def include_pattern(include_dir):
+    """Return the glob pattern used to list the files of include_dir."""
+    return f"{include_dir}*"
+
+
+def index_path(include_dir):
+    """Return the index location for include_dir, or None if unsupported."""
+    directory = os.path.dirname(include_pattern(include_dir)) or "."
+    if glob.has_magic(directory):
+        return None
+    return os.path.join(directory, INDEX_NAME)
+
+
+def _decode(content):
+    """Decode file content as configparser.read() does (text mode, locale encoding)."""
+    return io.TextIOWrapper(io.BytesIO(content)).read()
+
+
+def _scan_sections(path, content):
+    """Return [(section, offset, length)] for the section blocks of a file.
+
+    A block starts at an unindented section header and ends at the next one.
+    Files whose layout the scan cannot mirror exactly are indexed as a single
+    block covering the whole file for each of their sections.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read_string(_decode(content), source=path)
+
+    headers = []
+    offset = 0
+    for line in content.splitlines(keepends=True):
+        if line[:1] == b"[":
+            match = parser.SECTCRE.match(_decode(line).strip())
+            if match:
+                headers.append((match.group("header"), offset))
+        offset += len(line)
+
+    scanned = [name for name, _ in headers if name != DEFAULT_SECTION]
+    if scanned != parser.sections():
+        return [
+            (name, 0, len(content)) for name in parser.sections() + [DEFAULT_SECTION]
+        ]
+
+    blocks = []
+    for position, (name, start) in enumerate(headers):
+        end = headers[position + 1][1] if position + 1 < len(headers) else len(content)
+        blocks.append((name, start, end - start))
+    return blocks
+
+
+def build_index(include_dir):
+    """Index the sections of include_dir files.
+
+    Raise OSError or configparser.Error if a file cannot be read or parsed.
+    """
+    files = []
+    sections = {}
+    for position, path in enumerate(glob.glob(include_pattern(include_dir))):
+        with open(path, "rb") as handle:
+            file_stat = os.fstat(handle.fileno())
+            content = handle.read()
+        files.append(
+            [path, [file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns]]
+        )
+        for name, offset, length in _scan_sections(path, content):
+            sections.setdefault(name, []).append([position, offset, length])
+
+    return {
+        "format": INDEX_FORMAT,
+        "version": variables.__version__,
+        "pattern": include_pattern(include_dir),
+        "files": files,
+        "sections": sections,
+    }
+
+
+def write_index(include_dir):
+    """Build and atomically write the index of include_dir. Return the index."""
+    path = index_path(include_dir)
+    if path is None:
+        raise ValueError(f"include_dir cannot be indexed: {include_dir}")
+    index = build_index(include_dir)
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(index, handle, separators=(",", ":"))
+            os.fchmod(handle.fileno(), 0o644)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return index
+
+
+def _is_trusted(index_stat, directory):
+    if not stat.S_ISREG(index_stat.st_mode):
+        return False
+    if index_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    try:
+        owner = os.stat(directory).st_uid
+    except OSError:
+        return False
+    return index_stat.st_uid in (0, owner)
+
+
+def read_index(include_dir):
+    """Return the stored index of include_dir, or None if missing/untrusted."""
+    path = index_path(include_dir)
+    if path is None:
+        return None
+    try:
+        index_fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError:
+        return None
+
+    try:
+        with os.fdopen(index_fd, "r", encoding="utf-8") as handle:
+            if not _is_trusted(os.fstat(handle.fileno()), os.path.dirname(path)):
+                return None
+            index = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(index, dict) or index.get("format") != INDEX_FORMAT:
+        return None
+    if index.get("pattern") != include_pattern(include_dir):
+        return None
+    return index
+
+
+def is_current(index, include_files):
+    """Return True if index still describes include_files, in the same order."""
+    try:
+        indexed = index["files"]
+        if [path for path, _ in indexed] != list(include_files):
+            return False
+        return all(
+            statecache.fingerprint(path) == marker for path, marker in indexed
+        )
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def read_sections(index, sections):
+    """Return [(path, text)] holding only the given sections, in file order.
+
+    Each file contributes the blocks of the requested sections (and its
+    DEFAULT section, which applies to all of them), so that feeding the texts
+    to configparser in order gives the same result as reading the files.
+    """
+    wanted = {}
+    for name in list(sections) + [DEFAULT_SECTION]:
+        for position, offset, length in index["sections"].get(name, []):
+            wanted.setdefault(position, set()).add((offset, length))
+
+    texts = []
+    for position in sorted(wanted):
+        path = index["files"][position][0]
+        chunks = []
+        with open(path, "rb") as handle:
+            for offset, length in sorted(wanted[position]):
+                handle.seek(offset)
+                chunks.append(handle.read(length))
+        texts.append((path, _decode(b"".join(chunks))))
+    return texts
+
+
+def indexed_sections(include_dir, include_files, sections):
+    """Return [(path, text)] for sections using the index of include_dir.
+
+    Return None when there is no usable index, or when it is stale, in which
+    case every include file has to be read.
+    """
+    index = read_index(include_dir)
+    if index is None or not is_current(index, include_files):
+        return None
+    try:
+        return read_sections(index, sections)
+    except (OSError, LookupError, TypeError, ValueError):
+        return None
+
+
+def main(argv):
+    """Entry point for `lshell include-index`."""
+    # pylint: disable-next=import-outside-toplevel
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="lshell include-index",
+        description="Build the section index of the include_dir configuration files.",
+    )
+    parser.add_argument(
+        "--config",
+        default=variables.configfile,
+        help=f"Config file location (default: {variables.configfile})",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only report whether the index is missing or stale (exit status 1).",
+    )
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser(interpolation=None)
+    try:
+        if not config.read(args.config):
+            sys.stderr.write(f"lshell: config file not found: {args.config}\n")
+            return 1
+    except configparser.Error as exception:
+        sys.stderr.write(f"lshell: {exception}\n")
+        return 1
+    if not config.has_option("global", "include_dir"):
+        sys.stderr.write(f"lshell: no include_dir in {args.config}\n")
+        return 1
+    include_dir = config.get("global", "include_dir")
+    path = index_path(include_dir)
+    if path is None:
+        sys.stderr.write(f"lshell: include_dir cannot be indexed: {include_dir}\n")
+        return 1
+
+    if args.check:
+        index = read_index(include_dir)
+        if index is None:
+            sys.stdout.write(f"{path}: missing\n")
+            return 1
+        if not is_current(index, glob.glob(include_pattern(include_dir))):
+            sys.stdout.write(f"{path}: stale\n")
+            return 1
+        sys.stdout.write(f"{path}: up to date\n")
+        return 0
+
+    try:
+        index = write_index(include_dir)
+    except (OSError, configparser.Error) as exception:
+        sys.stderr.write(f"lshell: {exception}\n")
+        return 1
+    sys.stdout.write(
+        f"{path}: indexed {len(index['sections'])} sections "
+        f"in {len(index['files'])} files\n"
+    )
+    return 0
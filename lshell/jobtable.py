@@ -0,0 +1,185 @@
+"""Table of the background jobs of a session.
+
+Jobs used to live in a list: job IDs were list positions, shifting as jobs
+finished, finding a job took a scan, and every prompt polled every job. The
+table keeps jobs in a dict under stable IDs, and learns that jobs finished
+from the kernel rather than by polling them:
+
+- with pidfds (Linux 5.3, Python 3.9), the pidfd of each process of a job
+  is registered in a selector, and one select() returns the processes that
+  exited since the last prompt;
+- otherwise, a SIGCHLD handler flags that some child changed state, and
+  the jobs are polled only then.
+
+collect() moves the jobs that finished from the table to a queue of notices,
+which the prompt reports with notices(). Jobs that are not child processes
+spawned by lshell (subprocess.Popen or pipeline.Pipeline) cannot have
+pidfds, and are polled on SIGCHLD.
+
+Like bash, a new job gets the highest ID in use plus one, and the current
+job of fg is the one with the highest ID.
+"""
+
+import os
+import selectors
+import signal
+import subprocess
+from collections import deque
+
+from lshell import pipeline
+
+
+def _pids(job):
+    """Return the pids of the processes of job, or None when it is not a
+    child process spawned by lshell.
+    """
+    if isinstance(job, pipeline.Pipeline):
+        return [process.pid for process in job.processes]
+    if isinstance(job, subprocess.Popen):
+        return [job.pid]
+    return None
+
+
+class JobTable:
+    """Background jobs by stable job ID."""
+
+    def __init__(self):
+        # job ID -> job, in ID order
+        self._jobs = {}
+        self._ids = {}
+        # highest job ID in use
+        self._last_id = 0
+        # jobs finished and not reported yet, as (job ID, job)
+        self._notices = deque()
+        self._selector = None
+        # job -> pidfds still registered in the selector
+        self._pidfds = {}
+        # jobs polled when a child changed state
+        self._polled = set()
+        self._child_signalled = False
+        self._sigchld_installed = False
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs.values()))
+
+    def __contains__(self, job):
+        return job in self._ids
+
+    def items(self):
+        """Return the (job ID, job) of the table, in ID order."""
+        return list(self._jobs.items())
+
+    def get(self, job_id):
+        """Return the job of job_id, or None."""
+        return self._jobs.get(job_id)
+
+    def id_of(self, job):
+        """Return the job ID of job, or None."""
+        return self._ids.get(job)
+
+    def current(self):
+        """Return the ID of the most recent job, or None when empty."""
+        return self._last_id if self._jobs else None
+
+    def add(self, job):
+        """Track job, and return its job ID; a tracked job keeps its ID."""
+        job_id = self._ids.get(job)
+        if job_id is not None:
+            return job_id
+        self._last_id = job_id = self._last_id + 1
+        self._jobs[job_id] = job
+        self._ids[job] = job_id
+        if not self._watch(job):
+            self._polled.add(job)
+            self._child_signalled = True
+            self._install_sigchld()
+        return job_id
+
+    def remove(self, job):
+        """Stop tracking job, without reporting it."""
+        job_id = self._ids.pop(job, None)
+        if job_id is None:
+            return
+        del self._jobs[job_id]
+        self._unwatch(job)
+        self._polled.discard(job)
+        if job_id == self._last_id:
+            # the only lookup that is not O(1), when the current job ends
+            self._last_id = max(self._jobs, default=0)
+
+    def clear(self):
+        """Forget every job and notice."""
+        for job in list(self._ids):
+            self.remove(job)
+        self._notices.clear()
+
+    def collect(self):
+        """Move the jobs that finished to the notices."""
+        finished = []
+        if self._selector is not None and self._pidfds:
+            for key, _ in self._selector.select(0):
+                job = key.data
+                self._selector.unregister(key.fd)
+                os.close(key.fd)
+                self._pidfds[job].remove(key.fd)
+                if job.poll() is not None:
+                    finished.append(job)
+                elif not self._pidfds[job]:
+                    # exited but not reaped yet, e.g. by the watchdog thread
+                    self._polled.add(job)
+                    self._child_signalled = True
+        if self._polled and (self._child_signalled or not self._sigchld_installed):
+            self._child_signalled = False
+            finished.extend(job for job in self._polled if job.poll() is not None)
+        # the stages of a pipeline may exit together
+        for job in sorted(dict.fromkeys(finished), key=self._ids.get):
+            self._notices.append((self._ids[job], job))
+            self.remove(job)
+
+    def notices(self):
+        """Return and forget the (job ID, job) of the jobs that finished."""
+        notices = list(self._notices)
+        self._notices.clear()
+        return notices
+
+    def _watch(self, job):
+        """Register the pidfds of job; False when it cannot be watched."""
+        pids = _pids(job)
+        if pids is None or not hasattr(os, "pidfd_open"):
+            return False
+        pidfds = []
+        try:
+            for pid in pids:
+                pidfds.append(os.pidfd_open(pid))
+        except OSError:
+            # reaped already, or pidfds unsupported by the kernel
+            for pidfd in pidfds:
+                os.close(pidfd)
+            return False
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+        for pidfd in pidfds:
+            self._selector.register(pidfd, selectors.EVENT_READ, job)
+        self._pidfds[job] = pidfds
+        return True
+
+    def _unwatch(self, job):
+        for pidfd in self._pidfds.pop(job, ()):
+            self._selector.unregister(pidfd)
+            os.close(pidfd)
+
+    def _install_sigchld(self):
+        if self._sigchld_installed:
+            return
+        try:
+            signal.signal(signal.SIGCHLD, self._on_sigchld)
+        except ValueError:
+            # not the main thread: poll at each collect()
+            return
+        self._sigchld_installed = True
+
+    def _on_sigchld(self, signum, frame):
+        self._child_signalled = True
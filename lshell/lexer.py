@@ -0,0 +1,460 @@
+"""Command line lexer shared by the security checks and the executor.
+
+A command line is split once into a CommandLine: the top-level command
+segments and the operators between them (&&, ||, |, ; and &). Each segment is
+split into words with POSIX shell quoting, the rules of shlex.split(), and
+typed into its assignment prefix, command, arguments, substitutions and
+redirections.
+
+Parsing results are immutable and memoized by text, so the checks and the
+executor, which look at the same line in turn, share one parse instead of
+each tokenizing it again.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Optional, Tuple
+
+
+OPERATORS = frozenset(["&&", "||", "|", ";", "&"])
+# a line may not end with these operators
+_TRAILING_OPERATORS = frozenset(["&&", "||", "|"])
+_WHITESPACE = frozenset(" \t\r\n")
+_ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=.*$")
+_REDIRECTION = re.compile(r"^(\d*|&)(>>|>&|<&|>|<)(.*)$", re.DOTALL)
+_SPACES = re.compile(r"[ \t\r\n]*")
+# a plain run, a single-quoted string, a double-quoted string or an escape
+_WORD_PART = re.compile(r"""[^ \t\r\n\\'"]+|'[^']*'|"(?:[^"\\]|\\.)*"|\\.""", re.DOTALL)
+_DOUBLE_QUOTE_ESCAPE = re.compile(r'\\(["\\])')
+# lines without quotes, escapes or substitutions split on operators alone
+_PLAIN_LINE = re.compile(r"""[^'"`$\\]*""")
+_OPERATOR = re.compile(r"&&|\|\||[;|&]")
+_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class Word:
+    """A shell word: its source text and its value once quotes are removed."""
+
+    text: str
+    value: str
+    # True when any part of the word was quoted
+    quoted: bool = False
+
+
+@dataclass(frozen=True)
+class Segment:
+    """A simple command, e.g. 'A=1 grep -r "x y" src >out'."""
+
+    text: str
+    words: Tuple[Word, ...] = ()
+    # quoting error (e.g. 'No closing quotation'), the segment has no words
+    error: Optional[str] = None
+    # leading VAR=VALUE words, as (name, value)
+    assignments: Tuple[Tuple[str, str], ...] = ()
+    # first word after the assignments, "" for assignment-only segments
+    command: str = ""
+    args: Tuple[str, ...] = ()
+
+    @property
+    def values(self):
+        """The word values, as shlex.split() returns them."""
+        return [word.value for word in self.words]
+
+    @cached_property
+    def substitutions(self):
+        """The $(...), `...` and ${...} found outside of single quotes."""
+        if "$" not in self.text and "`" not in self.text:
+            return ()
+        return _substitutions(self.text)
+
+    @cached_property
+    def redirections(self):
+        """The unquoted redirections of the arguments, as (operator, target)."""
+        return _redirections(self.words[len(self.assignments) + 1 :])
+
+
+@dataclass(frozen=True)
+class CommandLine:
+    """A command line: segments and the operators between them."""
+
+    text: str
+    # [segment, operator, segment, ...], or None if the line is malformed
+    # (unbalanced quotes or substitutions, misplaced operators)
+    items: Optional[Tuple[object, ...]] = None
+
+    @property
+    def valid(self):
+        """False when the line could not be split into segments."""
+        return self.items is not None
+
+    @property
+    def sequence(self):
+        """The items as strings, [command, operator, command, ...]."""
+        if self.items is None:
+            return None
+        return [item if isinstance(item, str) else item.text for item in self.items]
+
+    @property
+    def segments(self):
+        """The segments, without the operators."""
+        return [item for item in self.items or () if isinstance(item, Segment)]
+
+    @property
+    def words(self):
+        """The words of the whole line, as shlex.split() returns them."""
+        return parse_segment(self.text).words
+
+
+def is_assignment_word(word):
+    """True for VAR=VALUE words."""
+    return bool(_ASSIGNMENT.match(word))
+
+
+def split_words(text):
+    """Split text into Words like shlex.split(text); raise ValueError on
+    unbalanced quotes or a trailing escape character.
+    """
+    words = []
+    length = len(text)
+    position = _SPACES.match(text).end()
+    while position < length:
+        start = position
+        value = []
+        quoted = False
+        while True:
+            match = _WORD_PART.match(text, position)
+            if match is None:
+                break
+            part = match.group()
+            first = part[0]
+            if first == "'":
+                quoted = True
+                value.append(part[1:-1])
+            elif first == '"':
+                quoted = True
+                value.append(_DOUBLE_QUOTE_ESCAPE.sub(r"\1", part[1:-1]))
+            elif first == "\\":
+                value.append(part[1])
+            else:
+                value.append(part)
+            position = match.end()
+        if position < length and text[position] not in _WHITESPACE:
+            # unbalanced quote or trailing escape: report it like shlex
+            return _split_words_slowly(text)
+        words.append(Word(text[start:position], "".join(value), quoted))
+        position = _SPACES.match(text, position).end()
+    return tuple(words)
+
+
+def _split_words_slowly(text):
+    """Character by character split_words(), raising shlex's errors."""
+    words = []
+    length = len(text)
+    position = 0
+    while True:
+        while position < length and text[position] in _WHITESPACE:
+            position += 1
+        if position >= length:
+            return tuple(words)
+
+        start = position
+        value = []
+        quoted = False
+        while position < length:
+            char = text[position]
+            if char in _WHITESPACE:
+                break
+            if char == "\\":
+                if position + 1 >= length:
+                    raise ValueError("No escaped character")
+                value.append(text[position + 1])
+                position += 2
+            elif char == "'":
+                quoted = True
+                end = text.find("'", position + 1)
+                if end < 0:
+                    raise ValueError("No closing quotation")
+                value.append(text[position + 1 : end])
+                position = end + 1
+            elif char == '"':
+                quoted = True
+                position += 1
+                while True:
+                    if position >= length:
+                        raise ValueError("No closing quotation")
+                    char = text[position]
+                    if char == '"':
+                        position += 1
+                        break
+                    if char == "\\":
+                        if position + 1 >= length:
+                            raise ValueError("No escaped character")
+                        escaped = text[position + 1]
+                        # only \" and \\ are escapes within double quotes
+                        if escaped not in ('"', "\\"):
+                            value.append("\\")
+                        value.append(escaped)
+                        position += 2
+                    else:
+                        value.append(char)
+                        position += 1
+            else:
+                value.append(char)
+                position += 1
+        words.append(Word(text[start:position], "".join(value), quoted))
+
+
+def _substitutions(text):
+    """Return the $(...), `...` and ${...} of text outside of single quotes."""
+    found = []
+    length = len(text)
+    in_single = False
+    in_double = False
+    position = 0
+    while position < length:
+        char = text[position]
+        if char == "\\" and not in_single:
+            position += 2
+            continue
+        if char == "'" and not in_double:
+            in_single = not in_single
+        elif char == '"' and not in_single:
+            in_double = not in_double
+        elif not in_single and (char == "`" or text.startswith(("$(", "${"), position)):
+            if char == "`":
+                opening, closing = "`", "`"
+            else:
+                opening, closing = text[position : position + 2], (
+                    ")" if text[position + 1] == "(" else "}"
+                )
+            depth = 1
+            end = position + len(opening)
+            while end < length and depth:
+                if text[end] == "\\":
+                    end += 2
+                    continue
+                if closing != "`" and text.startswith(opening, end):
+                    depth += 1
+                    end += len(opening)
+                    continue
+                if text[end] == closing:
+                    depth -= 1
+                end += 1
+            found.append(text[position:end])
+            position = end
+            continue
+        position += 1
+    return tuple(found)
+
+
+def _redirections(words):
+    """Return the unquoted redirections of words, as (operator, target)."""
+    found = []
+    index = 0
+    while index < len(words):
+        word = words[index]
+        match = None if word.quoted else _REDIRECTION.match(word.value)
+        if match:
+            operator = match.group(1) + match.group(2)
+            target = match.group(3)
+            if not target and index + 1 < len(words):
+                index += 1
+                target = words[index].value
+            found.append((operator, target))
+        index += 1
+    return tuple(found)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse_segment(text):
+    """Return the Segment of a simple command."""
+    try:
+        words = split_words(text)
+    except ValueError as exception:
+        return Segment(text, error=str(exception))
+
+    assignments = []
+    position = 0
+    while position < len(words) and is_assignment_word(words[position].value):
+        name, value = words[position].value.split("=", 1)
+        assignments.append((name, value))
+        position += 1
+
+    command = words[position].value if position < len(words) else ""
+    args = tuple(word.value for word in words[position + 1 :])
+    return Segment(text, words, None, tuple(assignments), command, args)
+
+
+def _split_plain_sequence(line):
+    """Split a line without quotes, escapes or substitutions on operators."""
+    tokens = []
+    start = 0
+    for match in _OPERATOR.finditer(line):
+        operator = match.group()
+        command = line[start : match.start()].strip()
+        # '>&' and '<&' are redirections, not background operators
+        if operator == "&" and command[-1:] in (">", "<"):
+            continue
+        if command:
+            tokens.append(command)
+        tokens.append(operator)
+        start = match.end()
+    command = line[start:].strip()
+    if command:
+        tokens.append(command)
+    return tokens
+
+
+def _split_sequence(line):
+    """Return a tokenized top-level command sequence [cmd, op, cmd, ...]."""
+    if not line or not line.strip():
+        return []
+
+    if _PLAIN_LINE.fullmatch(line):
+        return _validate_sequence(_split_plain_sequence(line))
+
+    tokens = []
+    current = []
+    in_single = False
+    in_double = False
+    in_backtick = False
+    escaped = False
+    cmd_subst_depth = 0
+    var_brace_depth = 0
+    i = 0
+
+    def flush_current():
+        command = "".join(current).strip()
+        if command:
+            tokens.append(command)
+        current.clear()
+
+    while i < len(line):
+        char = line[i]
+        next_char = line[i + 1] if i + 1 < len(line) else ""
+
+        if escaped:
+            current.append(char)
+            escaped = False
+            i += 1
+            continue
+
+        if char == "\\" and not in_single:
+            current.append(char)
+            escaped = True
+            i += 1
+            continue
+
+        if not in_double and not in_backtick and char == "'":
+            in_single = not in_single
+            current.append(char)
+            i += 1
+            continue
+
+        if not in_single and not in_backtick and char == '"':
+            in_double = not in_double
+            current.append(char)
+            i += 1
+            continue
+
+        if not in_single and char == "`":
+            in_backtick = not in_backtick
+            current.append(char)
+            i += 1
+            continue
+
+        if not in_single and not in_backtick and char == "$" and next_char == "(":
+            cmd_subst_depth += 1
+            current.append(char)
+            current.append(next_char)
+            i += 2
+            continue
+
+        if not in_single and not in_backtick and char == "$" and next_char == "{":
+            var_brace_depth += 1
+            current.append(char)
+            current.append(next_char)
+            i += 2
+            continue
+
+        if cmd_subst_depth > 0 and not in_single and not in_backtick and char == ")":
+            cmd_subst_depth -= 1
+            current.append(char)
+            i += 1
+            continue
+
+        if var_brace_depth > 0 and not in_single and not in_backtick and char == "}":
+            var_brace_depth -= 1
+            current.append(char)
+            i += 1
+            continue
+
+        is_top_level = (
+            not in_single
+            and not in_double
+            and not in_backtick
+            and cmd_subst_depth == 0
+            and var_brace_depth == 0
+        )
+
+        if is_top_level:
+            op = None
+            if char == "&" and next_char == "&":
+                op = "&&"
+            elif char == "|" and next_char == "|":
+                op = "||"
+            elif char == ";":
+                op = ";"
+            elif char == "|":
+                op = "|"
+            elif char == "&":
+                prev_non_space = "".join(current).rstrip()
+                prev_char = prev_non_space[-1] if prev_non_space else ""
+                if prev_char not in [">", "<"]:
+                    op = "&"
+
+            if op:
+                flush_current()
+                tokens.append(op)
+                i += len(op)
+                continue
+
+        current.append(char)
+        i += 1
+
+    if in_single or in_double or in_backtick or cmd_subst_depth or var_brace_depth:
+        return None
+
+    flush_current()
+    return _validate_sequence(tokens)
+
+
+def _validate_sequence(tokens):
+    """Return tokens, or None when operators are misplaced."""
+    if not tokens:
+        return []
+    for idx in range(1, len(tokens)):
+        if tokens[idx - 1] in OPERATORS and tokens[idx] in OPERATORS:
+            return None
+    if tokens[0] in OPERATORS:
+        return None
+    if tokens[-1] in _TRAILING_OPERATORS:
+        return None
+
+    return tokens
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse(line):
+    """Return the CommandLine of line."""
+    tokens = _split_sequence(line)
+    if tokens is None:
+        return CommandLine(line)
+    return CommandLine(
+        line,
+        tuple(
+            token if token in OPERATORS else parse_segment(token) for token in tokens
+        ),
+    )
@@ -1,5 +1,6 @@
 """ Custom shell command parser with advanced tokenization and error handling """
 
+from functools import lru_cache
 from typing import Optional
 from pyparsing import (
     Word,
@@ -16,17 +17,30 @@ from pyparsing import (
     printables,
     OneOrMore,
     SkipTo,
+    ParserElement,
 )
 
+# default bound of the packrat cache, in parse results
+PACKRAT_CACHE_SIZE = 128
+
 
 class LshellParser:
     """Custom shell command parser"""
 
-    def __init__(self):
-        """Initialize the parser with custom settings"""
+    def __init__(self, packrat=False, packrat_cache_size=PACKRAT_CACHE_SIZE):
+        """Initialize the parser with custom settings
+
+        packrat enables pyparsing's packrat memoization, bounded to
+        packrat_cache_size results. It applies to every pyparsing grammar of
+        the process, not only to this parser. It only pays off on inputs
+        that make the grammar backtrack heavily; on typical command lines it
+        is slower, hence disabled by default.
+        """
         # Improved tokenization
         self._escape_char = "\\"
         self._quote_chars = ['"', "'"]
+        if packrat:
+            ParserElement.enable_packrat(cache_size_limit=packrat_cache_size)
 
     def _handle_escaped_chars(self, token: str) -> str:
         """
@@ -77,7 +91,15 @@ class LshellParser:
         # For non-quoted strings, just handle escaped chars
         return self._handle_escaped_chars(token)
 
-    def _build_grammar(self):
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def grammar():
+        """Return the grammar, built once per process and shared by all
+        parsers"""
+        return LshellParser._build_grammar()
+
+    @staticmethod
+    def _build_grammar():
         """
         Construct a more robust parsing grammar with background support
         """
@@ -185,7 +207,7 @@ class LshellParser:
         try:
             # Clean the input first
             cleaned_command = self._clean_input(command)
-            grammar = self._build_grammar()
+            grammar = self.grammar()
             parsed_result = grammar.parse_string(cleaned_command, parse_all=True)
             ret = parsed_result
         except ParseException:
@@ -0,0 +1,92 @@
+"""Compiled path ACL.
+
+The 'path' policy is a list of allowed and denied directory roots. A path is
+allowed when the most specific root containing it is an allowed one; when an
+allowed and a denied root are equally specific (the same directory), deny
+wins. With no allowed root at all, every path that is not denied is allowed.
+
+PathACL stores the roots in a trie of path components, with the verdict of a
+root on its node, so a path is resolved in one walk over its components
+instead of comparing it with every root.
+"""
+
+import os
+
+
+# key of the verdict in a trie node, next to the component keys
+_VERDICT = None
+
+
+def _components(path):
+    """Split an absolute path like os.path.commonpath does."""
+    return [part for part in path.split(os.sep) if part and part != os.curdir]
+
+
+class PathACL:
+    """Most-specific-wins trie of canonical allowed and denied roots."""
+
+    __slots__ = ("source", "restricted", "_root")
+
+    def __init__(self, allowed_roots, denied_roots, source=None):
+        # the ACL the roots were resolved from, to detect a changed policy
+        self.source = source
+        self.restricted = bool(allowed_roots)
+        self._root = {}
+        for roots, verdict in ((allowed_roots, True), (denied_roots, False)):
+            for root in roots:
+                node = self._root
+                for part in _components(root):
+                    node = node.setdefault(part, {})
+                # denied roots are inserted last: ties favor deny
+                node[_VERDICT] = verdict
+
+    def __eq__(self, other):
+        if not isinstance(other, PathACL):
+            return NotImplemented
+        return (self.restricted, self._root) == (other.restricted, other._root)
+
+    __hash__ = None
+
+    def allows(self, path):
+        """True when the canonical path passes the ACL."""
+        verdict = not self.restricted
+        # relative paths are never within a root
+        if not path.startswith(os.sep):
+            return verdict
+
+        node = self._root
+        verdict = node.get(_VERDICT, verdict)
+        for part in _components(path):
+            node = node.get(part)
+            if node is None:
+                break
+            verdict = node.get(_VERDICT, verdict)
+        return verdict
+
+    def denies_subtree(self, path):
+        """True when the canonical path and everything below it is denied,
+        i.e. it is denied and no allowed root lies beneath it.
+        """
+        if not path.startswith(os.sep):
+            return self.restricted
+
+        node = self._root
+        verdict = node.get(_VERDICT, not self.restricted)
+        for part in _components(path):
+            node = node.get(part)
+            if node is None:
+                return not verdict
+            verdict = node.get(_VERDICT, verdict)
+        if verdict:
+            return False
+
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            for key, child in node.items():
+                if key is _VERDICT:
+                    if child:
+                        return False
+                else:
+                    pending.append(child)
+        return True
@@ -0,0 +1,144 @@
+"""Catalog of the executables found in PATH-like directories.
+
+Expanding ``allowed: 'all'`` or ``allowed_cmd_path`` used to list every
+directory and call access(2) on each entry, on every login and reload. The
+catalog stores one index per directory in the lshell state directory, keyed
+by the directory's stat fingerprint, so a directory is only rescanned after
+an entry was added, removed or renamed in it. Only indexes written by root
+are used (see statecache); other users scan the directories themselves.
+
+The index records the mode and ownership of each entry, which lets every user
+evaluate execute permission for themselves without a system call per entry.
+A chmod or chown of an entry does not change the directory: it is seen once
+the directory changes. Until then the index may list a name the kernel
+refuses to run, or miss one that became executable. The state of symlink
+targets lives outside the directory, so symlinks are checked again with
+stat(2), and entries carrying an access control list are checked with
+access(2).
+"""
+
+import os
+import stat
+
+from lshell import statecache
+
+
+CATALOG_NAMESPACE = "catalog"
+CATALOG_FORMAT = 2
+
+_ACL_XATTRS = ("system.posix_acl_access", "system.nfs4_acl")
+
+
+def _entry_state(entry_stat):
+    return [entry_stat.st_mode, entry_stat.st_uid, entry_stat.st_gid]
+
+
+def _has_acl(path):
+    """True when path carries an access control list mode bits do not show."""
+    try:
+        return any(name in _ACL_XATTRS for name in os.listxattr(path))
+    except (AttributeError, OSError):
+        return False
+
+
+def _scan(directory):
+    """Index directory entries as [name, mode, uid, gid, flags], in listdir
+    order, flags being "l" for symlinks and "a" for entries with an ACL.
+
+    Dangling symlinks are recorded with a None mode: they are never
+    executable, but their target may appear later.
+    """
+    entries = []
+    with os.scandir(directory) as iterator:
+        for entry in iterator:
+            flags = ""
+            try:
+                if entry.is_symlink():
+                    flags += "l"
+                state = _entry_state(entry.stat())
+                if _has_acl(entry.path):
+                    flags += "a"
+            except OSError:
+                state = [None, None, None]
+            entries.append([entry.name, *state, flags])
+
+    noexec = False
+    try:
+        noexec = bool(os.statvfs(directory).f_flag & getattr(os, "ST_NOEXEC", 0))
+    except OSError:
+        pass
+    return {"format": CATALOG_FORMAT, "noexec": noexec, "entries": entries}
+
+
+def _load(directory, marker):
+    """Return the stored catalog for directory if it is still current."""
+    catalog = statecache.load(CATALOG_NAMESPACE, directory, system=True)
+    if not (
+        isinstance(catalog, dict)
+        and catalog.get("format") == CATALOG_FORMAT
+        and catalog.get("marker") == marker
+        and isinstance(catalog.get("entries"), list)
+    ):
+        return None
+    return catalog
+
+
+def _can_execute(mode, uid, gid, noexec, identity):
+    """Mirror access(X_OK) for the real user described by identity."""
+    real_uid, group_ids = identity
+    if stat.S_ISDIR(mode) and real_uid == 0:
+        return True
+    if noexec and not stat.S_ISDIR(mode):
+        return False
+    if real_uid == 0:
+        return bool(mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
+
+    if uid == real_uid:
+        permission = stat.S_IXUSR
+    elif gid in group_ids:
+        permission = stat.S_IXGRP
+    else:
+        permission = stat.S_IXOTH
+    return bool(mode & permission)
+
+
+def executables(directory):
+    """Return the names in directory that the current user can execute.
+
+    Results match os.listdir() filtered with os.access(X_OK), in the same
+    order, as of the last change of the directory (see the module
+    docstring). OSError is raised when the directory cannot be listed.
+    """
+    marker = statecache.fingerprint(directory)
+    catalog = _load(directory, marker) if marker is not None else None
+    if catalog is None:
+        catalog = _scan(directory)
+        if marker is not None:
+            catalog["marker"] = marker
+            statecache.store(CATALOG_NAMESPACE, directory, catalog, system=True)
+
+    identity = (os.getuid(), set(os.getgroups()) | {os.getgid()})
+    noexec = bool(catalog.get("noexec"))
+    names = []
+    for item in catalog["entries"]:
+        try:
+            name, mode, uid, gid, flags = item
+            path = os.path.join(directory, name)
+        except (TypeError, ValueError):
+            continue
+        if "l" in flags:
+            try:
+                mode, uid, gid = _entry_state(os.stat(path))
+            except OSError:
+                continue
+            if _has_acl(path):
+                flags += "a"
+        if mode is None:
+            continue
+        if "a" in flags:
+            executable = os.access(path, os.X_OK)
+        else:
+            executable = _can_execute(mode, uid, gid, noexec, identity)
+        if executable:
+            names.append(name)
+    return names
@@ -0,0 +1,129 @@
+"""Pipelines of simple commands executed without a shell.
+
+cmd_parse_execute checks each command of 'cmd1 | cmd2 | cmd3' on its own,
+and exec_cmd used to hand the joined line to bash -c, which parsed it again
+and stayed around as one more process. When every command of the pipeline
+can be executed directly, spawn() starts them itself, connected by os.pipe()
+and in one new process group led by the first command.
+
+A Pipeline stands for its processes where exec_cmd and the job builtins
+expect a subprocess.Popen:
+
+- its pid is the one of the group leader, which is reaped last, so that
+  os.getpgid(pipeline.pid) names the group while any command still runs;
+- its returncode is the one of the last command, as bash reports it without
+  pipefail: 128+N when that command was killed by signal N.
+
+Joining the process group of the leader needs the process_group argument of
+subprocess.Popen (Python 3.11), which keeps spawning free of a preexec_fn.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+SUPPORTED = os.name == "posix" and sys.version_info >= (3, 11)
+
+
+def _status(returncode):
+    """Return returncode as bash reports it."""
+    return 128 - returncode if returncode < 0 else returncode
+
+
+class Pipeline:
+    """The processes of one pipeline, behaving like a subprocess.Popen."""
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.pid = processes[0].pid
+        self.args = []
+        for process in processes:
+            if self.args:
+                self.args.append("|")
+            self.args.extend(process.args)
+        self.returncode = None
+
+    def _reaping_order(self):
+        # the leader last: its pid names the process group
+        return self.processes[1:] + self.processes[:1]
+
+    def poll(self):
+        """Return the status of the pipeline, or None while it runs."""
+        if self.returncode is None:
+            for process in self._reaping_order():
+                if process.poll() is None:
+                    return None
+            self.returncode = _status(self.processes[-1].returncode)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """Wait for every command, raise subprocess.TimeoutExpired after
+        timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for process in self._reaping_order():
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            try:
+                process.wait(remaining)
+            except subprocess.TimeoutExpired:
+                raise subprocess.TimeoutExpired(self.args, timeout) from None
+        return self.poll()
+
+    def communicate(self, timeout=None):
+        """Wait like wait(); the pipeline never has pipes to lshell."""
+        self.wait(timeout)
+        return None, None
+
+
+def spawn(stages, stdin=None, stdout=None, stderr=None, **popen_kwargs):
+    """Start the (executable, argv) stages connected by pipes, and return
+    their Pipeline. stdin feeds the first stage and stdout receives the last
+    one; the other arguments are given to every subprocess.Popen.
+
+    When a stage cannot be executed, the stages started are killed and the
+    OSError of subprocess.Popen is raised, e.g. with errno ENOEXEC for a
+    script without a shebang, which only bash can run.
+    """
+    processes = []
+    # descriptors of the pipes still open in lshell
+    pending = []
+    try:
+        for position, (executable, argv) in enumerate(stages):
+            stage_stdin = pending[0] if pending else stdin
+            stage_stdout = stdout
+            if position < len(stages) - 1:
+                read_end, stage_stdout = os.pipe()
+                pending += [read_end, stage_stdout]
+            processes.append(
+                subprocess.Popen(
+                    argv,
+                    executable=executable,
+                    stdin=stage_stdin,
+                    stdout=stage_stdout,
+                    stderr=stderr,
+                    process_group=processes[0].pid if processes else 0,
+                    **popen_kwargs,
+                )
+            )
+            # the children hold their own copies
+            for descriptor in (stage_stdin, stage_stdout):
+                if descriptor in pending:
+                    pending.remove(descriptor)
+                    os.close(descriptor)
+    except BaseException:
+        for descriptor in pending:
+            os.close(descriptor)
+        if processes:
+            try:
+                os.killpg(processes[0].pid, signal.SIGKILL)
+            except OSError:
+                pass
+            for process in processes:
+                process.wait()
+        raise
+    return Pipeline(processes)
@@ -3,32 +3,28 @@
 import argparse
 import configparser
 import glob
-import grp
+import itertools
 import json
 import os
-import pwd
 import re
 import sys
 import textwrap
 from getpass import getuser
 
+from lshell import authindex
 from lshell import builtincmd
 from lshell import containment
+from lshell import forbidden
+from lshell import groupcache
+from lshell import includeindex
+from lshell import pathcatalog
+from lshell import policyresolver
 from lshell import configschema
 from lshell import sec
 from lshell import utils
 from lshell import variables
 
 
-MERGE_LIST_KEYS = {
-    "path",
-    "overssh",
-    "allowed",
-    "allowed_shell_escape",
-    "allowed_file_extensions",
-    "forbidden",
-}
-
 DISPLAY_KEY_ORDER = [
     "allowed",
     "allowed_shell_escape",
@@ -66,221 +62,78 @@ def _safe_eval(value, key=""):
     return configschema.parse_config_value(value, key)
 
 
-def _expand_all():
-    """Expand 'all' into executable names from PATH plus shell builtins."""
-    expanded_all = [
-        "bg",
-        "break",
-        "case",
-        "cd",
-        "continue",
-        "eval",
-        "exec",
-        "exit",
-        "fg",
-        "if",
-        "jobs",
-        "kill",
-        "login",
-        "logout",
-        "set",
-        "shift",
-        "stop",
-        "suspend",
-        "umask",
-        "unset",
-        "wait",
-        "while",
-    ]
-
-    for directory in os.environ.get("PATH", "").split(":"):
-        if not directory:
-            continue
-        if os.path.exists(directory):
-            for item in os.listdir(directory):
-                if os.access(os.path.join(directory, item), os.X_OK):
-                    expanded_all.append(item)
-
-    return str(expanded_all)
+# Per-source parsers use a default section name that cannot appear in a
+# file, so that a [DEFAULT] section is read like any other section and
+# section items do not include inherited defaults.
+_SOURCE_DEFAULT_SECTION = "\0lshell-source-defaults"
 
 
-def _minusplus(conf_raw, key, extra):
-    """Update configuration lists containing -/+ operators."""
-    if key in conf_raw:
-        current = _safe_eval(conf_raw[key], key)
-    elif key == "path":
-        current = ["", ""]
+def _read_source(file_path, text=None):
+    """Parse a single config source and return its parser."""
+    source_parser = configparser.ConfigParser(
+        interpolation=None, default_section=_SOURCE_DEFAULT_SECTION
+    )
+    if text is None:
+        source_parser.read(file_path)
     else:
-        current = []
-
-    sublist = _safe_eval(extra[1:], key)
-    if extra.startswith("+"):
-        if key == "path":
-            for path in sublist:
-                current[0] += os.path.realpath(path) + "/|"
-        else:
-            for item in sublist:
-                current.append(item)
-    elif extra.startswith("-"):
-        if key == "path":
-            for path in sublist:
-                current[1] += os.path.realpath(path) + "/|"
-        else:
-            for item in sublist:
-                if item in current:
-                    current.remove(item)
-
-    return {key: str(current)}
-
-
-def _read_config_with_sources(configfile, include_dir):
-    """Load config files and return parser + key source mapping."""
-    parser = configparser.ConfigParser(interpolation=None)
-    read_files = [configfile]
+        source_parser.read_string(text, source=file_path)
+    return source_parser
+
+
+def _read_config_with_sources(configfile, sections=None):
+    """Load config files and return merged sections, include files and key sources.
+
+    Each source is parsed once and merged in order, as ConfigParser.read()
+    would, while recording the file that last set each (section, key). The
+    merged sections map each section to its items, defaults included. When
+    sections is given and include_dir has an up to date index, only these
+    sections are read from the include files.
+    """
+    main_parser = _read_source(configfile)
+    if not main_parser.has_section("global"):
+        raise ValueError("Config file missing [global] section")
+
+    include_dir = None
+    if main_parser.has_option("global", "include_dir"):
+        include_dir = main_parser.get("global", "include_dir")
     include_files = []
     if include_dir:
-        include_files = glob.glob(f"{include_dir}*")
-        read_files.extend(include_files)
-    parser.read(read_files)
+        include_files = glob.glob(includeindex.include_pattern(include_dir))
+
+    indexed = None
+    if include_files and sections is not None:
+        indexed = includeindex.indexed_sections(include_dir, include_files, sections)
+    if indexed is None:
+        indexed = [(file_path, None) for file_path in include_files]
 
+    merged = {}
+    defaults = {}
     key_sources = {}
-    for file_path in read_files:
-        file_parser = configparser.ConfigParser(interpolation=None)
-        file_parser.read(file_path)
-        for section in file_parser.sections():
-            for key, _ in file_parser.items(section):
+    include_parsers = (
+        (file_path, _read_source(file_path, text)) for file_path, text in indexed
+    )
+    for file_path, source_parser in itertools.chain(
+        [(configfile, main_parser)], include_parsers
+    ):
+        file_defaults = {}
+        if source_parser.has_section(configparser.DEFAULTSECT):
+            file_defaults = dict(source_parser.items(configparser.DEFAULTSECT))
+            defaults.update(file_defaults)
+        for section in source_parser.sections():
+            if section == configparser.DEFAULTSECT:
+                continue
+            section_items = dict(source_parser.items(section))
+            merged.setdefault(section, {}).update(section_items)
+            # like ConfigParser.items(), a file's defaults apply to its sections
+            for key in itertools.chain(file_defaults, section_items):
                 key_sources[(section, key)] = file_path
-    return parser, include_files, key_sources
-
-
-def _merge_section(conf_raw, section, section_items, key_sources, trace):
-    """Apply a single section to conf_raw while recording trace details."""
-    for key, value in section_items:
-        source = key_sources.get((section, key))
-        split = [""]
-        if isinstance(value, str):
-            split = re.split(r"((?:\+|-)\s*\[[^\]]+\])", value)
-
-        previous = conf_raw.get(key)
-
-        if len(split) > 1 and key in MERGE_LIST_KEYS:
-            for token in split:
-                if not token.strip():
-                    continue
-                if token.startswith("-") or token.startswith("+"):
-                    conf_raw.update(_minusplus(conf_raw, key, token))
-                    trace.append(
-                        {
-                            "section": section,
-                            "source": source,
-                            "key": key,
-                            "op": token[0],
-                            "token": token[1:],
-                            "before": previous,
-                            "after": conf_raw.get(key),
-                        }
-                    )
-                    previous = conf_raw.get(key)
-                elif configschema.is_all_literal(token):
-                    if key == "allowed_shell_escape":
-                        raise ValueError(
-                            "'allowed_shell_escape' cannot be set to 'all'"
-                        )
-                    if key == "allowed":
-                        conf_raw.update({key: _expand_all()})
-                    else:
-                        raise ValueError(f"'{key}' cannot be set to 'all'")
-                    trace.append(
-                        {
-                            "section": section,
-                            "source": source,
-                            "key": key,
-                            "op": "set_all",
-                            "token": token,
-                            "before": previous,
-                            "after": conf_raw.get(key),
-                        }
-                    )
-                    previous = conf_raw.get(key)
-                elif key == "path":
-                    allow_deny = ["", ""]
-                    for path_pattern in _safe_eval(token, key):
-                        for item in glob.glob(path_pattern):
-                            allow_deny[0] += os.path.realpath(item) + "/|"
-                    allow_deny[0] = allow_deny[0].replace("//", "/")
-                    conf_raw.update({key: str(allow_deny)})
-                    trace.append(
-                        {
-                            "section": section,
-                            "source": source,
-                            "key": key,
-                            "op": "set",
-                            "token": token,
-                            "before": previous,
-                            "after": conf_raw.get(key),
-                        }
-                    )
-                    previous = conf_raw.get(key)
-                elif isinstance(_safe_eval(token, key), list):
-                    conf_raw.update({key: token})
-                    trace.append(
-                        {
-                            "section": section,
-                            "source": source,
-                            "key": key,
-                            "op": "set",
-                            "token": token,
-                            "before": previous,
-                            "after": conf_raw.get(key),
-                        }
-                    )
-                    previous = conf_raw.get(key)
-        elif key == "allowed" and configschema.is_all_literal(split[0]):
-            conf_raw.update({key: _expand_all()})
-            trace.append(
-                {
-                    "section": section,
-                    "source": source,
-                    "key": key,
-                    "op": "set_all",
-                    "token": split[0],
-                    "before": previous,
-                    "after": conf_raw.get(key),
-                }
-            )
-        elif key == "allowed_shell_escape" and configschema.is_all_literal(split[0]):
-            raise ValueError("'allowed_shell_escape' cannot be set to 'all'")
-        elif key == "path":
-            allow_deny = ["", ""]
-            for path_pattern in _safe_eval(value, "path"):
-                for item in glob.glob(path_pattern):
-                    allow_deny[0] += os.path.realpath(item) + "/|"
-            allow_deny[0] = allow_deny[0].replace("//", "/")
-            conf_raw.update({key: str(allow_deny)})
-            trace.append(
-                {
-                    "section": section,
-                    "source": source,
-                    "key": key,
-                    "op": "set",
-                    "token": value,
-                    "before": previous,
-                    "after": conf_raw.get(key),
-                }
-            )
-        else:
-            conf_raw[key] = value
-            trace.append(
-                {
-                    "section": section,
-                    "source": source,
-                    "key": key,
-                    "op": "set",
-                    "token": value,
-                    "before": previous,
-                    "after": conf_raw.get(key),
-                }
-            )
+
+    if defaults:
+        merged = {
+            section: {**defaults, **section_items}
+            for section, section_items in merged.items()
+        }
+    return merged, include_files, key_sources
 
 
 def _build_runtime_policy(conf_raw, username):
@@ -353,10 +206,7 @@ def _build_runtime_policy(conf_raw, username):
 
     for path in policy.get("allowed_cmd_path", []):
         if os.path.isdir(path):
-            for item in os.listdir(path):
-                cmd = os.path.join(path, item)
-                if os.access(cmd, os.X_OK):
-                    policy["allowed"].append(item)
+            policy["allowed"].extend(pathcatalog.executables(path))
 
     if "sudo_commands" in conf_raw and configschema.is_all_literal(
         str(conf_raw["sudo_commands"])
@@ -382,43 +232,47 @@ def _build_runtime_policy(conf_raw, username):
     return policy
 
 
-def resolve_policy(configfile, username, groups):
-    """Resolve effective policy and detailed merge trace for policy-show mode."""
-    parser = configparser.ConfigParser(interpolation=None)
-    parser.read(configfile)
-    if not parser.has_section("global"):
-        raise ValueError("Config file missing [global] section")
+def load_policy_config(configfile, sections=None):
+    """Read configfile and its include files for policy resolution.
+
+    Return (resolver, include_files). A resolver loaded for all sections can
+    be shared when resolving many users, so that common section chains
+    (e.g. default, then grp:ops) are only merged once.
+    """
+    config, include_files, key_sources = _read_config_with_sources(
+        configfile, sections
+    )
+    resolver = policyresolver.PolicyResolver(config, key_sources=key_sources)
+    return resolver, include_files
 
-    include_dir = None
-    if parser.has_option("global", "include_dir"):
-        include_dir = parser.get("global", "include_dir")
 
-    parser, include_files, key_sources = _read_config_with_sources(configfile, include_dir)
+def resolve_policy(configfile, username, groups, loaded=None):
+    """Resolve effective policy and detailed merge trace for policy-show mode.
+
+    loaded is an optional load_policy_config() result to resolve from.
+    """
+    fallback_group_section = f"grp:{username}"
+    if loaded is None:
+        candidate_sections = (
+            ["default"]
+            + [f"grp:{group_name}" for group_name in groups]
+            + [fallback_group_section, username, f"user:{username}"]
+        )
+        loaded = load_policy_config(configfile, candidate_sections)
+    resolver, include_files = loaded
 
-    conf_raw = {}
-    trace = []
     precedence_chain = ["default"]
     effective_groups = list(groups)
-    fallback_group_section = f"grp:{username}"
-    if not effective_groups and parser.has_section(fallback_group_section):
+    if not effective_groups and fallback_group_section in resolver.sections:
         effective_groups = [username]
 
     group_sections = [f"grp:{group_name}" for group_name in effective_groups]
     precedence_chain.extend(reversed(group_sections))
     precedence_chain.append(username)
     precedence_chain.append(f"user:{username}")
-    applied_sections = []
-
-    for section in precedence_chain:
-        if parser.has_section(section):
-            applied_sections.append(section)
-            _merge_section(
-                conf_raw,
-                section,
-                list(parser.items(section)),
-                key_sources,
-                trace,
-            )
+
+    resolution = resolver.resolve(precedence_chain)
+    conf_raw = resolution.conf_raw
 
     for required_key in variables.required_config:
         if required_key not in conf_raw:
@@ -431,8 +285,8 @@ def resolve_policy(configfile, username, groups):
         "configfile": configfile,
         "include_files": include_files,
         "precedence_chain": precedence_chain,
-        "applied_sections": applied_sections,
-        "trace": trace,
+        "applied_sections": resolution.applied_sections,
+        "trace": resolution.trace,
         "conf_raw": conf_raw,
         "policy": policy,
     }
@@ -440,17 +294,14 @@ def resolve_policy(configfile, username, groups):
 
 def policy_command_decision(command_line, policy):
     """Determine whether a command would be allowed and why."""
-    if re.findall(r"[\x01-\x1F\x7F]", command_line):
+    if sec.CONTROL_CHARS.search(command_line):
         return {"allowed": False, "reason": "forbidden control character"}
 
-    for item in policy["forbidden"]:
-        if item in ["&", "|"]:
-            escaped = re.escape(item)
-            if re.search(rf"(?<!{escaped}){escaped}(?!{escaped})", command_line):
-                return {"allowed": False, "reason": f"forbidden character '{item}'"}
-        elif item in command_line:
-            return {"allowed": False, "reason": f"forbidden character '{item}'"}
+    item = forbidden.ForbiddenMatcher(policy["forbidden"]).first(command_line)
+    if item is not None:
+        return {"allowed": False, "reason": f"forbidden character '{item}'"}
 
+    allowed = authindex.AuthorizationIndex(policy["allowed"])
     lines = utils.split_commands(command_line.strip())
     for separate_line in lines:
         line = re.sub(r"\)$", "", separate_line)
@@ -473,11 +324,7 @@ def policy_command_decision(command_line, policy):
                     "reason": f"forbidden sudo command '{sudocmd}'",
                 }
 
-        if (
-            full_command not in policy["allowed"]
-            and command not in policy["allowed"]
-            and command
-        ):
+        if command and not allowed.permits(command, full_command):
             if policy.get("strict"):
                 return {"allowed": False, "reason": f"forbidden command '{command}'"}
             return {"allowed": False, "reason": f"unknown syntax '{full_command}'"}
@@ -513,29 +360,27 @@ def _parse_groups(group_values):
     return groups
 
 
-def _resolve_user_groups(username, explicit_groups):
+def _resolve_user_groups(username, explicit_groups, group_cache=None):
     """Resolve target groups from CLI input or system user/group database."""
     parsed_groups = _parse_groups(explicit_groups)
     if parsed_groups:
         return parsed_groups
 
-    try:
-        user_entry = pwd.getpwnam(username)
-    except KeyError:
-        return []
-
-    discovered = []
-    try:
-        primary_group = grp.getgrgid(user_entry.pw_gid).gr_name
-        discovered.append(primary_group)
-    except KeyError:
-        pass
+    if group_cache is None:
+        group_cache = groupcache.GroupCache()
+    groups = group_cache.user_groups(username)
+    group_cache.flush()
+    return groups
 
-    for group_entry in grp.getgrall():
-        if username in group_entry.gr_mem and group_entry.gr_name not in discovered:
-            discovered.append(group_entry.gr_name)
 
-    return discovered
+def _group_cache_ttl(configfile):
+    """Return the group_cache_ttl of configfile's [global] section."""
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(configfile)
+        return parser.get("global", "group_cache_ttl", fallback=0)
+    except configparser.Error:
+        return 0
 
 
 def _format_section_label(section, username):
@@ -814,7 +659,9 @@ def main(argv):
         sys.stderr.write("lshell: config file doesn't exist\n")
         return 1
 
-    groups = _resolve_user_groups(args.user, args.group)
+    groups = _resolve_user_groups(
+        args.user, args.group, groupcache.GroupCache(_group_cache_ttl(configfile))
+    )
     try:
         result = resolve_policy(configfile, args.user, groups)
         decision = None
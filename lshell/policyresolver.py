@@ -0,0 +1,236 @@
+"""Resolve chains of configuration sections into raw policy values.
+
+The login path (CheckConfig) and policy-show both merge the [default],
+[grp:*] and user sections, in precedence order, into raw policy values:
++/- list operators, 'all' expansion and path globbing. PolicyResolver
+implements that merge for both of them.
+
+Merged chain prefixes are memoized: resolving (default, grp:ops, alice)
+caches (default) and (default, grp:ops), so resolving bob, also in ops,
+only merges his own section. The memo assumes the configuration, PATH and
+the filesystem do not change during the lifetime of a resolver; every
+result lists the filesystem state it depends on (see statecache.probe).
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+from lshell import configschema
+from lshell import pathcatalog
+from lshell import statecache
+
+
+# keys accepting +/- list operators
+MERGE_LIST_KEYS = {
+    "path",
+    "overssh",
+    "allowed",
+    "allowed_shell_escape",
+    "allowed_file_extensions",
+    "forbidden",
+}
+
+# common shell built-ins added to the PATH executables when allowed is 'all'
+BUILTIN_COMMANDS = [
+    "bg",
+    "break",
+    "case",
+    "cd",
+    "continue",
+    "eval",
+    "exec",
+    "exit",
+    "fg",
+    "if",
+    "jobs",
+    "kill",
+    "login",
+    "logout",
+    "set",
+    "shift",
+    "stop",
+    "suspend",
+    "umask",
+    "unset",
+    "wait",
+    "while",
+]
+
+_OPERATOR_SPLIT = re.compile(r"((?:\+|-)\s*\[[^\]]+\])")
+
+
+@dataclass
+class Resolution:
+    """Raw policy values merged from a chain of sections."""
+
+    conf_raw: dict = field(default_factory=dict)
+    trace: list = field(default_factory=list)
+    applied_sections: list = field(default_factory=list)
+    # [kind, target, state] of the filesystem sources read while merging
+    dependencies: list = field(default_factory=list)
+    # non-fatal configuration problems, e.g. removing a missing list item
+    warnings: list = field(default_factory=list)
+
+    def copy(self):
+        """Return a copy that can be extended without altering this one."""
+        return Resolution(
+            dict(self.conf_raw),
+            list(self.trace),
+            list(self.applied_sections),
+            list(self.dependencies),
+            list(self.warnings),
+        )
+
+
+class PolicyResolver:
+    """Merge section chains into raw policy values, memoizing chain prefixes.
+
+    sections maps section names to their items (defaults included),
+    key_sources maps (section, key) to the file defining the key, and
+    overrides are (key, value) pairs applied after each section, as command
+    line options are. Invalid values raise ValueError.
+    """
+
+    def __init__(self, sections, key_sources=None, overrides=()):
+        self.sections = sections
+        self.key_sources = key_sources or {}
+        self.overrides = list(overrides)
+        self._chains = {(): Resolution()}
+        # number of sections reused from the memo / merged
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, chain):
+        """Return the Resolution of chain, from lowest to highest priority.
+
+        Sections missing from the configuration are skipped.
+        """
+        chain = tuple(section for section in chain if section in self.sections)
+        cached = len(chain)
+        while chain[:cached] not in self._chains:
+            cached -= 1
+        self.hits += cached
+
+        resolution = self._chains[chain[:cached]].copy()
+        for position in range(cached, len(chain)):
+            self.misses += 1
+            self._merge_section(resolution, chain[position])
+            self._chains[chain[: position + 1]] = resolution.copy()
+        return resolution
+
+    def _merge_section(self, resolution, section):
+        resolution.applied_sections.append(section)
+        for key, value in list(self.sections[section].items()) + self.overrides:
+            self._merge_value(
+                resolution, section, self.key_sources.get((section, key)), key, value
+            )
+
+    def _merge_value(self, resolution, section, source, key, value):
+        conf_raw = resolution.conf_raw
+        # if string, then split on +/- operators
+        split = [""]
+        if isinstance(value, str):
+            split = _OPERATOR_SPLIT.split(value)
+
+        def record(operation, token, before):
+            resolution.trace.append(
+                {
+                    "section": section,
+                    "source": source,
+                    "key": key,
+                    "op": operation,
+                    "token": token,
+                    "before": before,
+                    "after": conf_raw.get(key),
+                }
+            )
+
+        previous = conf_raw.get(key)
+        if len(split) > 1 and key in MERGE_LIST_KEYS:
+            for token in split:
+                if not token.strip():
+                    continue
+                if token.startswith("-") or token.startswith("+"):
+                    conf_raw[key] = self._minusplus(resolution, key, token)
+                    record(token[0], token[1:], previous)
+                elif configschema.is_all_literal(token):
+                    if key != "allowed":
+                        raise ValueError(f"'{key}' cannot be set to 'all'")
+                    conf_raw[key] = self._expand_all(resolution)
+                    record("set_all", token, previous)
+                elif key == "path":
+                    conf_raw[key] = self._expand_path(resolution, token)
+                    record("set", token, previous)
+                elif isinstance(configschema.parse_config_value(token, key), list):
+                    conf_raw[key] = token
+                    record("set", token, previous)
+                else:
+                    continue
+                previous = conf_raw.get(key)
+        # case allowed is set to all
+        elif key == "allowed" and configschema.is_all_literal(split[0]):
+            conf_raw[key] = self._expand_all(resolution)
+            record("set_all", split[0], previous)
+        elif key == "allowed_shell_escape" and configschema.is_all_literal(split[0]):
+            raise ValueError("'allowed_shell_escape' cannot be set to 'all'")
+        elif key == "path":
+            conf_raw[key] = self._expand_path(resolution, value)
+            record("set", value, previous)
+        else:
+            conf_raw[key] = value
+            record("set", value, previous)
+
+    @staticmethod
+    def _probe(resolution, kind, target):
+        state = statecache.probe(kind, target)
+        resolution.dependencies.append([kind, target, state])
+        return state
+
+    def _expand_path(self, resolution, value):
+        """Return the [allowed, denied] path list for a path value."""
+        allow_deny = ["", ""]
+        for path_pattern in configschema.parse_config_value(value, "path"):
+            for _, realpath in self._probe(resolution, "glob", path_pattern):
+                allow_deny[0] += realpath + "/|"
+        # remove double slashes
+        allow_deny[0] = allow_deny[0].replace("//", "/")
+        return str(allow_deny)
+
+    def _minusplus(self, resolution, key, extra):
+        """Apply a +[...] or -[...] operator to a configuration list."""
+        conf_raw = resolution.conf_raw
+        if key in conf_raw:
+            current = configschema.parse_config_value(conf_raw[key], key)
+        elif key == "path":
+            current = ["", ""]
+        else:
+            current = []
+
+        sublist = configschema.parse_config_value(extra[1:], key)
+        if key == "path":
+            index = 0 if extra.startswith("+") else 1
+            for path in sublist:
+                current[index] += self._probe(resolution, "realpath", path) + "/|"
+        elif extra.startswith("+"):
+            current.extend(sublist)
+        else:
+            for item in sublist:
+                if item in current:
+                    current.remove(item)
+                else:
+                    resolution.warnings.append(f"-['{item}'] ignored in '{key}' list.")
+        return str(current)
+
+    def _expand_all(self, resolution):
+        """Expand 'all' into the shell built-ins and PATH executables."""
+        expanded_all = list(BUILTIN_COMMANDS)
+        for directory in os.environ.get("PATH", "").split(":"):
+            if not directory:
+                continue
+            self._probe(resolution, "stat", directory)
+            if os.path.exists(directory):
+                expanded_all.extend(pathcatalog.executables(directory))
+            else:
+                resolution.warnings.append(f'PATH entry "{directory}" does not exist')
+        return str(expanded_all)
@@ -6,20 +6,39 @@ command contains forbidden characters, etc.
 import sys
 import re
 import os
-import shlex
-import glob
 
 # import lshell specifics
 from lshell import messages
 from lshell import utils
 from lshell import audit
+from lshell import authindex
+from lshell import forbidden
+from lshell import fsmemo
+from lshell import lexer
+from lshell import pathacl
+from lshell import wildcard
 
 EXTENSION_RESTRICTION_EXEMPT_COMMANDS = {"cd", "clear", "fg", "bg", "ls"}
 MAX_WILDCARD_MATCHES = 4096
+# default budget of a wildcard expansion, see wildcard_max_dirs and
+# wildcard_timeout
+WILDCARD_MAX_DIRS = 10000
+WILDCARD_TIMEOUT = 2
+
+CONTROL_CHARS = re.compile(r"[\x01-\x1F\x7F]")
+# $(...) and `...` executions and ${...} expansions that check_secure
+# validates on their own
+_DOLLAR_EXECUTION = re.compile(r"\$\([^)]+[)]")
+_BACKQUOTE_EXECUTION = re.compile(r"\`[^`]+[`]")
+_CURLY_EXPANSION = re.compile(r"\$\{[^}]+[}]")
+_CURLY_OPERATOR = re.compile(r"=|\+|\?|\-")
+# quoted spans nested in the value of a quoted word, e.g. the path of
+# awk 'BEGIN {system("/usr/bin/id")}'
+_NESTED_QUOTES = (re.compile(r'"([^"]*)"'), re.compile(r"'([^']*)'"))
 
 
 def _is_assignment_word(word):
-    return bool(re.match(r"^[A-Za-z_][A-Za-z0-9_]*=.*$", word))
+    return lexer.is_assignment_word(word)
 
 
 def should_enforce_file_extensions(command):
@@ -29,22 +48,13 @@ def should_enforce_file_extensions(command):
 
 def _split_command_for_auth(command_line):
     """Return (command, args, full_command) for auth checks, skipping VAR=VALUE prefixes."""
-    try:
-        tokens = shlex.split(command_line, posix=True)
-    except ValueError:
-        return "", [], ""
-
-    index = 0
-    while index < len(tokens) and _is_assignment_word(tokens[index]):
-        index += 1
-
-    if index >= len(tokens):
+    segment = lexer.parse_segment(command_line)
+    if len(segment.assignments) == len(segment.words):
         return "", [], ""
 
-    command = tokens[index]
-    args = tokens[index + 1 :]
-    full_command = " ".join([command] + args).strip()
-    return command, args, full_command
+    args = list(segment.args)
+    full_command = " ".join([segment.command] + args).strip()
+    return segment.command, args, full_command
 
 
 def warn_count(messagetype, command, conf, strict=None, ssh=None):
@@ -104,21 +114,13 @@ def warn_unknown_syntax(command, conf, strict=None, ssh=None):
 def tokenize_command(command):
     """Tokenize the command line into separate commands based on the operators"""
 
-    try:
-        lexer = shlex.shlex(command, posix=True)
-        lexer.whitespace_split = True
-        lexer.commenters = ""
-        tokens = list(lexer)
-    except ValueError:
-        # Handle the exception and return an appropriate message or handle as needed
-        return []
-    return tokens
+    return lexer.parse_segment(command).values
 
 
 def _safe_realpath(path):
     """Resolve canonical path and ignore malformed/unresolvable inputs."""
     try:
-        return os.path.realpath(path)
+        return fsmemo.realpath(path)
     except (OSError, TypeError, ValueError):
         return None
 
@@ -132,25 +134,38 @@ def _safe_expand_path(path):
         return None
 
 
-def expand_shell_wildcards(item):
-    """Expand shell wildcards and return all candidate filesystem paths."""
+def expand_shell_wildcards(item, conf=None):
+    """Expand shell wildcards and return all candidate filesystem paths.
+
+    With a conf, the expansion is bounded by its 'wildcard_max_dirs' and
+    'wildcard_timeout' budget, and does not walk the directories its path
+    ACL denies entirely: such a directory is returned instead of its content.
+    """
 
     # Expand shell variables like $HOME first.
     expanded_item = _safe_expand_path(item)
     if expanded_item is None:
         return []
 
+    conf = conf or {}
+    budget = wildcard.Budget(
+        conf.get("wildcard_max_dirs", WILDCARD_MAX_DIRS),
+        conf.get("wildcard_timeout", WILDCARD_TIMEOUT),
+    )
+    prune = path_acl(conf).denies_subtree if "path" in conf else None
+
     # Expand wildcard patterns against the filesystem and validate all matches.
-    # Fail closed if expansion fans out too much to avoid memory abuse.
+    # Fail closed if expansion fans out too much to avoid memory abuse, or
+    # walks too many directories or for too long.
     try:
         expanded_items = []
-        for match in glob.iglob(expanded_item, recursive=True):
+        for match in wildcard.iter_matches(expanded_item, budget, prune):
             resolved = _safe_realpath(match)
             if resolved:
                 expanded_items.append(resolved)
             if len(expanded_items) > MAX_WILDCARD_MATCHES:
                 return []
-    except (OSError, RuntimeError, ValueError, re.error):
+    except (OSError, RuntimeError, ValueError, re.error, wildcard.BudgetExceeded):
         return []
 
     if expanded_items:
@@ -177,51 +192,26 @@ def _split_path_acl_entries(path_acl):
     return entries
 
 
-def _is_path_within_base(path, base):
-    """Return True when path is equal to or nested under base."""
-    try:
-        return os.path.commonpath([path, base]) == base
-    except ValueError:
-        # Different mount/drive semantics: treat as not matching.
-        return False
-
-
-def _is_path_allowed(candidate, allowed_roots, denied_roots):
-    """Return True when candidate path passes allow/deny ACL precedence.
-
-    Specificity rule:
-    - most specific matching prefix wins;
-    - ties favor deny.
-    This preserves historical expectation that:
-      ['/'] - ['/var'] + ['/var/log']
-    allows /var/log while still denying /var.
+def path_acl(conf):
+    """Return the compiled ACL of conf["path"], compiling it when missing or
+    when the path policy changed since. ACL entries are resolved once, when
+    the ACL is compiled, not on every check.
     """
-
-    def _specificity(path):
-        normalized = os.path.normpath(path)
-        if normalized == os.sep:
-            return 0
-        return len([segment for segment in normalized.split(os.sep) if segment])
-
-    matching_allows = [root for root in allowed_roots if _is_path_within_base(candidate, root)]
-    matching_denies = [root for root in denied_roots if _is_path_within_base(candidate, root)]
-
-    # Legacy behavior: empty allow-list means unrestricted unless denied.
-    if not allowed_roots:
-        return not bool(matching_denies)
-
-    if not matching_allows:
-        return False
-
-    best_allow = max(_specificity(root) for root in matching_allows)
-    best_deny = max(_specificity(root) for root in matching_denies) if matching_denies else -1
-
-    return best_allow > best_deny
+    source = (conf["path"][0], conf["path"][1])
+    acl = conf.get("_path_acl")
+    if acl is None or acl.source != source:
+        acl = pathacl.PathACL(
+            _split_path_acl_entries(source[0]),
+            _split_path_acl_entries(source[1]),
+            source,
+        )
+        conf["_path_acl"] = acl
+    return acl
 
 
 def _format_path_for_message(path):
     """Format path in user-facing messages with historical trailing-slash behavior."""
-    if os.path.isdir(path) and not path.endswith("/"):
+    if fsmemo.isdir(path) and not path.endswith("/"):
         return f"{path}/"
     return path
 
@@ -239,29 +229,46 @@ def _looks_like_path_token(token):
     return False
 
 
+def _quoted_items(line):
+    """Return the distinct values of the quoted words of line, and of the
+    quoted spans nested in them.
+
+    The words come from the lexer, which splits the line in a single linear
+    pass; nested spans are found with linear, non-greedy patterns. Each value
+    is returned once however often it is repeated.
+    """
+    command_line = lexer.parse(line)
+    if command_line.valid:
+        words = [word for segment in command_line.segments for word in segment.words]
+    else:
+        words = lexer.parse_segment(line).words
+    items = dict.fromkeys(word.value for word in words if word.quoted)
+    pending = list(items)
+    while pending:
+        value = pending.pop()
+        for pattern in _NESTED_QUOTES:
+            for span in pattern.findall(value):
+                if span not in items:
+                    items[span] = None
+                    pending.append(span)
+    return list(items)
+
+
 def _path_tokens_from_line(line):
     """Extract path-like tokens from command segments, excluding bare command names."""
-    segments = utils.split_commands(line)
-    if not segments:
-        return []
+    command_line = lexer.parse(line)
+    if command_line.valid:
+        segments = command_line.segments
+    else:
+        segments = [lexer.parse_segment(line)]
 
     path_tokens = []
     for segment in segments:
-        try:
-            tokens = shlex.split(segment, posix=True)
-        except ValueError:
-            tokens = tokenize_command(segment)
-        if not tokens:
-            continue
-
-        index = 0
-        while index < len(tokens) and _is_assignment_word(tokens[index]):
-            index += 1
-        if index >= len(tokens):
+        if len(segment.assignments) == len(segment.words):
             continue
 
-        command = tokens[index]
-        args = tokens[index + 1 :]
+        command = segment.command
+        args = segment.args
 
         if command == "cd" and args:
             # `cd var` style operands are path targets even without slashes.
@@ -280,25 +287,36 @@ def _path_tokens_from_line(line):
     return path_tokens
 
 
+def depends_on_filesystem(line, conf):
+    """True when checking line may look at the filesystem beyond the current
+    directory: path-like operands, quoted items, escapes and substitutions,
+    or file extensions to validate.
+    """
+    if any(char in line for char in "'\"\\`$"):
+        return True
+    if conf.get("allowed_file_extensions"):
+        return True
+    return bool(_path_tokens_from_line(line))
+
+
 def check_path(line, conf, completion=None, ssh=None, strict=None):
     """Check if a path is entered in the line. If so, it checks if user
     are allowed to see this path. If user is not allowed, it calls
     warn_count. In case of completion, it only returns 0 or 1.
     """
-    allowed_roots = _split_path_acl_entries(conf["path"][0])
-    denied_roots = _split_path_acl_entries(conf["path"][1])
+    acl = path_acl(conf)
 
     path_tokens = _path_tokens_from_line(line)
 
     for item in path_tokens:
-        candidates = expand_shell_wildcards(item)
+        candidates = expand_shell_wildcards(item, conf)
         if not candidates:
             if not completion:
                 ret, conf = warn_count("path", item, conf, strict=strict, ssh=ssh)
             return 1, conf
 
         for candidate in candidates:
-            if not _is_path_allowed(candidate, allowed_roots, denied_roots):
+            if not acl.allows(candidate):
                 if not completion:
                     message_path = _format_path_for_message(candidate)
                     ret, conf = warn_count(
@@ -307,8 +325,8 @@ def check_path(line, conf, completion=None, ssh=None, strict=None):
                 return 1, conf
 
     if not completion:
-        current_dir = os.path.realpath(os.getcwd())
-        if not _is_path_allowed(current_dir, allowed_roots, denied_roots):
+        current_dir = fsmemo.realpath(os.getcwd())
+        if not acl.allows(current_dir):
             ret, conf = warn_count(
                 "path",
                 _format_path_for_message(current_dir),
@@ -316,7 +334,7 @@ def check_path(line, conf, completion=None, ssh=None, strict=None):
                 strict=strict,
                 ssh=ssh,
             )
-            os.chdir(conf["home_path"])
+            fsmemo.chdir(conf["home_path"])
             conf["promptprint"] = utils.updateprompt(os.getcwd(), conf)
             return 1, conf
     return 0, conf
@@ -326,17 +344,12 @@ def check_forbidden_chars(line, conf, strict=None, ssh=None):
     """Check if the line contains any forbidden
     characters. If so, it calls warn_count.
     """
-    for item in conf["forbidden"]:
-        # keep compatibility with historical behavior from check_secure:
-        # allow "&&" and "||" even when single "&" or "|" are forbidden.
-        if item in ["&", "|"]:
-            escaped_item = re.escape(item)
-            if re.search(rf"(?<!{escaped_item}){escaped_item}(?!{escaped_item})", line):
-                ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
-                return ret, conf
-        elif item in line:
-            ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
-            return ret, conf
+    # keep compatibility with historical behavior from check_secure:
+    # allow "&&" and "||" even when single "&" or "|" are forbidden.
+    item = forbidden.for_conf(conf).first(line)
+    if item is not None:
+        ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
+        return ret, conf
     return 0, conf
 
 
@@ -360,37 +373,25 @@ def check_secure(line, conf, strict=None, ssh=None):
     # init return code
     returncode = 0
 
-    # This logic is kept crudely simple on purpose.
-    # At most we might match the same stanza twice
-    # (for e.g. "'a'", 'a') but the converse would
-    # require detecting single quotation stanzas
-    # nested within double quotes and vice versa
-    relist = re.findall(r"[^=]\"(.+)\"", line)
-    relist2 = re.findall(r"[^=]\'(.+)\'", line)
-    relist = relist + relist2
-    for item in relist:
-        if os.path.exists(item):
+    # validate the existing paths given as quoted words
+    for item in _quoted_items(line):
+        if fsmemo.exists(item):
             ret_check_path, conf = check_path(item, conf, strict=strict)
             returncode += ret_check_path
 
     # parse command line for control characters, and warn user
-    if re.findall(r"[\x01-\x1F\x7F]", oline):
+    if CONTROL_CHARS.search(oline):
         ret, conf = warn_count("control char", oline, conf, strict=strict, ssh=ssh)
         return ret, conf
 
-    for item in conf["forbidden"]:
-        # allow '&&' and '||' even if singles are forbidden
-        if item in ["&", "|"]:
-            if re.findall(rf"[^\{item}]\{item}[^\{item}]", line):
-                ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
-                return ret, conf
-        else:
-            if item in line:
-                ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
-                return ret, conf
+    # allow '&&' and '||' even if singles are forbidden
+    item = forbidden.for_conf(conf).first_enclosed(line)
+    if item is not None:
+        ret, conf = warn_count("character", item, conf, strict=strict, ssh=ssh)
+        return ret, conf
 
     # check if the line contains $(foo) executions, and check them
-    executions = re.findall(r"\$\([^)]+[)]", line)
+    executions = _DOLLAR_EXECUTION.findall(line)
     for item in executions:
         # recurse on check_path
         ret_check_path, conf = check_path(item[2:-1].strip(), conf, strict=strict)
@@ -401,17 +402,17 @@ def check_secure(line, conf, strict=None, ssh=None):
         returncode += ret_check_secure
 
     # check for executions using back quotes '`'
-    executions = re.findall(r"\`[^`]+[`]", line)
+    executions = _BACKQUOTE_EXECUTION.findall(line)
     for item in executions:
         ret_check_secure, conf = check_secure(item[1:-1].strip(), conf, strict=strict)
         returncode += ret_check_secure
 
     # check if the line contains ${foo=bar}, and check them
-    curly = re.findall(r"\$\{[^}]+[}]", line)
+    curly = _CURLY_EXPANSION.findall(line)
     for item in curly:
         # split to get variable only, and remove last character "}"
-        if re.findall(r"=|\+|\?|\-", item):
-            variable = re.split(r"=|\+|\?|\-", item, maxsplit=1)
+        if _CURLY_OPERATOR.search(item):
+            variable = _CURLY_OPERATOR.split(item, maxsplit=1)
         else:
             variable = item
         ret_check_path, conf = check_path(variable[1][:-1], conf, strict=strict)
@@ -462,11 +463,7 @@ def check_secure(line, conf, strict=None, ssh=None):
         #     return ret, conf
 
         # Check if the full command (with arguments) or just the command is allowed
-        if (
-            full_command not in conf["allowed"]
-            and command not in conf["allowed"]
-            and command
-        ):
+        if command and not authindex.for_conf(conf).permits(command, full_command):
             if strict:
                 ret, conf = warn_count("command", command, conf, strict=strict, ssh=ssh)
             else:
@@ -496,13 +493,12 @@ def check_secure(line, conf, strict=None, ssh=None):
 
 def check_allowed_file_extensions(command_line, allowed_extensions):
     """Checks if file arguments in the command line use allowed extensions."""
-    # Split the command using shlex to handle quotes and escape characters
-    try:
-        tokens = shlex.split(command_line)
-    except ValueError as exception:
+    segment = lexer.parse_segment(command_line)
+    if segment.error:
         # Log error or provide user feedback on the invalid input
-        print(f"lshell: error parsing command line: {exception}")
+        print(f"lshell: error parsing command line: {segment.error}")
         return True, []
+    tokens = segment.values
 
     if not tokens:
         return True, None
@@ -535,7 +531,7 @@ def check_allowed_file_extensions(command_line, allowed_extensions):
             resolved_value = (
                 _safe_realpath(expanded_value) if expanded_value is not None else None
             )
-            is_existing_dir = bool(resolved_value and os.path.isdir(resolved_value))
+            is_existing_dir = bool(resolved_value and fsmemo.isdir(resolved_value))
             has_path_markers = any(
                 char in value for char in ["/", "\\", "*", "?", "[", "]"]
             ) or value.startswith(("~", "."))
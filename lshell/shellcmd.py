@@ -9,7 +9,6 @@ import sys
 import os
 import re
 import signal
-import readline
 
 # import lshell specifics
 from lshell.checkconfig import CheckConfig
@@ -19,8 +18,10 @@ from lshell import messages
 from lshell import sec
 from lshell import completion
 from lshell import variables
-from lshell import policy as policy_mode
 from lshell import audit
+from lshell import configwatch
+from lshell import fsmemo
+from lshell import groupcache
 
 
 class ShellCmd(cmd.Cmd, object):
@@ -79,6 +80,9 @@ class ShellCmd(cmd.Cmd, object):
         # run overssh, if needed
         self.run_overssh()
 
+        # watch configuration sources for hot-reload
+        self.config_watcher = configwatch.ConfigWatcher(self.conf)
+
     def __getattr__(self, attr):
         """This method actually takes care of all the called method that are
         not resolved (i.e not existing methods). It actually will simulate
@@ -89,16 +93,8 @@ class ShellCmd(cmd.Cmd, object):
         added a do_uname in the ShellCmd class!
         """
 
-        # in case the configuration file has been modified, reload it
-        if self.conf["config_mtime"] != os.path.getmtime(self.conf["configfile"]):
-            session_id = self.conf.get("session_id")
-            self.conf = CheckConfig(
-                ["--config", self.conf["configfile"]], refresh=1
-            ).returnconf()
-            if session_id:
-                self.conf["session_id"] = session_id
-            self.conf["promptprint"] = utils.updateprompt(os.getcwd(), self.conf)
-            self.log = self.conf["logpath"]
+        # in case a configuration source has been modified, reload it
+        self.reload_config()
 
         if self.conf["timer"] > 0:
             self.mytimer(0)
@@ -107,7 +103,9 @@ class ShellCmd(cmd.Cmd, object):
         self.g_line = utils.replace_exit_code(self.g_line, self.retcode)
 
         if isinstance(self.conf["aliases"], dict):
-            self.g_line = utils.get_aliases(self.g_line, self.conf["aliases"])
+            self.g_line = utils.get_aliases(
+                self.g_line, self.conf["aliases"], self.conf
+            )
 
         self.log.info(f'CMD: "{self.g_line}"')
 
@@ -119,6 +117,44 @@ class ShellCmd(cmd.Cmd, object):
             self.mytimer(self.conf["timer"])
         return object.__getattribute__(self, attr)
 
+    def reload_config(self):
+        """Reload the configuration sources modified since the last command.
+
+        Changes to the configuration or include files re-resolve the policy,
+        keeping the session logger when logging settings are unchanged and
+        the noexec verdict of the session. The policy is resolved as a
+        whole: any [global], [default], [grp:...] or user section of any
+        file may change any key, through the '+' and '-' list operators.
+        Changed env_vars_files are re-sourced on their own.
+        """
+        watcher = self.__dict__.get("config_watcher")
+        if watcher is None:
+            self.config_watcher = configwatch.ConfigWatcher(self.conf)
+            return
+
+        policy_changed, env_files = watcher.poll()
+        if policy_changed:
+            session_id = self.conf.get("session_id")
+            previous_env_files = configwatch.env_file_paths(self.conf)
+            self.conf = CheckConfig(
+                ["--config", self.conf["configfile"]], refresh=1, logger=self.log
+            ).returnconf()
+            if session_id:
+                self.conf["session_id"] = session_id
+            self.conf["promptprint"] = utils.updateprompt(os.getcwd(), self.conf)
+            self.log = self.conf["logpath"]
+
+            watcher.close()
+            self.config_watcher = configwatch.ConfigWatcher(self.conf)
+            env_files = [
+                path
+                for path in self.config_watcher.env_paths
+                if path in env_files or path not in previous_env_files
+            ]
+
+        for envfile in env_files:
+            builtincmd.cmd_source(envfile)
+
     def run_overssh(self):
         """This method checks if the user is trying to SCP a file onto the
         server. If this is the case, it checks if the user is allowed to use
@@ -169,7 +205,7 @@ class ShellCmd(cmd.Cmd, object):
             if "SSH_CLIENT" in os.environ and "SSH_TTY" not in os.environ:
                 # Apply aliases consistently for all SSH command paths.
                 self.conf["ssh"] = utils.get_aliases(
-                    self.conf["ssh"], _aliases_for_ssh_command()
+                    self.conf["ssh"], _aliases_for_ssh_command(), self.conf
                 ).strip()
 
                 # check if sftp is requested and allowed
@@ -262,6 +298,7 @@ class ShellCmd(cmd.Cmd, object):
                         retcode = utils.cmd_parse_execute(
                             self.conf["ssh"], shell_context=self
                         )
+                    fsmemo.log_totals(self.log)
                     self.log.error("Exited")
                     sys.exit(retcode)
 
@@ -272,7 +309,7 @@ class ShellCmd(cmd.Cmd, object):
                 # case of local shell escapes (e.g. pager/editor invoking
                 # the login shell with -c). Validate against normal policy.
                 self.conf["ssh"] = utils.get_aliases(
-                    self.conf["ssh"], _aliases_for_ssh_command()
+                    self.conf["ssh"], _aliases_for_ssh_command(), self.conf
                 )
                 ret_check_secure, self.conf = sec.check_secure(
                     self.conf["ssh"],
@@ -295,6 +332,7 @@ class ShellCmd(cmd.Cmd, object):
                 retcode = utils.cmd_parse_execute(
                     self.conf["ssh"], shell_context=self
                 )
+                fsmemo.log_totals(self.log)
                 self.log.error("Exited")
                 sys.exit(retcode)
             return retcode
@@ -347,6 +385,10 @@ class ShellCmd(cmd.Cmd, object):
             self.run_script_mode(self.conf["script"])
             return
 
+        # only interactive sessions load readline, not commands run over SSH
+        # pylint: disable-next=import-outside-toplevel
+        import readline
+
         self.preloop()
         if self.use_rawinput and self.completekey:
             try:
@@ -464,6 +506,9 @@ class ShellCmd(cmd.Cmd, object):
         Otherwise try to call complete_<command> to get list of completions.
         """
         if state == 0:
+            # pylint: disable-next=import-outside-toplevel
+            import readline
+
             origline = readline.get_line_buffer()
             line = origline.lstrip()
             # in case '|', ';', '&' used, take last part of line to complete
@@ -581,9 +626,13 @@ class ShellCmd(cmd.Cmd, object):
 
     def do_policy_show(self, arg=None):
         """Show resolved policy values and optional decision for a command."""
+        from lshell import policy as policy_mode  # pylint: disable=import-outside-toplevel
+
         command_line = (arg or "").strip() or None
         username = self.conf.get("username")
-        groups = policy_mode._resolve_user_groups(username, [])
+        groups = policy_mode._resolve_user_groups(
+            username, [], groupcache.GroupCache(self.conf.get("group_cache_ttl", 0))
+        )
         try:
             result = policy_mode.resolve_policy(
                 self.conf["configfile"],
@@ -608,16 +657,14 @@ class ShellCmd(cmd.Cmd, object):
         # Check for background jobs
         if hasattr(builtincmd, "BACKGROUND_JOBS") and builtincmd.BACKGROUND_JOBS:
             # Filter out completed jobs
-            active_jobs = []
-            for job_id, job in enumerate(builtincmd.BACKGROUND_JOBS, start=1):
-                if job.poll() is None:
-                    active_jobs.append((job_id, job))
+            builtincmd.BACKGROUND_JOBS.collect()
+            active_jobs = list(builtincmd.BACKGROUND_JOBS)
 
             if active_jobs and self.kill_jobs_at_exit:
-                for job_id, job in active_jobs:
+                for job in active_jobs:
                     try:
                         os.killpg(os.getpgid(job.pid), signal.SIGKILL)
-                        builtincmd.BACKGROUND_JOBS.pop(job_id - 1)
+                        builtincmd.BACKGROUND_JOBS.remove(job)
                     except Exception as exception:
                         print(f"Failed to stop job [{job.pid}]: {exception}")
             else:
@@ -634,6 +681,7 @@ class ShellCmd(cmd.Cmd, object):
             self.stdout.write("\n")
 
         if self.conf["disable_exit"] != 1:
+            fsmemo.log_totals(self.log)
             sys.exit(0)
 
     def mytimer(self, timeout):
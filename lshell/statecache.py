@@ -0,0 +1,212 @@
+"""On-disk state caches shared by lshell sessions.
+
+Entries are small JSON documents stored under the lshell state directory
+(``$LSHELL_STATE_DIR``, default ``<tmpdir>/lshell``). Private entries live in
+a per-uid directory and are only trusted when owned by the current user and
+not writable by anyone else. Shared entries are only trusted when written by
+the current user or root.
+
+Entries that security decisions are based on must be system entries: they
+live in a root-owned directory that only root can write to, are written by
+root only, and are trusted by every user. Sessions of other users never
+write them; they read them, or resolve the state themselves.
+"""
+
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import stat
+import tempfile
+
+
+STATE_DIR_ENV = "LSHELL_STATE_DIR"
+
+_DEFAULT_STATE_ROOT = os.path.join(tempfile.gettempdir(), "lshell")
+_SYSTEM_DIR = "system"
+
+
+def state_root():
+    """Return the root directory holding lshell state."""
+    configured = os.environ.get(STATE_DIR_ENV)
+    if configured:
+        return configured
+    return _DEFAULT_STATE_ROOT
+
+
+def fingerprint(path):
+    """Return a cheap change marker for a file or directory (None if missing)."""
+    try:
+        path_stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return [path_stat.st_dev, path_stat.st_ino, path_stat.st_size, path_stat.st_mtime_ns]
+
+
+def probe(kind, target):
+    """Return the current state of a cache dependency.
+
+    ``stat`` dependencies compare file fingerprints, ``glob`` dependencies
+    compare the expanded matches (with their resolved paths) and ``realpath``
+    dependencies compare symlink resolution.
+    """
+    if kind == "stat":
+        return fingerprint(target)
+    if kind == "glob":
+        return [[item, os.path.realpath(item)] for item in glob.glob(target)]
+    if kind == "realpath":
+        return os.path.realpath(target)
+    raise ValueError(f"unknown cache dependency kind: {kind}")
+
+
+def _is_trusted_dir(path, shared, system=False):
+    try:
+        dir_stat = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(dir_stat.st_mode):
+        return False
+    if system:
+        return dir_stat.st_uid == 0 and not dir_stat.st_mode & 0o022
+    if shared:
+        # Shared directories behave like /tmp: world-writable only with the
+        # sticky bit so users cannot replace each other's entries.
+        return bool(
+            not dir_stat.st_mode & stat.S_IWOTH or dir_stat.st_mode & stat.S_ISVTX
+        )
+    return dir_stat.st_uid == os.geteuid() and not dir_stat.st_mode & 0o077
+
+
+def _is_trusted_entry(entry_stat, shared, system=False):
+    if not stat.S_ISREG(entry_stat.st_mode):
+        return False
+    if entry_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    if system:
+        return entry_stat.st_uid == 0
+    if shared:
+        return entry_stat.st_uid in (0, os.geteuid())
+    return entry_stat.st_uid == os.geteuid()
+
+
+def _ensure_dir(path, mode):
+    try:
+        os.mkdir(path, mode)
+    except FileExistsError:
+        return
+    # mkdir honors umask; apply the requested mode explicitly.
+    os.chmod(path, mode)
+
+
+def _cache_dir(namespace, shared, create=False, system=False):
+    root = state_root()
+    if system:
+        directory = os.path.join(root, _SYSTEM_DIR, namespace)
+    elif shared:
+        directory = os.path.join(root, namespace)
+    else:
+        directory = os.path.join(root, f"cache-{os.geteuid()}", namespace)
+
+    if create:
+        os.makedirs(os.path.dirname(root) or "/", exist_ok=True)
+        _ensure_dir(root, 0o1777)
+        if system:
+            _ensure_dir(os.path.dirname(directory), 0o755)
+            _ensure_dir(directory, 0o755)
+        elif shared:
+            _ensure_dir(directory, 0o1777)
+        else:
+            _ensure_dir(os.path.dirname(directory), 0o700)
+            _ensure_dir(directory, 0o700)
+
+    if not shared and not _is_trusted_dir(
+        os.path.dirname(directory), shared, system
+    ):
+        return None
+    if not _is_trusted_dir(directory, shared, system):
+        return None
+    return directory
+
+
+def _entry_name(name):
+    return hashlib.sha256(str(name).encode("utf-8")).hexdigest()[:32] + ".json"
+
+
+def _read_entry(directory, name, shared, owner=None, system=False):
+    path = os.path.join(directory, _entry_name(name))
+    try:
+        entry_fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError:
+        return None
+
+    try:
+        with os.fdopen(entry_fd, "r", encoding="utf-8") as handle:
+            entry_stat = os.fstat(handle.fileno())
+            if not _is_trusted_entry(entry_stat, shared, system):
+                return None
+            if owner is not None and entry_stat.st_uid != owner:
+                return None
+            entry = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get("name") != str(name):
+        return None
+    return entry.get("payload")
+
+
+def load(namespace, name, shared=False, system=False):
+    """Return the payload stored for name, or None when missing/untrusted.
+
+    Shared entries are written per user; entries written by root take
+    precedence over the current user's own. System entries are only
+    trusted when written by root.
+    """
+    directory = _cache_dir(namespace, shared, system=system)
+    if directory is None:
+        return None
+
+    if system:
+        return _read_entry(directory, name, shared, system=True)
+    if not shared:
+        return _read_entry(directory, name, shared)
+    for owner in dict.fromkeys((0, os.geteuid())):
+        payload = _read_entry(directory, f"{owner}:{name}", shared, owner)
+        if payload is not None:
+            return payload
+    return None
+
+
+def store(namespace, name, payload, shared=False, system=False):
+    """Atomically persist payload for name. Return True on success.
+
+    System entries are only written by root.
+    """
+    if system and os.geteuid() != 0:
+        return False
+    try:
+        directory = _cache_dir(namespace, shared, create=True, system=system)
+    except OSError:
+        return False
+    if directory is None:
+        return False
+
+    if shared and not system:
+        name = f"{os.geteuid()}:{name}"
+    path = os.path.join(directory, _entry_name(name))
+    temp_path = None
+    try:
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(temp_fd, "w", encoding="utf-8") as handle:
+            json.dump({"name": str(name), "payload": payload}, handle, sort_keys=True)
+            os.fchmod(handle.fileno(), 0o644 if shared or system else 0o600)
+        os.replace(temp_path, path)
+        temp_path = None
+    except (OSError, TypeError, ValueError):
+        return False
+    finally:
+        if temp_path is not None:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+    return True
@@ -1,15 +1,13 @@
 """ Utils for lshell """
 # pylint: disable=too-many-lines
 
+import errno
 import re
 import subprocess
 import os
 import sys
 import random
 import string
-import shlex
-import shutil
-import threading
 from getpass import getuser
 from time import strftime, gmtime
 import signal
@@ -21,6 +19,14 @@ from lshell import sec
 from lshell import messages
 from lshell import audit
 from lshell import containment
+from lshell import lexer
+from lshell import authindex
+from lshell import decisioncache
+from lshell import executables
+from lshell import fsmemo
+from lshell import pipeline
+from lshell import watchdog
+from lshell import aliases as alias_expander
 
 
 def usage(exitcode=1):
@@ -45,8 +51,16 @@ def random_string(length):
     return randstring
 
 
-def get_aliases(line, aliases):
-    """Replace all configured aliases in the line"""
+def get_aliases(line, aliases, conf=None):
+    """Replace all configured aliases in the line. When aliases are the
+    aliases of conf, the expander compiled with conf is used.
+    """
+    if conf is not None and conf.get("aliases") is aliases:
+        expander = alias_expander.for_conf(conf)
+    else:
+        expander = alias_expander.compile_aliases(aliases)
+    if expander is not None:
+        return expander.expand(line)
 
     for item in aliases.keys():
         escaped_item = re.escape(item)
@@ -78,151 +92,23 @@ def get_aliases(line, aliases):
 
 def split_commands(line):
     """Split command line at top-level operators, preserving quoting/substitutions."""
-    tokenized = split_command_sequence(line)
-    if tokenized is None:
+    command_line = lexer.parse(line)
+    if not command_line.valid:
         return [line]
-
-    operators = {"&&", "||", "|", ";", "&"}
-    return [item for item in tokenized if item not in operators and item.strip()]
+    return [segment.text for segment in command_line.segments]
 
 
 def split_command_sequence(line):
     """Return a tokenized top-level command sequence [cmd, op, cmd, ...]."""
-    if not line or not line.strip():
-        return []
-
-    tokens = []
-    current = []
-    in_single = False
-    in_double = False
-    in_backtick = False
-    escaped = False
-    cmd_subst_depth = 0
-    var_brace_depth = 0
-    i = 0
-
-    def flush_current():
-        command = "".join(current).strip()
-        if command:
-            tokens.append(command)
-        current.clear()
-
-    while i < len(line):
-        char = line[i]
-        next_char = line[i + 1] if i + 1 < len(line) else ""
-
-        if escaped:
-            current.append(char)
-            escaped = False
-            i += 1
-            continue
-
-        if char == "\\" and not in_single:
-            current.append(char)
-            escaped = True
-            i += 1
-            continue
-
-        if not in_double and not in_backtick and char == "'":
-            in_single = not in_single
-            current.append(char)
-            i += 1
-            continue
-
-        if not in_single and not in_backtick and char == '"':
-            in_double = not in_double
-            current.append(char)
-            i += 1
-            continue
-
-        if not in_single and char == "`":
-            in_backtick = not in_backtick
-            current.append(char)
-            i += 1
-            continue
-
-        if not in_single and not in_backtick and char == "$" and next_char == "(":
-            cmd_subst_depth += 1
-            current.append(char)
-            current.append(next_char)
-            i += 2
-            continue
-
-        if not in_single and not in_backtick and char == "$" and next_char == "{":
-            var_brace_depth += 1
-            current.append(char)
-            current.append(next_char)
-            i += 2
-            continue
-
-        if cmd_subst_depth > 0 and not in_single and not in_backtick and char == ")":
-            cmd_subst_depth -= 1
-            current.append(char)
-            i += 1
-            continue
-
-        if var_brace_depth > 0 and not in_single and not in_backtick and char == "}":
-            var_brace_depth -= 1
-            current.append(char)
-            i += 1
-            continue
-
-        is_top_level = (
-            not in_single
-            and not in_double
-            and not in_backtick
-            and cmd_subst_depth == 0
-            and var_brace_depth == 0
-        )
-
-        if is_top_level:
-            op = None
-            if char == "&" and next_char == "&":
-                op = "&&"
-            elif char == "|" and next_char == "|":
-                op = "||"
-            elif char == ";":
-                op = ";"
-            elif char == "|":
-                op = "|"
-            elif char == "&":
-                prev_non_space = "".join(current).rstrip()
-                prev_char = prev_non_space[-1] if prev_non_space else ""
-                if prev_char not in [">", "<"]:
-                    op = "&"
-
-            if op:
-                flush_current()
-                tokens.append(op)
-                i += len(op)
-                continue
-
-        current.append(char)
-        i += 1
-
-    if in_single or in_double or in_backtick or cmd_subst_depth or var_brace_depth:
-        return None
-
-    flush_current()
-
-    if not tokens:
-        return []
-    operators = {"&&", "||", "|", ";", "&"}
-    for idx in range(1, len(tokens)):
-        if tokens[idx - 1] in operators and tokens[idx] in operators:
-            return None
-    if tokens[0] in {"&&", "||", "|", ";", "&"}:
-        return None
-    if tokens[-1] in {"&&", "||", "|"}:
-        return None
-
-    return tokens
+    return lexer.parse(line).sequence
 
 
 def split_command_args(line):
     """Split the command line into cmd and args"""
-    # Use shlex to split the command into parts
-    tokens = shlex.split(line)
+    segment = lexer.parse_segment(line)
+    if segment.error:
+        raise ValueError(segment.error)
+    tokens = segment.values
 
     if tokens:
         # The first token is the command
@@ -312,6 +198,29 @@ _SHELL_BUILTINS = {
     "wait",
     "[",
 }
+# reserved words, which bash does not look up in PATH
+_SHELL_KEYWORDS = {
+    "if",
+    "then",
+    "else",
+    "elif",
+    "fi",
+    "case",
+    "esac",
+    "for",
+    "select",
+    "while",
+    "until",
+    "do",
+    "done",
+    "in",
+    "function",
+    "time",
+    "coproc",
+}
+# characters giving a line a meaning only bash implements: operators,
+# redirections, substitutions, expansions, globs, comments and escapes
+_SHELL_SYNTAX = re.compile(r"[$`*?\[\]{}~#<>|&;()!\\\n]")
 
 
 def _expand_braced_parameter(expr, support_advanced=True):
@@ -432,38 +341,28 @@ def expand_vars_quoted(line, support_advanced_braced=True):
 
 
 def _is_assignment_word(word):
-    return bool(re.match(r"^[A-Za-z_][A-Za-z0-9_]*=.*$", word))
+    return lexer.is_assignment_word(word)
 
 
 def _parse_command(command):
     """Parse a command into executable/argument while honoring shell quoting."""
-    try:
-        split = shlex.split(command, posix=True)
-    except ValueError:
+    segment = lexer.parse_segment(command)
+    if segment.error:
         return None, None, None, None
 
-    if not split:
+    if not segment.words:
         return "", "", [], []
 
-    assignments = []
-    position = 0
-    while position < len(split) and _is_assignment_word(split[position]):
-        name, value = split[position].split("=", 1)
-        assignments.append((name, value))
-        position += 1
-
-    if position >= len(split):
-        return "", "", split, assignments
+    assignments = list(segment.assignments)
+    if not segment.command and len(assignments) == len(segment.words):
+        return "", "", segment.values, assignments
 
-    executable = split[position]
-    args = split[position + 1 :]
-    argument = " ".join(args)
-    return executable, argument, split, assignments
+    return segment.command, " ".join(segment.args), segment.values, assignments
 
 
 def _is_allowed_command(executable, command, conf):
     """Check command authorization from lshell config."""
-    return executable in conf["allowed"] or command in conf["allowed"]
+    return authindex.for_conf(conf).permits(executable, command)
 
 
 def _command_exists(executable):
@@ -477,7 +376,7 @@ def _command_exists(executable):
     if "/" in executable:
         return os.path.isfile(executable) and os.access(executable, os.X_OK)
 
-    return shutil.which(executable) is not None
+    return executables.which(executable) is not None
 
 
 def handle_builtin_command(full_command, executable, argument, shell_context):
@@ -529,6 +428,12 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
     trusted_protocol is only for protocol commands (scp/sftp-server)
     that were already validated in run_overssh.
     """
+    # memoize the filesystem lookups of the security checks, see fsmemo
+    with fsmemo.scope():
+        return _cmd_parse_execute(command_line, shell_context, trusted_protocol)
+
+
+def _cmd_parse_execute(command_line, shell_context, trusted_protocol):
     def _handle_unknown_syntax(unknown_command):
         ret, shell_context.conf = sec.warn_unknown_syntax(
             unknown_command,
@@ -669,6 +574,9 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
             i = j + (2 if j + 1 < len(command_sequence) and command_sequence[j + 1] == "&" else 1)
             continue
 
+        # Nothing resolved before the previous command ran can be trusted.
+        fsmemo.reset()
+
         # Build a pipeline command sequence at top-level (`cmd1 | cmd2 | ...`).
         pipeline_parts = [current_item]
         j = i
@@ -696,7 +604,8 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
         if background:
             limits = containment.get_runtime_limits(shell_context.conf)
             if limits.max_background_jobs > 0:
-                active_jobs = len(builtincmd.jobs())
+                builtincmd.BACKGROUND_JOBS.collect()
+                active_jobs = len(builtincmd.BACKGROUND_JOBS)
                 if active_jobs >= limits.max_background_jobs:
                     reason = containment.reason_with_details(
                         "runtime_limit.max_background_jobs_exceeded",
@@ -763,7 +672,16 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
             i = j + (2 if background else 1)
             continue
 
-        if not skip_policy_checks:
+        # reuse the decision of a line allowed before, see decisioncache
+        decision_cache = decisioncache.for_conf(shell_context.conf)
+        decision_key = None
+        if decision_cache is not None and not skip_policy_checks:
+            decision_key = decision_cache.key(full_command, shell_context.conf)
+        cached_decision = decision_key is not None and decision_cache.allows(
+            decision_key
+        )
+
+        if not skip_policy_checks and not cached_decision:
             # check that commands/chars present in line are allowed/secure
             ret_check_secure, shell_context.conf = sec.check_secure(
                 full_command, shell_context.conf, strict=shell_context.conf["strict"]
@@ -804,6 +722,9 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
                     exec_cmd(f'echo "WinSCP: this is end-of-file: {retcode}"')
                 return retcode
 
+            if decision_key is not None:
+                decision_cache.add(decision_key)
+
         # Execute command
         if len(pipeline_parts) == 1 and executable in builtincmd.builtins_list and not background:
             audit.log_command_event(
@@ -877,9 +798,82 @@ def cmd_parse_execute(command_line, shell_context=None, trusted_protocol=False):
     return retcode
 
 
+def _direct_exec_args(cmd, env):
+    """Return (path, argv) to execute cmd without a shell, or None when cmd
+    needs bash: operators, redirections, substitutions, expansions, globs,
+    assignments, or a bash builtin. The executable is resolved through the
+    PATH of env.
+    """
+    if _SHELL_SYNTAX.search(cmd):
+        return None
+    command_line = lexer.parse(cmd)
+    if not command_line.valid or len(command_line.items) != 1:
+        return None
+    segment = command_line.items[0]
+    if segment.error or segment.assignments or not segment.command:
+        return None
+    if segment.command in _SHELL_BUILTINS or segment.command in _SHELL_KEYWORDS:
+        return None
+
+    if "/" in segment.command:
+        path = segment.command
+        if not (os.path.isfile(path) and os.access(path, os.X_OK)):
+            return None
+    else:
+        path = executables.which(segment.command, env.get("PATH", os.defpath))
+        if path is None:
+            return None
+    return path, [segment.command, *segment.args]
+
+
+def _direct_pipeline_args(cmd, env):
+    """Return the (path, argv) of each command of the pipeline cmd, or None
+    when cmd is not a pipeline of commands _direct_exec_args can execute.
+    """
+    command_line = lexer.parse(cmd)
+    if not command_line.valid:
+        return None
+    items = command_line.items
+    if len(items) < 3 or len(items) % 2 == 0:
+        return None
+    if any(operator != "|" for operator in items[1::2]):
+        return None
+    stages = []
+    for segment in items[::2]:
+        direct = _direct_exec_args(segment.text, env)
+        if direct is None:
+            return None
+        stages.append(direct)
+    return stages
+
+
+def _execs_without_shell(path):
+    """True when execve() runs path itself: an ELF binary or a script with
+    a shebang. Other files are run by the shell that executes them, which
+    would be /bin/sh under an exec wrapper such as prlimit.
+    """
+    try:
+        with open(path, "rb") as handle:
+            magic = handle.read(4)
+    except OSError:
+        # let the exec report the error
+        return True
+    return magic == b"\x7fELF" or magic.startswith(b"#!")
+
+
+def _exec_error_status(exception):
+    """Report why a command could not be executed, and return the exit
+    status bash uses: 127 when the file was not found, 126 otherwise.
+    """
+    name = exception.filename or "command"
+    sys.stderr.write(f"lshell: {name}: {exception.strerror or exception}\n")
+    return 127 if exception.errno == errno.ENOENT else 126
+
+
 def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
     """Execute a command exactly as entered, with support for backgrounding via Ctrl+Z."""
     proc = None
+    deadline = None
     detached_session = True
     exec_env = dict(os.environ)
     runtime_limits = containment.get_runtime_limits(conf or {})
@@ -906,6 +900,11 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
 
         pass
 
+    class SpawnError(Exception):
+        """The command could not be executed; carries its exit status."""
+
+        pass
+
     def handle_sigtstp(signum, frame):
         """Handle SIGTSTP (Ctrl+Z) by sending the process to the background."""
         if proc and proc.poll() is None:  # Ensure process is running
@@ -914,11 +913,7 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
             else:
                 os.kill(proc.pid, signal.SIGSTOP)
             # Keep one job entry per process to avoid duplicates on repeated suspend/resume.
-            if proc in builtincmd.BACKGROUND_JOBS:
-                job_id = builtincmd.BACKGROUND_JOBS.index(proc) + 1
-            else:
-                builtincmd.BACKGROUND_JOBS.append(proc)
-                job_id = len(builtincmd.BACKGROUND_JOBS)
+            job_id = builtincmd.BACKGROUND_JOBS.add(proc)
             sys.stdout.write(f"\n[{job_id}]+  Stopped        {cmd}\n")
             sys.stdout.flush()
             raise CtrlZException()  # Raise custom exception for SIGTSTP handling
@@ -966,6 +961,23 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
             f"lshell: command timed out after {command_timeout}s: {cmd}\n"
         )
 
+    def _timeout_expired(target):
+        if target.poll() is None:
+            target.lshell_timeout_triggered = True
+            _kill_process_group(target)
+            # a foreground command is reported by exec_cmd once reaped
+            if not getattr(target, "lshell_foreground", False):
+                _emit_timeout_event()
+
+    def _watch(target):
+        deadline = None
+        if command_timeout > 0:
+            deadline = watchdog.schedule(
+                command_timeout, lambda: _timeout_expired(target)
+            )
+        target.lshell_timeout_timer = deadline
+        return deadline
+
     previous_sigtstp_handler = signal.getsignal(signal.SIGTSTP)
     previous_sigcont_handler = signal.getsignal(signal.SIGCONT)
 
@@ -974,18 +986,80 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
         signal.signal(signal.SIGTSTP, handle_sigtstp)
         signal.signal(signal.SIGCONT, handle_sigcont)
         cmd_args = ["bash", "-c", cmd]
-        try:
-            split_cmd = shlex.split(cmd, posix=True)
-        except ValueError:
-            split_cmd = []
+        executable = None
+        stages = None
+        split_cmd = [word.value for word in lexer.parse(cmd).words]
         if split_cmd and split_cmd[0] in ("sudo", "su"):
             cmd_args = split_cmd
             if not background:
                 detached_session = False
-        preexec_fn = None
+        else:
+            # simple commands are executed directly, without a bash process
+            direct = _direct_exec_args(cmd, exec_env)
+            if direct is not None:
+                executable, cmd_args = direct
+            # Pipelines of simple commands are spawned by lshell, in a
+            # process group of lshell's session: a group of another session
+            # cannot be joined. It is not the terminal's foreground group,
+            # so the first command must not read from the terminal.
+            elif pipeline.SUPPORTED and (background or not os.isatty(0)):
+                stages = _direct_pipeline_args(cmd, exec_env)
+        # Without a preexec_fn, subprocess can spawn with vfork: the session
+        # is created by start_new_session and the rlimits by an exec wrapper.
+        spawn_kwargs = {}
         needs_resource_limits = runtime_limits.max_processes > 0
-        if os.name == "posix" and (detached_session or needs_resource_limits):
-            preexec_fn = containment.build_preexec_fn(detached_session, runtime_limits)
+        if os.name == "posix":
+            if detached_session and stages is None:
+                spawn_kwargs["start_new_session"] = True
+            if needs_resource_limits:
+                wrapper = containment.rlimit_wrapper(runtime_limits)
+                if wrapper is None:
+                    spawn_kwargs["preexec_fn"] = containment.build_preexec_fn(
+                        False, runtime_limits
+                    )
+                elif wrapper:
+                    paths = [executable] if executable is not None else []
+                    paths.extend(path for path, _argv in stages or [])
+                    if not all(_execs_without_shell(path) for path in paths):
+                        # prlimit would run it with /bin/sh: wrap bash
+                        executable = None
+                        stages = None
+                        cmd_args = ["bash", "-c", cmd]
+                        if detached_session:
+                            spawn_kwargs["start_new_session"] = True
+                    if executable is not None:
+                        cmd_args = [executable, *cmd_args[1:]]
+                        executable = None
+                    cmd_args = wrapper + cmd_args
+                    if stages is not None:
+                        stages = [
+                            (None, wrapper + [path, *argv[1:]])
+                            for path, argv in stages
+                        ]
+
+        def _popen(popen_kwargs):
+            if stages is not None:
+                return pipeline.spawn(stages, **popen_kwargs)
+            if executable is not None:
+                return subprocess.Popen(
+                    cmd_args, executable=executable, **popen_kwargs
+                )
+            return subprocess.Popen(cmd_args, **popen_kwargs)
+
+        def _spawn(popen_kwargs):
+            try:
+                try:
+                    return _popen(popen_kwargs)
+                except OSError as exception:
+                    direct = executable is not None or stages is not None
+                    if exception.errno != errno.ENOEXEC or not direct:
+                        raise
+                # a script without a shebang: bash runs it itself, and the
+                # whole pipeline it is part of
+                return subprocess.Popen(["bash", "-c", cmd], **popen_kwargs)
+            except OSError as exception:
+                raise SpawnError(_exec_error_status(exception)) from exception
+
         if background:
             with open(os.devnull, "r") as devnull_in:
                 popen_kwargs = {
@@ -993,52 +1067,29 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
                     "stdout": sys.stdout,
                     "stderr": sys.stderr,
                     "env": exec_env,
+                    **spawn_kwargs,
                 }
-                if preexec_fn is not None:
-                    popen_kwargs["preexec_fn"] = preexec_fn
-                proc = subprocess.Popen(cmd_args, **popen_kwargs)
+                proc = _spawn(popen_kwargs)
             proc.lshell_cmd = cmd
-            proc.lshell_timeout_timer = None
-            if command_timeout > 0:
-
-                def _background_timeout():
-                    if proc and proc.poll() is None:
-                        proc.lshell_timeout_triggered = True
-                        _kill_process_group(proc)
-                        _emit_timeout_event()
-
-                timeout_timer = threading.Timer(command_timeout, _background_timeout)
-                timeout_timer.daemon = True
-                timeout_timer.start()
-                proc.lshell_timeout_timer = timeout_timer
+            deadline = _watch(proc)
             # add to background jobs and return
-            builtincmd.BACKGROUND_JOBS.append(proc)
-            job_id = len(builtincmd.BACKGROUND_JOBS)
+            job_id = builtincmd.BACKGROUND_JOBS.add(proc)
             print(f"[{job_id}] {cmd} (pid: {proc.pid})")
             retcode = 0
         else:
-            popen_kwargs = {"env": exec_env}
-            if preexec_fn is not None:
-                popen_kwargs["preexec_fn"] = preexec_fn
-            proc = subprocess.Popen(cmd_args, **popen_kwargs)
+            proc = _spawn({"env": exec_env, **spawn_kwargs})
             proc.lshell_cmd = cmd
-            if command_timeout > 0:
-                proc.communicate(timeout=command_timeout)
+            proc.lshell_foreground = True
+            deadline = _watch(proc)
+            proc.communicate()
+            if getattr(proc, "lshell_timeout_triggered", False):
+                _emit_timeout_event()
+                retcode = 124
             else:
-                proc.communicate()
-            retcode = proc.returncode if proc.returncode is not None else 0
+                retcode = proc.returncode if proc.returncode is not None else 0
 
-    except FileNotFoundError:
-        sys.stderr.write(
-            "Command execution failed: required shell interpreter not found.\n"
-        )
-        retcode = 127
-    except subprocess.TimeoutExpired:
-        _kill_process_group(proc)
-        if proc:
-            proc.communicate()
-        _emit_timeout_event()
-        retcode = 124
+    except SpawnError as exception:
+        retcode = exception.args[0]
     except subprocess.SubprocessError as exception:
         reason = containment.reason_with_details(
             "runtime_limit.preexec_application_failed",
@@ -1071,12 +1122,11 @@ def exec_cmd(cmd, background=False, extra_env=None, conf=None, log=None):
                 os.kill(proc.pid, signal.SIGINT)
         retcode = 130
     finally:
-        if (
-            proc is not None
-            and getattr(proc, "lshell_timeout_timer", None) is not None
-            and proc.poll() is not None
-        ):
-            proc.lshell_timeout_timer.cancel()
+        if deadline is not None and proc.poll() is not None:
+            deadline.cancel()
+        if proc is not None:
+            # suspended or interrupted, it is reported like a background job
+            proc.lshell_foreground = False
         signal.signal(signal.SIGTSTP, previous_sigtstp_handler)
         signal.signal(signal.SIGCONT, previous_sigcont_handler)
 
@@ -108,11 +108,15 @@ configparams = [
     "disable_exit=",
     "policy_commands=",
     "include_dir=",
+    "group_cache_ttl=",
     "security_audit_json=",
     "max_sessions_per_user=",
     "max_background_jobs=",
     "command_timeout=",
     "max_processes=",
+    "wildcard_max_dirs=",
+    "wildcard_timeout=",
+    "decision_cache=",
 ]
 
 FORBIDDEN_ENVIRON = (
@@ -0,0 +1,133 @@
+"""One watchdog thread per session for the command_timeout deadlines.
+
+exec_cmd used to start a threading.Timer, hence an OS thread, for every
+background job, and to wait for foreground commands in
+Popen.communicate(timeout=...), which polls the process. schedule() records
+the deadline in a heap instead. A single daemon thread, started with the
+first deadline of the session, sleeps until the earliest deadline and runs
+the callbacks of the deadlines reached.
+
+schedule() returns a Deadline whose cancel() forgets it, as the cancel() of
+threading.Timer did for builtincmd._cancel_job_timeout. Cancelled deadlines
+are dropped from the heap lazily, and the heap is rebuilt when they
+outnumber the pending ones.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Deadline:
+    """A callback due at a time of time.monotonic()."""
+
+    __slots__ = ("watchdog", "when", "callback", "done")
+
+    def __init__(self, watchdog, when, callback):
+        self.watchdog = watchdog
+        self.when = when
+        self.callback = callback
+        # the callback ran, or was cancelled
+        self.done = False
+
+    def cancel(self):
+        """Do not run the callback, unless it ran already."""
+        self.watchdog.cancel(self)
+
+
+class Watchdog:
+    """Heap of deadlines served by one thread."""
+
+    def __init__(self):
+        self._heap = []
+        # ties keep the scheduling order, and never compare deadlines
+        self._order = itertools.count()
+        # cancelled deadlines still in the heap
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, callback):
+        """Run callback in the watchdog thread after delay seconds."""
+        deadline = Deadline(self, time.monotonic() + delay, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline.when, next(self._order), deadline))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="lshell-watchdog", daemon=True
+                )
+                self._thread.start()
+            elif self._heap[0][2] is deadline:
+                # earlier than what the thread sleeps for
+                self._condition.notify()
+        return deadline
+
+    def cancel(self, deadline):
+        """Forget deadline, unless its callback ran already."""
+        with self._condition:
+            if deadline.done:
+                return
+            deadline.done = True
+            self._cancelled += 1
+            if self._cancelled * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if not entry[2].done]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def pending(self):
+        """Return the number of deadlines still to be reached."""
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def _next_due(self):
+        """Sleep until deadlines are reached, and return them."""
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2].done:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                due = []
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    deadline = heapq.heappop(self._heap)[2]
+                    if deadline.done:
+                        self._cancelled -= 1
+                        continue
+                    deadline.done = True
+                    due.append(deadline)
+                return due
+
+    def _run(self):
+        while True:
+            for deadline in self._next_due():
+                try:
+                    deadline.callback()
+                except Exception:  # pylint: disable=broad-except
+                    # a failing callback must not stop the other deadlines
+                    pass
+
+
+_WATCHDOG = None
+
+
+def get():
+    """Return the watchdog of the session."""
+    global _WATCHDOG
+    if _WATCHDOG is None:
+        _WATCHDOG = Watchdog()
+    return _WATCHDOG
+
+
+def schedule(delay, callback):
+    """Run callback in the watchdog thread of the session after delay
+    seconds, and return its Deadline.
+    """
+    return get().schedule(delay, callback)
@@ -0,0 +1,188 @@
+"""Bounded expansion of shell wildcards.
+
+Path checks expand the wildcards of a command line to validate every file the
+shell would pass to the command. glob.iglob() has no bound on the work done:
+'/**/nomatch*' walks the whole filesystem, network mounts included, before
+returning nothing. iter_matches() follows the matching rules of
+glob.iglob(recursive=True) (hidden entries only match patterns starting with
+a dot, '**' spans any number of directories) but walks under a Budget:
+
+- at most max_dirs directories are listed;
+- the walk stops after timeout seconds.
+
+Exceeding the budget raises BudgetExceeded. A 'prune' callback may also stop
+the walk from entering a directory: the directory is then reported as a match
+instead of its content, so that a caller refusing it refuses the wildcard
+without the subtree being walked.
+"""
+
+import fnmatch
+import glob
+import os
+import re
+import time
+
+from lshell import fsmemo
+
+
+# real path of a directory that may not be walked
+_PRUNED = object()
+
+
+class BudgetExceeded(Exception):
+    """Raised when a wildcard expansion exceeds its budget."""
+
+
+class Budget:
+    """Directories and wall-clock time a wildcard expansion may use.
+
+    Limits of 0 are disabled.
+    """
+
+    def __init__(self, max_dirs=0, timeout=0):
+        self.max_dirs = max_dirs
+        self.timeout = timeout
+        self.dirs = 0
+        self._deadline = time.monotonic() + timeout if timeout > 0 else None
+
+    def charge(self, directory):
+        """Account for listing directory, raise BudgetExceeded when over."""
+        self.dirs += 1
+        if self.max_dirs > 0 and self.dirs > self.max_dirs:
+            raise BudgetExceeded(f"more than {self.max_dirs} directories: {directory}")
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise BudgetExceeded(f"more than {self.timeout}s: {directory}")
+
+
+def _listdir(directory, budget, dirs_only):
+    """Yield (name, entry) of directory, skipping unreadable directories."""
+    budget.charge(directory)
+    try:
+        with os.scandir(directory or os.curdir) as entries:
+            for entry in entries:
+                try:
+                    if dirs_only and not entry.is_dir():
+                        continue
+                except OSError:
+                    continue
+                yield entry.name, entry
+    except OSError:
+        return
+
+
+def _join(directory, name):
+    return os.path.join(directory, name) if directory else name
+
+
+class _Walker:
+    """Expand one pattern, component by component."""
+
+    def __init__(self, budget, prune):
+        self.budget = budget
+        self.prune = prune
+
+    def _real(self, path, real):
+        return real if real is not None else fsmemo.realpath(path or os.curdir)
+
+    def _child(self, directory, real, name, entry):
+        """Return (path, real path) of an entry of directory."""
+        path = _join(directory, name)
+        try:
+            symlink = entry.is_symlink()
+        except OSError:
+            symlink = True
+        if real is None or symlink:
+            return path, None
+        return path, os.path.join(real, name)
+
+    def _enter(self, directory, real):
+        """Return the real path of directory, or _PRUNED."""
+        if self.prune is None:
+            return real
+        real = self._real(directory, real)
+        if self.prune(real):
+            return _PRUNED
+        return real
+
+    def _magic(self, directory, real, component, dirs_only):
+        """Yield the entries of directory matching the component."""
+        matcher = re.compile(fnmatch.translate(component)).match
+        hidden = component.startswith(".")
+        for name, entry in _listdir(directory, self.budget, dirs_only):
+            if name.startswith(".") and not hidden:
+                continue
+            if matcher(name):
+                yield self._child(directory, real, name, entry)
+
+    def _recursive(self, directory, real, dirs_only):
+        """Yield directory and, recursively, its non-hidden entries."""
+        yield os.path.join(directory, "") if directory else "", real
+        pending = [(directory, real)]
+        while pending:
+            current, current_real = pending.pop()
+            if current != directory:
+                current_real = self._enter(current, current_real)
+                if current_real is _PRUNED:
+                    # already yielded, only its content is skipped
+                    continue
+            for name, entry in _listdir(current, self.budget, False):
+                if name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                child = self._child(current, current_real, name, entry)
+                if is_dir:
+                    pending.append(child)
+                    yield child
+                elif not dirs_only:
+                    yield child
+
+    def _step(self, directory, real, component, dirs_only):
+        """Yield the (path, real path) of directory matching component, or
+        (directory, _PRUNED) when directory may not be walked.
+        """
+        if component == "":
+            # trailing slash: keep directories
+            if os.path.isdir(directory or os.curdir):
+                yield os.path.join(directory, ""), real
+            return
+        if not glob.has_magic(component):
+            path = _join(directory, component)
+            if os.path.lexists(path):
+                yield path, None
+            return
+        entered = self._enter(directory, real)
+        if entered is _PRUNED:
+            yield directory, _PRUNED
+        elif component == "**":
+            yield from self._recursive(directory, entered, dirs_only)
+        else:
+            yield from self._magic(directory, entered, component, dirs_only)
+
+    def expand(self, directory, real, components):
+        """Yield the paths below directory matching the components."""
+        last = len(components) == 1
+        for path, path_real in self._step(directory, real, components[0], not last):
+            if path_real is _PRUNED:
+                # reported instead of its content
+                yield path
+            elif last:
+                if path:
+                    yield path
+            else:
+                yield from self.expand(path, path_real, components[1:])
+
+
+def iter_matches(pattern, budget, prune=None):
+    """Yield the paths matching the wildcard pattern, like
+    glob.iglob(pattern, recursive=True), within budget.
+
+    prune(real_path) returns True for directories not to be walked; such a
+    directory is yielded in place of its matching content.
+    """
+    walker = _Walker(budget, prune)
+    if pattern.startswith(os.sep):
+        return walker.expand(os.sep, os.sep, pattern.lstrip(os.sep).split(os.sep))
+    return walker.expand("", None, pattern.split(os.sep))
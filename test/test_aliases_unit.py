@@ -0,0 +1,118 @@
+"""Unit tests for the compiled alias expander."""
+
+import os
+import random
+import re
+import unittest
+from unittest.mock import patch
+
+from lshell import aliases
+from lshell import utils
+from lshell.checkconfig import CheckConfig
+
+CONFIG = f"{os.path.dirname(os.path.realpath(__file__))}/testfiles/test.conf"
+
+WORDS = ["ls", "ll", "la", "x", "lsx"]
+PIECES = WORDS + [" ", "  ", ";", "&", "&&", "|", "||", "\t", "\n", "-l", "'"]
+
+
+def _legacy_get_aliases(line, alias_map):
+    """Reference implementation: search the whole line again for every alias
+    and after every substitution.
+    """
+    for item in alias_map.keys():
+        escaped_item = re.escape(item)
+        reg1 = rf"(^|;|&&|\|\||\|)\s*{escaped_item}([ ;&\|]+|$)(.*)"
+        reg2 = rf"(^|;|&&|\|\||\|)\s*{escaped_item}([ ;&\|]+|$)"
+        aliaskey = utils.random_string(10)
+        while re.findall(reg1, line):
+            before, after, _ = re.findall(reg1, line)[0]
+            linesave = line
+            line = re.sub(reg2, f"{before} {aliaskey}{after}", line, count=1)
+            if linesave == line:
+                break
+        line = line.replace(aliaskey, alias_map[item])
+    return line.replace(";;", ";")
+
+
+class TestAliasExpander(unittest.TestCase):
+    """The single pass expander keeps the legacy expansion results."""
+
+    def test_matches_legacy_on_random_input(self):
+        """Random alias sets and lines expand exactly like before."""
+        generator = random.Random(1234)
+        for _ in range(5000):
+            alias_map = {
+                key: "".join(
+                    generator.choice(PIECES) for _ in range(generator.randint(0, 4))
+                )
+                + generator.choice(WORDS)
+                for key in generator.sample(WORDS, generator.randint(1, 4))
+            }
+            line = "".join(
+                generator.choice(PIECES) for _ in range(generator.randint(0, 10))
+            )
+            with self.subTest(aliases=alias_map, line=line):
+                self.assertIsNotNone(aliases.compile_aliases(alias_map))
+                self.assertEqual(
+                    utils.get_aliases(line, alias_map),
+                    _legacy_get_aliases(line, alias_map),
+                )
+
+    def test_self_prefixed_alias_is_not_expanded_again(self):
+        """An alias starting with its own key expands once."""
+        alias_map = {"ll": "ls -l", "ls": "ls --color=auto"}
+        self.assertEqual(
+            utils.get_aliases("ll /tmp; ls|ls", alias_map),
+            " ls --color=auto -l /tmp; ls --color=auto| ls --color=auto",
+        )
+
+    def test_later_aliases_expand_in_earlier_values(self):
+        """Aliases apply in order: only later ones expand inside a value."""
+        self.assertEqual(utils.get_aliases("a", {"a": "b; c", "b": "B"}), " B; c")
+        self.assertEqual(utils.get_aliases("b", {"b": "B", "a": "b"}), " B")
+        self.assertEqual(utils.get_aliases("a", {"b": "B", "a": "b"}), " b")
+
+    def test_unsupported_aliases_use_the_legacy_expansion(self):
+        """Multi-word keys and values ending with an operator still work."""
+        for alias_map, line in [
+            ({"git st": "git status"}, "git st && ls"),
+            ({"bg": "sleep 1 &", "ls": "ls -l"}, "bg ls"),
+            ({"nothing": "", "ls": "ls -l"}, "nothing ls"),
+        ]:
+            with self.subTest(aliases=alias_map):
+                self.assertIsNone(aliases.compile_aliases(alias_map))
+                self.assertEqual(
+                    utils.get_aliases(line, alias_map),
+                    _legacy_get_aliases(line, alias_map),
+                )
+
+    def test_expander_is_compiled_once(self):
+        """Alias mappings with the same items share one expander."""
+        expander = aliases.compile_aliases({"ll": "ls -l"})
+        self.assertIsInstance(expander, aliases.AliasExpander)
+        self.assertIs(aliases.compile_aliases({"ll": "ls -l"}), expander)
+        self.assertIsNot(aliases.compile_aliases({"ll": "ls -la"}), expander)
+
+    def test_conf_expander_is_compiled_at_load(self):
+        """get_aliases uses the expander stored in conf, without compiling."""
+        conf = {"aliases": {"ll": "ls -l"}}
+        expander = aliases.for_conf(conf)
+        self.assertIs(conf[aliases.EXPANDER_KEY][2], expander)
+        with patch.object(aliases, "compile_aliases") as compile_aliases:
+            self.assertEqual(
+                utils.get_aliases("ll /tmp", conf["aliases"], conf), " ls -l /tmp"
+            )
+        compile_aliases.assert_not_called()
+
+        self.addCleanup(os.chdir, os.getcwd())
+        loaded = CheckConfig([f"--config={CONFIG}", "--quiet=1"]).returnconf()
+        self.assertIs(loaded[aliases.EXPANDER_KEY][0], loaded["aliases"])
+
+        conf["aliases"] = {"ll": "ls -la"}
+        self.assertEqual(utils.get_aliases("ll", conf["aliases"], conf), " ls -la")
+        self.assertEqual(utils.get_aliases("ll", {"ll": "ls"}, conf), " ls")
+
+
+if __name__ == "__main__":
+    unittest.main()
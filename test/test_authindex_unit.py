@@ -0,0 +1,88 @@
+"""Unit tests for the compiled 'allowed' command index."""
+
+import unittest
+
+from lshell import authindex
+from lshell import utils
+
+ALLOWED = ["ls", "echo hello", "echo  spaced", "git status", "./backup.sh", "sudo"]
+
+CANDIDATES = [
+    "ls",
+    "ls -l",
+    "echo",
+    "echo hello",
+    "echo hello world",
+    "echo  spaced",
+    "echo spaced",
+    "git",
+    "git status",
+    "git status -s",
+    "./backup.sh",
+    "backup.sh",
+    "",
+    " ",
+    "sudo",
+]
+
+
+class TestAuthorizationIndex(unittest.TestCase):
+    """The index answers exactly like membership in the allowed list."""
+
+    def test_membership_matches_list(self):
+        """Bare executables and full command lines match list membership."""
+        index = authindex.AuthorizationIndex(ALLOWED)
+        for candidate in CANDIDATES:
+            with self.subTest(candidate=candidate):
+                self.assertEqual(candidate in index, candidate in ALLOWED)
+
+    def test_permits_command_or_full_command(self):
+        """A line is allowed by its executable or by the whole line."""
+        index = authindex.AuthorizationIndex(ALLOWED)
+        self.assertTrue(index.permits("ls", "ls -l"))
+        self.assertTrue(index.permits("echo", "echo hello"))
+        self.assertFalse(index.permits("echo", "echo bye"))
+        self.assertFalse(index.permits("git", "git push"))
+
+    def test_full_commands_are_keyed_by_executable(self):
+        """Entries with arguments are grouped under their executable."""
+        index = authindex.AuthorizationIndex(ALLOWED)
+        self.assertEqual(index.executables, {"ls", "./backup.sh", "sudo"})
+        self.assertEqual(
+            index.full_commands,
+            {"echo": {"echo hello", "echo  spaced"}, "git": {"git status"}},
+        )
+
+    def test_conf_index_is_reused(self):
+        """The index is compiled once per allowed list."""
+        conf = {"allowed": list(ALLOWED)}
+        index = authindex.for_conf(conf)
+        self.assertIs(authindex.for_conf(conf), index)
+        self.assertIs(conf[authindex.INDEX_KEY], index)
+
+    def test_conf_index_follows_allowed_changes(self):
+        """Extending or replacing the allowed list compiles a new index."""
+        conf = {"allowed": ["ls"], "overssh": ["scp"]}
+        self.assertFalse(utils._is_allowed_command("vim", "vim a", conf))
+
+        conf["allowed"].append("vim")
+        self.assertTrue(utils._is_allowed_command("vim", "vim a", conf))
+
+        conf["allowed"] = conf["overssh"]
+        self.assertFalse(utils._is_allowed_command("ls", "ls", conf))
+        self.assertTrue(utils._is_allowed_command("scp", "scp a b", conf))
+
+    def test_indexes_of_equal_lists_are_equal(self):
+        """Indexes compare by content, whatever the list order."""
+        self.assertEqual(
+            authindex.AuthorizationIndex(["ls", "echo hi"]),
+            authindex.AuthorizationIndex(["echo hi", "ls", "ls"]),
+        )
+        self.assertNotEqual(
+            authindex.AuthorizationIndex(["ls"]),
+            authindex.AuthorizationIndex(["ls -l"]),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
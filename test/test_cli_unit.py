@@ -82,3 +82,23 @@ class TestCliArgs(unittest.TestCase):
                         cli.main()
         mock_harden_main.assert_called_once_with(["--list-templates"])
         mock_exit.assert_called_once_with(3)
+
+    def test_main_routes_include_index_subcommand(self):
+        """Dispatch include-index subcommand to dedicated handler."""
+        with patch("lshell.cli.include_index.main", return_value=0) as mock_index_main:
+            with patch("lshell.cli.sys.argv", ["lshell", "include-index", "--check"]):
+                with patch("lshell.cli.sys.exit", side_effect=SystemExit) as mock_exit:
+                    with self.assertRaises(SystemExit):
+                        cli.main()
+        mock_index_main.assert_called_once_with(["--check"])
+        mock_exit.assert_called_once_with(0)
+
+    def test_main_routes_group_cache_subcommand(self):
+        """Dispatch group-cache subcommand to dedicated handler."""
+        with patch("lshell.cli.group_cache.main", return_value=0) as mock_cache_main:
+            with patch("lshell.cli.sys.argv", ["lshell", "group-cache", "alice"]):
+                with patch("lshell.cli.sys.exit", side_effect=SystemExit) as mock_exit:
+                    with self.assertRaises(SystemExit):
+                        cli.main()
+        mock_cache_main.assert_called_once_with(["alice"])
+        mock_exit.assert_called_once_with(0)
@@ -0,0 +1,145 @@
+"""Unit tests for configuration hot-reload watching."""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from getpass import getuser
+from unittest.mock import patch
+
+from lshell import configwatch
+from lshell.checkconfig import CheckConfig
+from lshell.shellcmd import ShellCmd
+
+
+class TestConfigWatcher(unittest.TestCase):
+    """Detect changes to every configuration source."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-configwatch-")
+        self.include_dir = os.path.join(self.tmpdir, "lshell.d")
+        os.mkdir(self.include_dir)
+        self.configfile = os.path.join(self.tmpdir, "lshell.conf")
+        self.include_file = os.path.join(self.include_dir, "users.conf")
+        self.env_file = os.path.join(self.tmpdir, "env")
+        self._write(
+            self.configfile,
+            "[global]\n"
+            f"logpath         : {self.tmpdir}\n"
+            "loglevel        : 0\n"
+            f"include_dir     : {self.include_dir}/\n"
+            "\n"
+            "[default]\n"
+            "allowed         : ['ls', 'echo']\n"
+            "forbidden       : [';', '&', '|']\n"
+            "warning_counter : 2\n"
+            "strict          : 0\n"
+            f"env_vars_files  : ['{self.env_file}']\n",
+        )
+        self._write(self.include_file, f"[{getuser()}]\nallowed : + ['cat']\n")
+        self._write(self.env_file, "export LSHELL_WATCH_TEST=one\n")
+        self.cwd = os.getcwd()
+        self.environ = patch.dict(os.environ, {})
+        self.environ.start()
+        self.interval = patch.object(configwatch, "POLL_INTERVAL", 0)
+        self.interval.start()
+        self.conf = CheckConfig([f"--config={self.configfile}", "--quiet=1"]).returnconf()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.interval.stop()
+        self.environ.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        later = time.time() + 5
+        if os.path.exists(path):
+            os.utime(path, (later, later))
+
+    def _watchers(self):
+        watchers = [configwatch.ConfigWatcher(self.conf, use_inotify=False)]
+        inotify_watcher = configwatch.ConfigWatcher(self.conf)
+        if inotify_watcher.inotify is not None:
+            watchers.append(inotify_watcher)
+        return watchers
+
+    def test_unchanged_sources(self):
+        """Polling without changes reports nothing."""
+        for watcher in self._watchers():
+            self.assertEqual(watcher.poll(), (False, []))
+
+    def test_unrelated_change_is_ignored(self):
+        """Files next to the sources do not trigger a reload."""
+        watchers = self._watchers()
+        self._write(os.path.join(self.tmpdir, "unrelated.log"), "noise\n")
+        for watcher in watchers:
+            self.assertEqual(watcher.poll(), (False, []))
+
+    def test_main_config_change(self):
+        """Modifying the main configuration file is a policy change."""
+        watchers = self._watchers()
+        with open(self.configfile, "a", encoding="utf-8") as handle:
+            handle.write("# edited\n")
+        for watcher in watchers:
+            self.assertEqual(watcher.poll(), (True, []))
+            self.assertEqual(watcher.poll(), (False, []))
+
+    def test_include_file_added(self):
+        """A new include_dir file is a policy change."""
+        watchers = self._watchers()
+        self._write(os.path.join(self.include_dir, "extra.conf"), "[default]\n")
+        for watcher in watchers:
+            self.assertEqual(watcher.poll(), (True, []))
+
+    def test_env_file_change(self):
+        """Modifying an env_vars_files entry is reported on its own."""
+        watchers = self._watchers()
+        self._write(self.env_file, "export LSHELL_WATCH_TEST=two\n")
+        for watcher in watchers:
+            self.assertEqual(watcher.poll(), (False, [self.env_file]))
+
+    def test_stat_polling_is_rate_limited(self):
+        """Without inotify, sources are stated at most once per POLL_INTERVAL."""
+        watcher = configwatch.ConfigWatcher(self.conf, use_inotify=False)
+        with open(self.configfile, "a", encoding="utf-8") as handle:
+            handle.write("# edited\n")
+        with patch.object(configwatch, "POLL_INTERVAL", 1.0), patch.object(
+            configwatch.time, "monotonic", return_value=watcher.last_pass + 0.5
+        ), patch.object(configwatch.statecache, "fingerprint") as mock_fingerprint:
+            self.assertEqual(watcher.poll(), (False, []))
+        mock_fingerprint.assert_not_called()
+        with patch.object(configwatch, "POLL_INTERVAL", 1.0), patch.object(
+            configwatch.time, "monotonic", return_value=watcher.last_pass + 1.5
+        ):
+            self.assertEqual(watcher.poll(), (True, []))
+
+    def test_shell_reload_keeps_logger(self):
+        """Policy reloads keep the session logger and only re-source changed env files."""
+        shell = ShellCmd(
+            self.conf,
+            args=[],
+            stdin=io.StringIO(),
+            stdout=io.StringIO(),
+            stderr=io.StringIO(),
+        )
+        logger = shell.log
+        self._write(self.include_file, f"[{getuser()}]\nallowed : + ['head']\n")
+
+        with patch("lshell.shellcmd.builtincmd.cmd_source") as mock_source:
+            shell.reload_config()
+        mock_source.assert_not_called()
+        self.assertIn("head", shell.conf["allowed"])
+        self.assertIs(shell.log, logger)
+
+        self._write(self.env_file, "export LSHELL_WATCH_TEST=two\n")
+        shell.reload_config()
+        self.assertEqual(os.environ.get("LSHELL_WATCH_TEST"), "two")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -152,6 +152,49 @@ class TestRuntimeExecutionHelpers(unittest.TestCase):
 
         self.assertIn("max_processes", unsupported)
 
+    def test_rlimit_wrapper(self):
+        """max_processes is applied by prlimit when it is available."""
+        limits = containment.RuntimeLimits(max_processes=7)
+        self.assertEqual(containment.rlimit_wrapper(containment.RuntimeLimits()), [])
+        with patch.object(containment, "_PRLIMIT", "/usr/bin/prlimit"):
+            self.assertEqual(
+                containment.rlimit_wrapper(limits),
+                ["/usr/bin/prlimit", "--nproc=7:7", "--"],
+            )
+        with patch.object(containment, "_PRLIMIT", ""):
+            self.assertIsNone(containment.rlimit_wrapper(limits))
+
+    def test_exec_cmd_applies_max_processes_without_preexec_fn(self):
+        """The spawned command runs under RLIMIT_NPROC in a new session."""
+        if containment.rlimit_wrapper(containment.RuntimeLimits(max_processes=1)) is None:
+            self.skipTest("prlimit is not available")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "limit")
+            with patch.object(
+                utils.subprocess, "Popen", wraps=utils.subprocess.Popen
+            ) as mock:
+                ret = utils.exec_cmd(
+                    f"ulimit -u > {output}", conf={"max_processes": 4096}
+                )
+            self.assertEqual(ret, 0)
+            with open(output, encoding="utf-8") as handle:
+                self.assertEqual(handle.read().strip(), "4096")
+        kwargs = mock.call_args.kwargs
+        self.assertNotIn("preexec_fn", kwargs)
+        self.assertTrue(kwargs["start_new_session"])
+
+    def test_exec_cmd_falls_back_to_preexec_fn_without_prlimit(self):
+        """Without prlimit, rlimits are still applied in the child."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "limit")
+            with patch.object(containment, "_PRLIMIT", ""):
+                ret = utils.exec_cmd(
+                    f"ulimit -u > {output}", conf={"max_processes": 4095}
+                )
+            self.assertEqual(ret, 0)
+            with open(output, encoding="utf-8") as handle:
+                self.assertEqual(handle.read().strip(), "4095")
+
 
 if __name__ == "__main__":
     unittest.main()
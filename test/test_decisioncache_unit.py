@@ -0,0 +1,124 @@
+"""Unit tests for the opt-in cache of security decisions."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lshell import audit
+from lshell import builtincmd
+from lshell import decisioncache
+from lshell import sec
+from lshell import utils
+from lshell.checkconfig import CheckConfig
+
+CONFIG = f"{os.path.dirname(os.path.realpath(__file__))}/../etc/lshell.conf"
+
+
+class TestDecisionCache(unittest.TestCase):
+    """Allowed decisions are reused while nothing they depend on changed."""
+
+    def setUp(self):
+        self.conf = CheckConfig(
+            [
+                f"--config={CONFIG}",
+                "--quiet=1",
+                "--allowed=+['echo', 'true']",
+                "--strict=0",
+                "--decision_cache=2",
+            ]
+        ).returnconf()
+        self.shell_context = MagicMock()
+        self.shell_context.conf = self.conf
+
+    def _run(self, line):
+        with patch("lshell.utils.exec_cmd", return_value=0):
+            return utils.cmd_parse_execute(line, shell_context=self.shell_context)
+
+    def test_disabled_by_default(self):
+        """Without decision_cache there is no cache."""
+        conf = CheckConfig([f"--config={CONFIG}", "--quiet=1"]).returnconf()
+        self.assertEqual(conf["decision_cache"], 0)
+        self.assertIsNone(decisioncache.for_conf(conf))
+
+    def test_repeated_line_skips_checks(self):
+        """The second identical line is not checked."""
+        with patch.object(sec, "check_secure", wraps=sec.check_secure) as mock:
+            self.assertEqual(self._run("echo hello"), 0)
+            self.assertEqual(self._run("echo hello"), 0)
+        self.assertEqual(mock.call_count, 1)
+        stats = decisioncache.stats(self.conf)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_denials_are_not_cached(self):
+        """A forbidden line is checked, and reported, every time."""
+        with patch.object(sec, "check_secure", wraps=sec.check_secure) as mock:
+            self.assertEqual(self._run("id"), 126)
+            self.assertEqual(self._run("id"), 126)
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(decisioncache.stats(self.conf)["entries"], 0)
+
+    def test_lines_are_keyed_exactly(self):
+        """A line only differing by spacing or control characters from an
+        allowed one is checked, and denied, on its own.
+        """
+        with patch.object(sec, "check_secure", wraps=sec.check_secure) as mock:
+            self.assertEqual(self._run("ls -l"), 0)
+            self.assertNotEqual(self._run("ls\t-l"), 0)
+            self.assertNotEqual(self._run("ls\r -l"), 0)
+            self.assertEqual(self._run("ls  -l"), 0)
+        self.assertEqual(mock.call_count, 4)
+
+    def test_filesystem_dependent_lines_are_not_cached(self):
+        """Path operands, quotes and substitutions are always checked."""
+        cache = decisioncache.for_conf(self.conf)
+        for line in ["echo /tmp", "echo 'x'", "echo $(true)", "cd tmp", "echo a\\ b"]:
+            self.assertIsNone(cache.key(line, self.conf), line)
+        self.assertIsNotNone(cache.key("echo hello", self.conf))
+
+    def test_lru_bound(self):
+        """The least recently used line is dropped first."""
+        cache = decisioncache.for_conf(self.conf)
+        keys = [cache.key(f"echo {word}", self.conf) for word in ["a", "b", "c"]]
+        cache.add(keys[0])
+        cache.add(keys[1])
+        self.assertTrue(cache.allows(keys[0]))
+        cache.add(keys[2])
+        self.assertTrue(cache.allows(keys[0]))
+        self.assertFalse(cache.allows(keys[1]))
+
+    def test_policy_change_invalidates(self):
+        """Changing the allowed list forgets every decision."""
+        self._run("echo hello")
+        self.conf["allowed"] = [item for item in self.conf["allowed"] if item != "echo"]
+        with patch.object(sec, "check_secure", wraps=sec.check_secure) as mock:
+            self.assertEqual(self._run("echo hello"), 126)
+        self.assertEqual(mock.call_count, 1)
+
+    def test_cd_invalidates(self):
+        """Changing directory forgets every decision."""
+        self._run("echo hello")
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                builtincmd.cmd_cd(tmpdir, self.conf)
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(decisioncache.stats(self.conf)["entries"], 0)
+
+    def test_stats_in_audit_events(self):
+        """Command events report the cache statistics."""
+        logger = MagicMock()
+        conf = {"security_audit_json": 1, "logpath": logger}
+        audit.log_command_event(conf, "echo", allowed=True, reason="allowed")
+        self.assertNotIn("lshell_decision_cache", logger.log.call_args.kwargs["extra"])
+        conf[decisioncache.CACHE_KEY] = decisioncache.DecisionCache(4)
+        audit.log_command_event(conf, "echo", allowed=True, reason="allowed")
+        self.assertEqual(
+            logger.log.call_args.kwargs["extra"]["lshell_decision_cache"]["hits"], 0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Direct execution of simple commands, and its per-command latency."""
+
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import containment
+from lshell import utils
+
+# typical speedup is 1.8x (one process instead of bash and the command);
+# keep headroom for noisy runners
+MIN_SPEEDUP = 1.2
+# typical speedup is 1.5x, despite the extra exec of prlimit. Timings depend
+# on the machine, so speedups are only checked when LSHELL_BENCHMARKS=1.
+MIN_SPEEDUP_SPAWN = 1.1
+RUNS = 20
+
+
+def _latency(command, runs=RUNS, conf=None):
+    """Return the mean latency of exec_cmd(command), best of three."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(runs):
+            utils.exec_cmd(command, conf=conf)
+        elapsed = (time.perf_counter() - start) / runs
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class TestDirectExecArgs(unittest.TestCase):
+    """Only commands without shell syntax skip bash."""
+
+    def test_simple_commands_are_direct(self):
+        """Words, quotes and absolute paths are resolved directly."""
+        env = dict(os.environ)
+        path, argv = utils._direct_exec_args("sleep  '0'", env)
+        self.assertTrue(os.path.isabs(path))
+        self.assertEqual(argv, ["sleep", "0"])
+        self.assertEqual(
+            utils._direct_exec_args(f"{path} 0", env), (path, [path, "0"])
+        )
+
+    def test_shell_lines_need_bash(self):
+        """Anything bash would interpret is left to bash."""
+        env = dict(os.environ)
+        for command in [
+            "ls *.py",
+            "ls ~",
+            "ls $HOME",
+            "ls > out",
+            "ls | wc",
+            "ls && ls",
+            "ls a\\ b",
+            "A=1 ls",
+            "echo hi",
+            "time ls",
+            "lshell-no-such-command",
+            "ls # comment",
+        ]:
+            self.assertIsNone(utils._direct_exec_args(command, env), command)
+
+
+class TestDirectExecErrors(unittest.TestCase):
+    """Files that cannot be executed directly behave as they do in bash."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-exec-")
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def _script(self, content):
+        path = os.path.join(self.tmpdir, "script")
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_script_without_shebang_runs_in_bash(self):
+        """ENOEXEC falls back to bash, which runs the file as a script."""
+        path = self._script("exit 3\n")
+        self.assertEqual(utils._direct_exec_args(path, dict(os.environ))[0], path)
+        self.assertEqual(utils.exec_cmd(path), 3)
+
+    def test_script_without_shebang_runs_in_bash_under_prlimit(self):
+        """The rlimit wrapper would run the script with /bin/sh."""
+        conf = {"max_processes": 4096}
+        if not containment.rlimit_wrapper(containment.get_runtime_limits(conf)):
+            self.skipTest("prlimit is not available")
+        script = self._script("exit ${BASH_VERSION:+3}\n")
+        self.assertEqual(utils.exec_cmd(script, conf=conf), 3)
+        binary = shutil.which("true")
+        with patch.object(utils.subprocess, "Popen", wraps=utils.subprocess.Popen) as mock:
+            self.assertEqual(utils.exec_cmd(binary, conf=conf), 0)
+        self.assertNotIn("bash", mock.call_args.args[0])
+
+    def test_exec_errors_map_to_bash_statuses(self):
+        """Errors are reported by lshell with the status bash would use."""
+        path = self._script("#!/bin/sh\n")
+        for error, status in (
+            (PermissionError(errno.EACCES, "Permission denied", path), 126),
+            (FileNotFoundError(errno.ENOENT, "No such file or directory", path), 127),
+        ):
+            with patch.object(
+                utils.subprocess, "Popen", side_effect=error
+            ), patch("sys.stderr") as stderr:
+                self.assertEqual(utils.exec_cmd(path), status)
+            stderr.write.assert_called_once_with(
+                f"lshell: {path}: {error.strerror}\n"
+            )
+
+
+class TestExecLatency(unittest.TestCase):
+    """Simple commands start faster without bash."""
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_direct_exec_is_faster(self):
+        """Per-command latency of the direct and bash paths."""
+        direct = _latency("sleep 0")
+        with patch.object(utils, "_direct_exec_args", return_value=None):
+            bash = _latency("sleep 0")
+        self.assertGreaterEqual(
+            bash / direct,
+            MIN_SPEEDUP,
+            f"direct {direct * 1000:.2f}ms vs bash -c {bash * 1000:.2f}ms per command",
+        )
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_spawn_without_preexec_fn_is_faster(self):
+        """Per-command latency with rlimits set by prlimit or by preexec_fn."""
+        conf = {"max_processes": 4096}
+        if containment.rlimit_wrapper(containment.get_runtime_limits(conf)) is None:
+            self.skipTest("prlimit is not available")
+        wrapped = _latency("sleep 0", conf=conf)
+        with patch.object(containment, "_PRLIMIT", ""):
+            preexec = _latency("sleep 0", conf=conf)
+        self.assertGreaterEqual(
+            preexec / wrapped,
+            MIN_SPEEDUP_SPAWN,
+            f"prlimit {wrapped * 1000:.2f}ms vs preexec_fn {preexec * 1000:.2f}ms "
+            "per command",
+        )
+
+    def test_direct_exec_keeps_environment_and_status(self):
+        """The command gets the same environment, and its exit status."""
+        with patch.object(utils.subprocess, "Popen", wraps=utils.subprocess.Popen) as mock:
+            self.assertEqual(
+                utils.exec_cmd("sleep 0", extra_env={"LSHELL_TEST": "1"}), 0
+            )
+        args, kwargs = mock.call_args
+        self.assertEqual(args[0], ["sleep", "0"])
+        self.assertTrue(os.path.isabs(kwargs["executable"]))
+        self.assertEqual(kwargs["env"]["LSHELL_TEST"], "1")
+        self.assertTrue(kwargs["start_new_session"])
+        self.assertNotIn("preexec_fn", kwargs)
+        self.assertEqual(utils.exec_cmd("sleep --lshell-invalid-option"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Unit tests for the cached PATH resolution of executables."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lshell import executables
+from lshell import utils
+
+
+class TestExecutableCache(unittest.TestCase):
+    """Resolutions are reused until a PATH directory changes."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.first = os.path.join(self.tempdir.name, "first")
+        self.second = os.path.join(self.tempdir.name, "second")
+        os.mkdir(self.first)
+        os.mkdir(self.second)
+        self.path = os.pathsep.join([self.first, self.second])
+        self.cache = executables.ExecutableCache()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _install(self, directory, name="tool"):
+        target = os.path.join(directory, name)
+        with open(target, "w", encoding="utf-8") as handle:
+            handle.write("#!/bin/sh\n")
+        os.chmod(target, 0o755)
+        return target
+
+    def test_resolution_is_reused(self):
+        """The same name and PATH are searched once."""
+        target = self._install(self.second)
+        with patch.object(
+            executables.shutil, "which", side_effect=shutil.which
+        ) as mock:
+            self.assertEqual(self.cache.which("tool", self.path), target)
+            self.assertEqual(self.cache.which("tool", self.path), target)
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_changed_directory_is_searched_again(self):
+        """Adding or removing executables invalidates the resolution."""
+        self.assertIsNone(self.cache.which("tool", self.path))
+        late = self._install(self.second)
+        self.assertEqual(self.cache.which("tool", self.path), late)
+        early = self._install(self.first)
+        self.assertEqual(self.cache.which("tool", self.path), early)
+        os.unlink(early)
+        self.assertEqual(self.cache.which("tool", self.path), late)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_mode_change_is_searched_again(self):
+        """chmod leaves the directories unchanged, but not the resolution."""
+        early = self._install(self.first)
+        late = self._install(self.second)
+        self.assertEqual(self.cache.which("tool", self.path), early)
+        os.chmod(early, 0o644)
+        self.assertEqual(self.cache.which("tool", self.path), late)
+        os.chmod(early, 0o755)
+        self.assertEqual(self.cache.which("tool", self.path), early)
+        os.chmod(late, 0o644)
+        os.chmod(early, 0o644)
+        self.assertIsNone(self.cache.which("tool", self.path))
+        os.chmod(late, 0o755)
+        self.assertEqual(self.cache.which("tool", self.path), late)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_path_is_part_of_the_key(self):
+        """Another PATH value is resolved on its own."""
+        target = self._install(self.first)
+        self.assertEqual(self.cache.which("tool", self.path), target)
+        self.assertIsNone(self.cache.which("tool", self.second))
+
+    def test_matches_shutil_which(self):
+        """Lookups agree with shutil.which on the real PATH."""
+        for name in ["sh", "ls", "env", "lshell-no-such-command"]:
+            with self.subTest(name=name):
+                expected = shutil.which(name)
+                self.assertEqual(
+                    executables.which(name),
+                    os.path.abspath(expected) if expected else None,
+                )
+
+    def test_command_exists_uses_the_session_cache(self):
+        """_command_exists resolves names through the session cache."""
+        self._install(self.first)
+        with patch.dict(os.environ, {"PATH": self.path}):
+            hits = executables.session_cache().hits
+            self.assertTrue(utils._command_exists("tool"))
+            self.assertTrue(utils._command_exists("tool"))
+            self.assertFalse(utils._command_exists("missing-tool"))
+        self.assertEqual(executables.session_cache().hits, hits + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Unit tests for the compiled forbidden character matcher."""
+
+import itertools
+import re
+import unittest
+
+from lshell import forbidden
+from lshell import sec
+
+
+def _legacy_standalone(line, entries):
+    """Reference implementation of check_forbidden_chars."""
+    for item in entries:
+        if item in ["&", "|"]:
+            escaped_item = re.escape(item)
+            if re.search(rf"(?<!{escaped_item}){escaped_item}(?!{escaped_item})", line):
+                return item
+        elif item in line:
+            return item
+    return None
+
+
+def _legacy_enclosed(line, entries):
+    """Reference implementation of the check_secure loop."""
+    for item in entries:
+        if item in ["&", "|"]:
+            if re.findall(rf"[^\{item}]\{item}[^\{item}]", line):
+                return item
+        elif item in line:
+            return item
+    return None
+
+
+ENTRIES = [";", "&", "|", "`", ">", "<", "$(", "${", "(", "$"]
+LINES = [
+    "",
+    "ls",
+    "ls & ",
+    "&ls",
+    "ls&",
+    "ls && pwd",
+    "ls &&& pwd",
+    "ls || pwd",
+    "ls | grep x",
+    "ls|",
+    "echo $(id)",
+    "echo ${HOME}",
+    "echo $HOME; ls",
+    "a > b < c",
+    "echo `id` && ls | x",
+    "&&|&",
+]
+
+
+class TestForbiddenMatcher(unittest.TestCase):
+    """The matcher reports the same entry as the per-entry loops."""
+
+    def test_matches_legacy_loops(self):
+        """Every ordering of a sample of entries agrees on every line."""
+        for count in range(4):
+            for entries in itertools.permutations(ENTRIES[:6] + ["$("], count):
+                matcher = forbidden.ForbiddenMatcher(list(entries))
+                for line in LINES:
+                    self.assertEqual(
+                        matcher.first(line),
+                        _legacy_standalone(line, entries),
+                        (entries, line),
+                    )
+                    self.assertEqual(
+                        matcher.first_enclosed(line),
+                        _legacy_enclosed(line, entries),
+                        (entries, line),
+                    )
+
+    def test_first_entry_of_the_list_wins(self):
+        """The reported entry follows list order, not line order."""
+        matcher = forbidden.ForbiddenMatcher(ENTRIES)
+        self.assertEqual(matcher.first("echo $(id); ls"), ";")
+        self.assertEqual(matcher.first("echo ${HOME}"), "${")
+
+    def test_empty_list(self):
+        """Nothing is forbidden without entries."""
+        matcher = forbidden.ForbiddenMatcher([])
+        self.assertIsNone(matcher.first("ls; id & x"))
+        self.assertIsNone(matcher.first_enclosed("ls; id & x"))
+
+
+class TestConfMatcher(unittest.TestCase):
+    """The matcher of a conf is compiled again when its list changes."""
+
+    def test_stale_matcher_is_recompiled(self):
+        """Removing ';' from the list (WinSCP) allows it."""
+        conf = {"forbidden": [";", "&"]}
+        matcher = forbidden.for_conf(conf)
+        self.assertIs(forbidden.for_conf(conf), matcher)
+        self.assertEqual(forbidden.for_conf(conf).first("ls; id"), ";")
+        conf["forbidden"].remove(";")
+        self.assertIsNone(forbidden.for_conf(conf).first("ls; id"))
+        conf["forbidden"] = ["|"]
+        self.assertEqual(forbidden.for_conf(conf).first("ls | id"), "|")
+
+    def test_control_chars(self):
+        """Control characters are found anywhere in the line."""
+        self.assertTrue(sec.CONTROL_CHARS.search("ls\x07"))
+        self.assertFalse(sec.CONTROL_CHARS.search("ls -l"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""Unit tests for the per-command filesystem memo."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lshell import fsmemo
+from lshell import sec
+from lshell import utils
+from lshell.checkconfig import CheckConfig
+
+CONFIG = f"{os.path.dirname(os.path.realpath(__file__))}/../etc/lshell.conf"
+
+
+class TestFSMemo(unittest.TestCase):
+    """Lookups are memoized inside a scope only."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_lookups_are_memoized_in_scope(self):
+        """A path is resolved and stat'ed once per scope."""
+        with patch.object(fsmemo.os, "stat", side_effect=os.stat) as mock:
+            with fsmemo.scope() as memo:
+                self.assertTrue(fsmemo.isdir(self.root))
+                self.assertTrue(fsmemo.exists(self.root))
+                self.assertFalse(fsmemo.exists(self.root + "/missing"))
+                self.assertFalse(fsmemo.isdir(self.root + "/missing"))
+                self.assertEqual(fsmemo.realpath(self.root), self.root)
+                self.assertEqual(fsmemo.realpath(self.root), self.root)
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual((memo.calls, memo.saved), (3, 3))
+
+    def test_no_memo_outside_scope(self):
+        """Without a scope every lookup reaches the filesystem."""
+        with patch.object(fsmemo.os, "stat", side_effect=os.stat) as mock:
+            fsmemo.isdir(self.root)
+            fsmemo.isdir(self.root)
+        self.assertEqual(mock.call_count, 2)
+
+    def test_reset_and_chdir_forget_lookups(self):
+        """Changes between commands or directories are seen."""
+        target = os.path.join(self.root, "target")
+        cwd = os.getcwd()
+        with fsmemo.scope():
+            self.assertFalse(fsmemo.isdir(target))
+            os.mkdir(target)
+            self.assertFalse(fsmemo.isdir(target))
+            fsmemo.reset()
+            self.assertTrue(fsmemo.isdir(target))
+            try:
+                fsmemo.chdir(self.root)
+                self.assertEqual(fsmemo.realpath("target"), target)
+                fsmemo.chdir(target)
+                self.assertEqual(fsmemo.realpath("target"), target + "/target")
+            finally:
+                os.chdir(cwd)
+
+
+class TestCommandScope(unittest.TestCase):
+    """The security checks of one command share a memo."""
+
+    def test_checks_share_lookups(self):
+        """check_secure and check_path resolve a quoted path once."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            conf = CheckConfig(
+                [f"--config={CONFIG}", "--quiet=1", f"--path=['{tmpdir}']", "--strict=0"]
+            ).returnconf()
+            line = f'ls "{tmpdir}"'
+            with fsmemo.scope() as memo:
+                self.assertEqual(sec.check_secure(line, conf)[0], 0)
+                self.assertEqual(sec.check_path(line, conf)[0], 0)
+            self.assertGreater(memo.saved, 0)
+
+    @patch("lshell.utils.exec_cmd", return_value=0)
+    def test_memo_is_reset_between_commands(self, _mock_exec):
+        """Each command of a sequence starts with an empty memo."""
+        shell_context = MagicMock()
+        shell_context.conf = CheckConfig(
+            [f"--config={CONFIG}", "--quiet=1", "--allowed=+['true']", "--strict=0"]
+        ).returnconf()
+        calls, _saved = fsmemo.totals()
+        with patch.object(fsmemo, "reset", wraps=fsmemo.reset) as mock:
+            utils.cmd_parse_execute("true && true", shell_context=shell_context)
+        self.assertEqual(mock.call_count, 2)
+        self.assertIsNone(fsmemo._ACTIVE)
+        self.assertGreater(fsmemo.totals()[0], calls)
+
+    def test_totals_are_logged(self):
+        """The lookups saved in the session are logged at debug level."""
+        log = MagicMock()
+        with patch.object(fsmemo, "_TOTALS", [5, 3]):
+            fsmemo.log_totals(log)
+        log.debug.assert_called_once_with(
+            "lshell: fsmemo: 3 filesystem lookups saved, 5 done"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+"""Unit tests for the cached group database lookups."""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lshell import groupcache
+from lshell import statecache
+from lshell.checkconfig import CheckConfig
+
+
+class TestGroupCache(unittest.TestCase):
+    """Group lookups are answered from disk within the TTL."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-groupcache-")
+        self.env = patch.dict(
+            os.environ, {statecache.STATE_DIR_ENV: os.path.join(self.tmpdir, "state")}
+        )
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_disabled_cache_always_queries(self):
+        """Without a TTL every lookup goes to NSS and nothing is stored."""
+        cache = groupcache.GroupCache(0)
+        with patch.object(groupcache, "query_group_name", return_value="ops") as query:
+            self.assertEqual(cache.group_name(1000), "ops")
+            self.assertEqual(cache.group_name(1000), "ops")
+        cache.flush()
+        self.assertEqual(query.call_count, 2)
+        self.assertIsNone(statecache.load(groupcache.CACHE_NAMESPACE, "nss", system=True))
+
+    def test_miss_is_stored_and_reused(self):
+        """A miss queries NSS once; later logins are served from disk."""
+        cache = groupcache.GroupCache(300)
+        with patch.object(
+            groupcache, "query_user_groups", return_value=["users", "ops"]
+        ) as query:
+            self.assertEqual(cache.user_groups("alice"), ["users", "ops"])
+            cache.flush()
+            warm = groupcache.GroupCache(300)
+            self.assertEqual(warm.user_groups("alice"), ["users", "ops"])
+        query.assert_called_once_with("alice")
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual((warm.hits, warm.misses), (1, 0))
+
+    def test_unknown_gid_is_cached(self):
+        """Gids without a group entry are remembered as such."""
+        cache = groupcache.GroupCache(300)
+        with patch.object(groupcache, "query_group_name", return_value=None) as query:
+            self.assertIsNone(cache.group_name(4242))
+            self.assertIsNone(cache.group_name(4242))
+        query.assert_called_once_with(4242)
+
+    def test_expired_entry_is_refreshed(self):
+        """An expired entry is replaced when NSS answers promptly."""
+        cache = groupcache.GroupCache(300)
+        with patch.object(groupcache, "query_group_name", return_value="old"):
+            cache.group_name(1000)
+        cache._entries["gid"]["1000"][1] -= 600
+        with patch.object(groupcache, "query_group_name", return_value="new"):
+            self.assertEqual(cache.group_name(1000), "new")
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_slow_nss_falls_back_to_expired_entry(self):
+        """A slow refresh does not delay the login, it completes later."""
+        cache = groupcache.GroupCache(300)
+        with patch.object(groupcache, "query_group_name", return_value="old"):
+            cache.group_name(1000)
+        cache._entries["gid"]["1000"][1] -= 600
+        cache.flush()
+
+        release = threading.Event()
+
+        def slow_query(_gid):
+            release.wait(5)
+            return "new"
+
+        with patch.object(groupcache, "query_group_name", side_effect=slow_query):
+            start = time.monotonic()
+            self.assertEqual(cache.group_name(1000), "old")
+            self.assertLess(time.monotonic() - start, 1)
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == "lshell-nss-refresh":
+                    thread.join(5)
+
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        stored = statecache.load(groupcache.CACHE_NAMESPACE, "nss", system=True)
+        self.assertEqual(stored["gid"]["1000"][0], "new")
+
+    def test_mapping_not_written_by_root_is_ignored(self):
+        """A user cannot map their gid to the name of another group."""
+        statecache.store(
+            groupcache.CACHE_NAMESPACE,
+            "nss",
+            {"gid": {"1000": ["wheel", time.time()]}, "user": {}},
+            system=True,
+        )
+        directory = statecache._cache_dir(
+            groupcache.CACHE_NAMESPACE, shared=False, system=True
+        )
+        for name in os.listdir(directory):
+            os.chown(os.path.join(directory, name), 65534, -1)
+        with patch.object(groupcache, "query_group_name", return_value="users"):
+            self.assertEqual(groupcache.GroupCache(300).group_name(1000), "users")
+
+    def test_users_keep_lookups_in_memory(self):
+        """Sessions of other users do not write the cache."""
+        cache = groupcache.GroupCache(300)
+        with patch("lshell.statecache.os.geteuid", return_value=65534), patch.object(
+            groupcache, "query_group_name", return_value="users"
+        ) as query:
+            self.assertEqual(cache.group_name(1000), "users")
+            self.assertEqual(cache.group_name(1000), "users")
+            cache.flush()
+        query.assert_called_once_with(1000)
+        self.assertIsNone(
+            statecache.load(groupcache.CACHE_NAMESPACE, "nss", system=True)
+        )
+
+    def test_group_cache_command_fills_the_cache(self):
+        """`lshell group-cache` stores the lookups sessions then use."""
+        with patch.object(
+            groupcache, "query_user_groups", return_value=["users", "ops"]
+        ), patch(
+            "lshell.groupcache.grp.getgrnam",
+            side_effect=lambda name: MagicMock(gr_gid={"users": 100, "ops": 500}[name]),
+        ), patch("sys.stdout", new_callable=io.StringIO):
+            self.assertEqual(groupcache.main(["alice"]), 0)
+
+        cache = groupcache.GroupCache(300)
+        with patch.object(groupcache, "query_user_groups") as query_user, patch.object(
+            groupcache, "query_group_name"
+        ) as query_group:
+            self.assertEqual(cache.user_groups("alice"), ["users", "ops"])
+            self.assertEqual(cache.group_name(500), "ops")
+        query_user.assert_not_called()
+        query_group.assert_not_called()
+
+    def test_group_cache_command_requires_root(self):
+        """Other users cannot fill the cache."""
+        with patch("lshell.groupcache.os.geteuid", return_value=65534), patch(
+            "sys.stderr", new_callable=io.StringIO
+        ) as stderr:
+            self.assertEqual(groupcache.main(["alice"]), 1)
+        self.assertIn("must be run as root", stderr.getvalue())
+        self.assertIsNone(
+            statecache.load(groupcache.CACHE_NAMESPACE, "nss", system=True)
+        )
+
+    def test_entries_are_bounded(self):
+        """Only the most recent MAX_ENTRIES lookups are kept."""
+        cache = groupcache.GroupCache(300)
+        with patch.object(groupcache, "MAX_ENTRIES", 3), patch.object(
+            groupcache, "query_group_name", side_effect=str
+        ), patch.object(groupcache.time, "time", side_effect=range(100, 200)):
+            for gid in range(5):
+                cache.group_name(gid)
+        self.assertEqual(sorted(cache._entries["gid"]), ["2", "3", "4"])
+
+    @patch("lshell.groupcache.grp.getgrall")
+    @patch("lshell.groupcache.grp.getgrgid")
+    @patch("lshell.groupcache.pwd.getpwnam")
+    def test_query_user_groups(self, mock_getpwnam, mock_getgrgid, mock_getgrall):
+        """The primary group comes first, supplementary groups follow."""
+        mock_getpwnam.return_value.pw_gid = 100
+        mock_getgrgid.return_value.gr_name = "users"
+        ops = type("Group", (), {"gr_name": "ops", "gr_mem": ["alice"]})
+        dev = type("Group", (), {"gr_name": "dev", "gr_mem": ["bob"]})
+        mock_getgrall.return_value = [ops, dev]
+        self.assertEqual(groupcache.query_user_groups("alice"), ["users", "ops"])
+
+
+class TestCheckConfigGroupCache(unittest.TestCase):
+    """Logins resolve [grp:*] sections through the group cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-groupcache-")
+        self.configfile = os.path.join(self.tmpdir, "lshell.conf")
+        with open(self.configfile, "w", encoding="utf-8") as handle:
+            handle.write(
+                "[global]\n"
+                f"logpath         : {self.tmpdir}\n"
+                "logfilename     : groupcache\n"
+                "loglevel        : 4\n"
+                "group_cache_ttl : 300\n"
+                "\n"
+                "[default]\n"
+                "allowed         : ['ls']\n"
+                "forbidden       : [';']\n"
+                "warning_counter : 2\n"
+            )
+        self.env = patch.dict(
+            os.environ, {statecache.STATE_DIR_ENV: os.path.join(self.tmpdir, "state")}
+        )
+        self.env.start()
+        self.cwd = os.getcwd()
+        self.args = [f"--config={self.configfile}", "--quiet=1"]
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.env.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_hits_and_misses_are_logged(self):
+        """The second login is answered from the cache."""
+        CheckConfig(self.args)
+        with patch.object(groupcache, "query_group_name") as query:
+            CheckConfig(self.args)
+        query.assert_not_called()
+
+        with open(
+            os.path.join(self.tmpdir, "groupcache.log"), encoding="utf-8"
+        ) as handle:
+            log = handle.read()
+        groups = len(os.getgroups())
+        self.assertIn(f"group cache: 0 hits, {groups} misses", log)
+        self.assertIn(f"group cache: {groups} hits, 0 misses", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -45,17 +45,17 @@ class TestHistorySizeUnit(unittest.TestCase):
         )
         shell.cmdqueue = ["exit"]
 
-        with patch("lshell.shellcmd.readline.read_history_file") as mock_read:
-            with patch("lshell.shellcmd.readline.set_history_length") as mock_len:
+        with patch("readline.read_history_file") as mock_read:
+            with patch("readline.set_history_length") as mock_len:
                 with patch(
-                    "lshell.shellcmd.readline.get_completer_delims",
+                    "readline.get_completer_delims",
                     return_value=" \t\n",
                 ):
-                    with patch("lshell.shellcmd.readline.set_completer_delims"):
-                        with patch("lshell.shellcmd.readline.get_completer", return_value=None):
-                            with patch("lshell.shellcmd.readline.set_completer"):
-                                with patch("lshell.shellcmd.readline.parse_and_bind"):
-                                    with patch("lshell.shellcmd.readline.write_history_file"):
+                    with patch("readline.set_completer_delims"):
+                        with patch("readline.get_completer", return_value=None):
+                            with patch("readline.set_completer"):
+                                with patch("readline.parse_and_bind"):
+                                    with patch("readline.write_history_file"):
                                         with patch(
                                             "lshell.shellcmd.sys.exit",
                                             side_effect=SystemExit,
@@ -79,23 +79,23 @@ class TestHistorySizeUnit(unittest.TestCase):
         shell.cmdqueue = ["exit"]
 
         with patch(
-            "lshell.shellcmd.readline.read_history_file",
+            "readline.read_history_file",
             side_effect=[IOError(), None],
         ) as mock_read:
             with patch("lshell.shellcmd.open", mock_open()):
-                with patch("lshell.shellcmd.readline.set_history_length") as mock_len:
+                with patch("readline.set_history_length") as mock_len:
                     with patch(
-                        "lshell.shellcmd.readline.get_completer_delims",
+                        "readline.get_completer_delims",
                         return_value=" \t\n",
                     ):
-                        with patch("lshell.shellcmd.readline.set_completer_delims"):
+                        with patch("readline.set_completer_delims"):
                             with patch(
-                                "lshell.shellcmd.readline.get_completer",
+                                "readline.get_completer",
                                 return_value=None,
                             ):
-                                with patch("lshell.shellcmd.readline.set_completer"):
-                                    with patch("lshell.shellcmd.readline.parse_and_bind"):
-                                        with patch("lshell.shellcmd.readline.write_history_file"):
+                                with patch("readline.set_completer"):
+                                    with patch("readline.parse_and_bind"):
+                                        with patch("readline.write_history_file"):
                                             with patch(
                                                 "lshell.shellcmd.sys.exit",
                                                 side_effect=SystemExit,
@@ -0,0 +1,111 @@
+"""Import-time budget for the lshell CLI entry points (python -X importtime)."""
+
+import os
+import subprocess
+import sys
+import unittest
+
+TOPDIR = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Budgets are in microseconds of cumulative lshell.* import time, measured
+# with `python -X importtime`, with roughly 2.5x headroom over a typical run.
+# Timings depend on the machine, so budgets are only checked when
+# LSHELL_IMPORT_BUDGET=1; slow runners can scale them with
+# LSHELL_IMPORT_BUDGET_SCALE.
+IMPORT_BUDGET_US = {
+    "cli": 25000,
+    "shell": 55000,
+}
+
+# modules that must not be loaded by an entry point
+SUBCOMMAND_MODULES = {"lshell.policy", "lshell.systemsetup", "lshell.hardeninit"}
+SHELL_MODULES = {"lshell.checkconfig", "lshell.shellcmd"}
+
+# what each entry point of lshell.cli.main() imports on top of lshell.cli
+ENTRY_POINTS = {
+    "cli": "import lshell.cli",
+    "shell": (
+        "import lshell.cli; import lshell.containment; "
+        "import lshell.checkconfig; import lshell.shellcmd"
+    ),
+    "policy-show": "import lshell.cli; import lshell.policy",
+    "harden-init": "import lshell.cli; import lshell.hardeninit",
+    "setup-system": "import lshell.cli; import lshell.systemsetup",
+}
+
+
+def _measure(code):
+    """Return ({module: cumulative_us}, lshell_cumulative_us) for code."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = TOPDIR
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=TOPDIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    lshell_total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        modules[name.strip()] = int(cumulative)
+        # top-level entries (no nesting indent) starting an lshell import
+        if name.startswith(" lshell"):
+            lshell_total += int(cumulative)
+    return modules, lshell_total
+
+
+class TestImportBudget(unittest.TestCase):
+    """Each entry point imports only what it needs, within its budget."""
+
+    def test_cli_import_is_minimal(self):
+        """Importing lshell.cli loads neither the shell nor subcommands."""
+        modules, _ = _measure(ENTRY_POINTS["cli"])
+        self.assertFalse((SUBCOMMAND_MODULES | SHELL_MODULES) & set(modules))
+
+    def test_shell_entry_point_skips_subcommands(self):
+        """Interactive and SSH sessions do not load subcommand modules."""
+        modules, _ = _measure(ENTRY_POINTS["shell"])
+        self.assertTrue(SHELL_MODULES <= set(modules))
+        self.assertFalse(SUBCOMMAND_MODULES & set(modules))
+        self.assertNotIn("argparse", modules)
+        self.assertNotIn("logging.handlers", modules)
+
+    def test_shell_entry_point_skips_readline(self):
+        """Commands run over SSH (-c) do not load readline."""
+        modules, _ = _measure(ENTRY_POINTS["shell"])
+        self.assertNotIn("readline", modules)
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_IMPORT_BUDGET") == "1", "set LSHELL_IMPORT_BUDGET=1"
+    )
+    def test_import_time_budgets(self):
+        """Best of three runs of each entry point is within its budget."""
+        scale = float(os.environ.get("LSHELL_IMPORT_BUDGET_SCALE", "1"))
+        for entry_point, budget in IMPORT_BUDGET_US.items():
+            with self.subTest(entry_point=entry_point):
+                best = min(_measure(ENTRY_POINTS[entry_point])[1] for _ in range(3))
+                self.assertLessEqual(best, budget * scale)
+
+    def test_subcommands_skip_shell(self):
+        """Subcommands do not load the shell or each other."""
+        for entry_point, module in (
+            ("policy-show", "lshell.policy"),
+            ("harden-init", "lshell.hardeninit"),
+            ("setup-system", "lshell.systemsetup"),
+        ):
+            with self.subTest(entry_point=entry_point):
+                modules, _ = _measure(ENTRY_POINTS[entry_point])
+                self.assertIn(module, modules)
+                self.assertFalse(SHELL_MODULES & set(modules))
+                self.assertFalse((SUBCOMMAND_MODULES - {module}) & set(modules))
+
+
+if __name__ == "__main__":
+    unittest.main()
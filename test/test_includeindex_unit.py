@@ -0,0 +1,166 @@
+"""Unit tests for the include_dir section index."""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from getpass import getuser
+from unittest.mock import patch
+
+from lshell import includeindex
+from lshell import policy
+from lshell.checkconfig import CheckConfig
+
+
+class TestIncludeIndex(unittest.TestCase):
+    """Logins read only the indexed sections of the user's precedence chain."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-includeindex-")
+        self.include_dir = os.path.join(self.tmpdir, "lshell.d")
+        os.mkdir(self.include_dir)
+        self.configfile = os.path.join(self.tmpdir, "lshell.conf")
+        self._write(
+            self.configfile,
+            "[global]\n"
+            f"logpath         : {self.tmpdir}\n"
+            "loglevel        : 0\n"
+            f"include_dir     : {self.include_dir}/\n"
+            "\n"
+            "[default]\n"
+            "allowed         : ['ls']\n"
+            "forbidden       : [';', '&', '|']\n"
+            "warning_counter : 2\n"
+            "strict          : 0\n",
+        )
+        self.user_file = os.path.join(self.include_dir, "user.conf")
+        self._write(
+            self.user_file,
+            "# generated\n"
+            "[someone-else]\n"
+            "allowed : + ['rm']\n"
+            "\n"
+            f"[{getuser()}]\n"
+            "allowed : + ['cat']\n"
+            "  # indented comment\n"
+            "\n"
+            "[grp:nobody-group]\n"
+            "allowed : + ['dd']\n",
+        )
+        self.other_file = os.path.join(self.include_dir, "other.conf")
+        self._write(self.other_file, "[another-user]\nallowed : + ['vi']\n")
+        self.cwd = os.getcwd()
+        self.environ = patch.dict(os.environ, {})
+        self.environ.start()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.environ.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+
+    def _conf(self):
+        return CheckConfig([f"--config={self.configfile}", "--quiet=1"]).returnconf()
+
+    def test_sections_map_to_byte_ranges(self):
+        """Each section block starts at its header and ends at the next one."""
+        index = includeindex.build_index(f"{self.include_dir}/")
+        with open(self.user_file, "rb") as handle:
+            content = handle.read()
+        files = [path for path, _ in index["files"]]
+        position, offset, length = index["sections"][getuser()][0]
+        self.assertEqual(files[position], self.user_file)
+        block = content[offset : offset + length].decode()
+        self.assertTrue(block.startswith(f"[{getuser()}]\n"))
+        self.assertIn("# indented comment", block)
+        self.assertNotIn("grp:", block)
+        self.assertIn("another-user", index["sections"])
+
+    def test_login_reads_only_user_sections(self):
+        """With a current index, unrelated files are not read at login."""
+        includeindex.write_index(f"{self.include_dir}/")
+        opened = []
+        real_open = open
+
+        def tracking_open(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+
+        with patch("builtins.open", side_effect=tracking_open):
+            conf = self._conf()
+        self.assertIn("cat", conf["allowed"])
+        self.assertNotIn("rm", conf["allowed"])
+        self.assertIn(self.user_file, opened)
+        self.assertNotIn(self.other_file, opened)
+
+    def test_indexed_result_matches_full_parse(self):
+        """Reading indexed sections gives the same policy as reading every file."""
+        expected = self._conf()
+        includeindex.write_index(f"{self.include_dir}/")
+        conf = self._conf()
+        for key in ("allowed", "forbidden", "warning_counter", "strict"):
+            self.assertEqual(conf[key], expected[key])
+
+    def test_stale_index_falls_back(self):
+        """Modified include files make the index stale until it is rebuilt."""
+        includeindex.write_index(f"{self.include_dir}/")
+        self._write(self.other_file, f"[{getuser()}]\nallowed : + ['head']\n")
+        later = time.time() + 5
+        os.utime(self.other_file, (later, later))
+
+        index = includeindex.read_index(f"{self.include_dir}/")
+        self.assertFalse(
+            includeindex.is_current(index, [path for path, _ in index["files"]])
+        )
+        self.assertIn("head", self._conf()["allowed"])
+
+        includeindex.write_index(f"{self.include_dir}/")
+        self.assertIn("head", self._conf()["allowed"])
+
+    def test_unscannable_file_is_indexed_whole(self):
+        """Files with indented headers are indexed as a single block."""
+        self._write(self.other_file, f"  [{getuser()}]\nallowed : + ['tail']\n")
+        index = includeindex.build_index(f"{self.include_dir}/")
+        size = os.path.getsize(self.other_file)
+        position = [path for path, _ in index["files"]].index(self.other_file)
+        self.assertIn([position, 0, size], index["sections"][getuser()])
+        includeindex.write_index(f"{self.include_dir}/")
+        self.assertIn("tail", self._conf()["allowed"])
+
+    def test_untrusted_index_is_ignored(self):
+        """A group or world writable index is not used."""
+        includeindex.write_index(f"{self.include_dir}/")
+        os.chmod(includeindex.index_path(f"{self.include_dir}/"), 0o666)
+        self.assertIsNone(includeindex.read_index(f"{self.include_dir}/"))
+
+    def test_policy_show_uses_index(self):
+        """policy-show resolves the same sections and sources from the index."""
+        expected = policy.resolve_policy(self.configfile, getuser(), [])
+        includeindex.write_index(f"{self.include_dir}/")
+        result = policy.resolve_policy(self.configfile, getuser(), [])
+        self.assertEqual(result["applied_sections"], expected["applied_sections"])
+        self.assertEqual(result["trace"], expected["trace"])
+
+    def test_include_index_command(self):
+        """`lshell include-index` builds the index and --check reports staleness."""
+        stdout = io.StringIO()
+        with patch("sys.stdout", stdout):
+            self.assertEqual(
+                includeindex.main(["--config", self.configfile, "--check"]), 1
+            )
+            self.assertEqual(includeindex.main(["--config", self.configfile]), 0)
+            self.assertEqual(
+                includeindex.main(["--config", self.configfile, "--check"]), 0
+            )
+        self.assertIn("missing", stdout.getvalue())
+        self.assertIn("up to date", stdout.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Background job table: stable IDs and completion notifications."""
+
+import os
+import signal
+import subprocess
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import jobtable
+from lshell import pipeline
+
+
+def _sleep(seconds):
+    return subprocess.Popen(["sleep", str(seconds)], start_new_session=True)
+
+
+def _counting_poll():
+    """Patch Popen.poll with a mock counting the calls."""
+    return patch.object(
+        subprocess.Popen, "poll", autospec=True, side_effect=subprocess.Popen.poll
+    )
+
+
+def _collect_until(table, count, timeout=5):
+    """Collect until count notices are queued, and return them."""
+    notices = []
+    end = time.monotonic() + timeout
+    while len(notices) < count and time.monotonic() < end:
+        table.collect()
+        notices.extend(table.notices())
+        time.sleep(0.01)
+    return notices
+
+
+class TestJobTable(unittest.TestCase):
+    """Jobs are tracked by ID and reported once finished."""
+
+    def setUp(self):
+        self.table = jobtable.JobTable()
+        self.addCleanup(self._kill_all)
+
+    def _kill_all(self):
+        for job in self.table:
+            if job.poll() is None:
+                os.killpg(os.getpgid(job.pid), signal.SIGKILL)
+                job.wait()
+        self.table.clear()
+
+    def test_ids_are_stable(self):
+        """IDs do not shift; a new job gets the highest ID in use plus one."""
+        first, second = _sleep(60), _sleep(0)
+        self.assertEqual(self.table.add(first), 1)
+        self.assertEqual(self.table.add(second), 2)
+        self.assertEqual(self.table.add(first), 1)
+        self.assertEqual(_collect_until(self.table, 1), [(2, second)])
+        self.assertEqual(self.table.items(), [(1, first)])
+        self.assertEqual(self.table.current(), 1)
+        third = _sleep(60)
+        self.assertEqual(self.table.add(third), 2)
+        self.table.remove(first)
+        self.table.remove(third)
+        self.assertIsNone(self.table.current())
+        self.assertEqual(self.table.add(_sleep(60)), 1)
+
+    @unittest.skipUnless(hasattr(os, "pidfd_open"), "needs pidfds")
+    def test_collect_polls_only_finished_jobs(self):
+        """With hundreds of jobs, a prompt only looks at the finished one."""
+        jobs = [_sleep(60) for _ in range(200)]
+        for job in jobs:
+            self.table.add(job)
+        done = _sleep(0)
+        self.table.add(done)
+        with _counting_poll() as poll:
+            self.assertEqual(_collect_until(self.table, 1), [(201, done)])
+        self.assertEqual(poll.call_count, 1)
+        self.assertEqual(len(self.table), 200)
+
+    @unittest.skipUnless(pipeline.SUPPORTED, "needs subprocess process_group")
+    def test_pipeline_finishes_with_its_last_process(self):
+        """A pipeline is reported once every process exited."""
+        job = pipeline.spawn([(None, ["sleep", "0"]), (None, ["sleep", "0.3"])])
+        self.table.add(job)
+        time.sleep(0.1)
+        self.table.collect()
+        self.assertEqual(self.table.notices(), [])
+        self.assertEqual(_collect_until(self.table, 1), [(1, job)])
+        self.assertEqual(job.returncode, 0)
+
+    def test_sigchld_drives_jobs_without_pidfd(self):
+        """Without pidfds, jobs are polled only after SIGCHLD."""
+        with patch.object(jobtable.os, "pidfd_open", side_effect=OSError, create=True):
+            running = _sleep(60)
+            done = _sleep(0.2)
+            self.table.add(running)
+            self.table.add(done)
+            self.table.collect()
+            with _counting_poll() as poll:
+                self.table.collect()
+            poll.assert_not_called()
+            self.assertEqual(_collect_until(self.table, 1), [(2, done)])
+            self.assertEqual(self.table.items(), [(1, running)])
+
+    def test_other_objects_are_polled(self):
+        """Objects that are not child processes are polled."""
+
+        class Job:
+            """Minimal job with a fixed status."""
+
+            pid = 0
+            returncode = 0
+
+            def poll(self):
+                """Report the job as finished."""
+                return 0
+
+        job = Job()
+        self.table.add(job)
+        self.table.collect()
+        self.assertEqual(self.table.notices(), [(1, job)])
+        self.assertEqual(self.table.notices(), [])
+        self.assertNotIn(job, self.table)
+
+
+if __name__ == "__main__":
+    unittest.main()
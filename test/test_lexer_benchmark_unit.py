@@ -0,0 +1,96 @@
+"""Benchmark of the per-command tokenization cost of the security checks."""
+
+import os
+import shlex
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import lexer
+from lshell import sec
+from lshell import utils
+
+LINES = [
+    f"LANG=C grep -rn 'pattern {number}' /var/log/app{number} "
+    f'| sort -k2 | head -n {number} && echo "done {number}" > /tmp/out{number}.txt'
+    for number in range(200)
+]
+_CACHED = (lexer.parse, lexer.parse_segment)
+# typical speedup is 5x; keep headroom for noisy runners. Timings depend on
+# the machine, so speedups are only checked when LSHELL_BENCHMARKS=1.
+MIN_SPEEDUP = 2
+
+
+def _shlex_segment(text):
+    """Reference: tokenize with shlex on every call, as each check used to."""
+    try:
+        values = shlex.split(text, posix=True)
+    except ValueError as exception:
+        return lexer.Segment(text, error=str(exception))
+    words = tuple(lexer.Word(value, value) for value in values)
+    position = 0
+    while position < len(values) and lexer.is_assignment_word(values[position]):
+        position += 1
+    return lexer.Segment(
+        text,
+        words,
+        None,
+        tuple(tuple(value.split("=", 1)) for value in values[:position]),
+        values[position] if position < len(values) else "",
+        tuple(values[position + 1 :]),
+    )
+
+
+def _check_line(line):
+    """The tokenizing steps of cmd_parse_execute, check_secure, check_path
+    and exec_cmd for one command line.
+    """
+    for item in utils.split_command_sequence(line):
+        if item not in lexer.OPERATORS:
+            utils._parse_command(item)
+    for segment in utils.split_commands(line):
+        sec._split_command_for_auth(segment)
+    sec._path_tokens_from_line(line)
+    return lexer.parse(line).words
+
+
+def _run():
+    for cached in _CACHED:
+        cached.cache_clear()
+    start = time.perf_counter()
+    for line in LINES:
+        _check_line(line)
+    return time.perf_counter() - start
+
+
+def _best_time(runs=3):
+    return min(_run() for _ in range(runs))
+
+
+def _legacy_best_time(runs=3):
+    """_best_time, tokenizing again at each step."""
+    with patch.object(lexer, "parse", lexer.parse.__wrapped__), patch.object(
+        lexer, "parse_segment", _shlex_segment
+    ):
+        return _best_time(runs)
+
+
+class TestLexerBenchmark(unittest.TestCase):
+    """One shared parse per line is cheaper than per-check tokenization."""
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_shared_parse_is_faster(self):
+        """Checking a command line costs less than re-tokenizing it per check."""
+        legacy = _legacy_best_time()
+        shared = _best_time()
+        self.assertGreaterEqual(
+            legacy / shared,
+            MIN_SPEEDUP,
+            f"shared lexer {shared:.4f}s vs per-check shlex {legacy:.4f}s",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
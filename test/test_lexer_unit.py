@@ -0,0 +1,123 @@
+"""Unit tests for the shared command line lexer."""
+
+import random
+import shlex
+import unittest
+
+from lshell import lexer
+from lshell import sec
+from lshell import utils
+
+ALPHABET = "ab /$=-\\'\"\t\n|;&()`{}><*"
+
+
+def _shlex_split(text):
+    try:
+        return shlex.split(text, posix=True), None
+    except ValueError as exception:
+        return None, str(exception)
+
+
+class TestSplitWords(unittest.TestCase):
+    """Words are split exactly like shlex.split()."""
+
+    def test_matches_shlex_on_random_input(self):
+        """Quoting, escapes and errors match shlex on random lines."""
+        generator = random.Random(1234)
+        for _ in range(3000):
+            text = "".join(
+                generator.choice(ALPHABET) for _ in range(generator.randint(0, 16))
+            )
+            expected, expected_error = _shlex_split(text)
+            segment = lexer.parse_segment(text)
+            with self.subTest(text=text):
+                self.assertEqual(segment.error, expected_error)
+                if expected is not None:
+                    self.assertEqual(segment.values, expected)
+
+    def test_word_source_and_quoting(self):
+        """Words keep their source text and whether they were quoted."""
+        words = lexer.split_words("""echo 'a b' c"d\\"e" \\x ''""")
+        self.assertEqual(
+            [(word.text, word.value, word.quoted) for word in words],
+            [
+                ("echo", "echo", False),
+                ("'a b'", "a b", True),
+                ('c"d\\"e"', 'cd"e', True),
+                ("\\x", "x", False),
+                ("''", "", True),
+            ],
+        )
+
+
+class TestParse(unittest.TestCase):
+    """Lines are parsed into typed segments and operators."""
+
+    def test_segments_and_operators(self):
+        """Top-level operators separate segments; quoted ones do not."""
+        line = lexer.parse("A=1 B=2 grep -r 'x|y' src | sort && echo \"a;b\" &")
+        self.assertEqual(
+            line.sequence,
+            ["A=1 B=2 grep -r 'x|y' src", "|", "sort", "&&", 'echo "a;b"', "&"],
+        )
+        first = line.segments[0]
+        self.assertEqual(first.assignments, (("A", "1"), ("B", "2")))
+        self.assertEqual(first.command, "grep")
+        self.assertEqual(first.args, ("-r", "x|y", "src"))
+
+    def test_substitutions_and_redirections(self):
+        """Substitutions outside single quotes and redirections are typed."""
+        segment = lexer.parse_segment("cat $(ls ${HOME}) `id` '$(no)' >out 2> err <in")
+        self.assertEqual(segment.substitutions, ("$(ls ${HOME})", "`id`"))
+        self.assertEqual(
+            segment.redirections, ((">", "out"), ("2>", "err"), ("<", "in"))
+        )
+
+    def test_malformed_lines(self):
+        """Unbalanced quotes and misplaced operators invalidate the line."""
+        for line in ["echo 'a", "| ls", "ls &&", "ls ; ; ls", "echo $(ls"]:
+            with self.subTest(line=line):
+                self.assertFalse(lexer.parse(line).valid)
+                self.assertIsNone(utils.split_command_sequence(line))
+        self.assertEqual(lexer.parse("  ").sequence, [])
+
+    def test_parse_is_shared(self):
+        """Parsing the same text again returns the same result."""
+        self.assertIs(lexer.parse("ls -l | wc"), lexer.parse("ls -l | wc"))
+        self.assertIs(
+            lexer.parse("ls -l | wc").segments[0], lexer.parse_segment("ls -l")
+        )
+
+    def test_checks_share_one_parse(self):
+        """Authorization, path and extension checks reuse the cached parse."""
+        line = "VAR=1 cat /tmp/notes.txt | head -n 2 ./a.log"
+        lexer.parse.cache_clear()
+        lexer.parse_segment.cache_clear()
+        utils.split_commands(line)
+        for segment in lexer.parse(line).segments:
+            sec._split_command_for_auth(segment.text)
+            sec.check_allowed_file_extensions(segment.text, [".txt", ".log"])
+            utils._parse_command(segment.text)
+        sec._path_tokens_from_line(line)
+        self.assertEqual(lexer.parse.cache_info().misses, 1)
+        self.assertEqual(lexer.parse_segment.cache_info().misses, 2)
+
+    def test_consumers_keep_their_results(self):
+        """The helpers built on the lexer return what they used to."""
+        self.assertEqual(
+            utils._parse_command("A=1 ls -l 'a b'"),
+            ("ls", "-l a b", ["A=1", "ls", "-l", "a b"], [("A", "1")]),
+        )
+        self.assertEqual(utils._parse_command("A=1"), ("", "", ["A=1"], [("A", "1")]))
+        self.assertEqual(utils._parse_command("echo 'a"), (None, None, None, None))
+        self.assertEqual(
+            sec._split_command_for_auth("A=1 echo  hi"), ("echo", ["hi"], "echo hi")
+        )
+        self.assertEqual(
+            sec._path_tokens_from_line("cd var; cat /etc/passwd x"),
+            ["var", "/etc/passwd"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""Unit tests for the cached sudo_noexec compatibility probe."""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import checkconfig
+from lshell import statecache
+from lshell.checkconfig import CheckConfig
+
+TOPDIR = f"{os.path.dirname(os.path.realpath(__file__))}/../"
+CONFIG = f"{TOPDIR}/test/testfiles/test.conf"
+
+
+class TestNoexecProbeCache(unittest.TestCase):
+    """The bash probe only runs when the library or bash changes."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-noexec-")
+        self.library = os.path.join(self.tmpdir, "sudo_noexec.so")
+        with open(self.library, "wb") as handle:
+            handle.write(b"\x7fELF")
+        self.env = patch.dict(
+            os.environ, {statecache.STATE_DIR_ENV: os.path.join(self.tmpdir, "state")}
+        )
+        self.env.start()
+        self.verdicts = patch.dict(checkconfig._NOEXEC_VERDICTS, clear=True)
+        self.verdicts.start()
+        self.cwd = os.getcwd()
+        self.conf = CheckConfig([f"--config={CONFIG}", "--quiet=1"])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.verdicts.stop()
+        self.env.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _probe(self, returncode=0):
+        with patch(
+            "lshell.checkconfig.subprocess.run",
+            return_value=subprocess.CompletedProcess([], returncode),
+        ) as mock_run:
+            usable = self.conf.noexec_library_usable(self.library)
+        return usable, mock_run
+
+    def test_probe_result_is_reused(self):
+        """A second check with unchanged binaries does not spawn bash."""
+        usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+        usable, mock_run = self._probe(returncode=1)
+        self.assertTrue(usable)
+        mock_run.assert_not_called()
+
+    def test_library_change_reprobes(self):
+        """Replacing the library invalidates the cached verdict."""
+        self._probe(returncode=0)
+        later = time.time() + 5
+        os.utime(self.library, (later, later))
+
+        usable, mock_run = self._probe(returncode=1)
+        self.assertFalse(usable)
+        mock_run.assert_called_once()
+
+    def test_spawn_failure_is_not_cached(self):
+        """Transient probe failures are retried on the next check."""
+        with patch(
+            "lshell.checkconfig.subprocess.run", side_effect=OSError("no bash")
+        ):
+            self.assertFalse(self.conf.noexec_library_usable(self.library))
+
+        usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+    def test_verdict_not_written_by_root_is_ignored(self):
+        """A user cannot disable the noexec library with a forged verdict."""
+        self._probe(returncode=0)
+        bash_path = shutil.which("bash")
+        cache_name = f"{self.library}:{bash_path}"
+        verdict = statecache.load("noexec", cache_name, system=True)
+        statecache.store(
+            "noexec", cache_name, dict(verdict, usable=False), system=True
+        )
+        directory = statecache._cache_dir("noexec", shared=False, system=True)
+        for name in os.listdir(directory):
+            os.chown(os.path.join(directory, name), 65534, -1)
+        # a new login
+        checkconfig._NOEXEC_VERDICTS.clear()
+
+        usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+    def _as_user(self):
+        """Hide the system scope, like for sessions of users other than root."""
+        load, store = statecache.load, statecache.store
+        return patch.multiple(
+            "lshell.statecache",
+            load=lambda *args, system=False, **kwargs: (
+                None if system else load(*args, **kwargs)
+            ),
+            store=lambda *args, system=False, **kwargs: (
+                False if system else store(*args, **kwargs)
+            ),
+        )
+
+    def test_users_reuse_their_usable_verdict(self):
+        """A user's usable verdict is kept privately for the next logins."""
+        with self._as_user():
+            self._probe(returncode=0)
+            # a new login
+            checkconfig._NOEXEC_VERDICTS.clear()
+            usable, mock_run = self._probe(returncode=1)
+        self.assertTrue(usable)
+        mock_run.assert_not_called()
+
+    def test_users_do_not_store_unusable_verdicts(self):
+        """A user's unusable verdict is probed again at every login."""
+        with self._as_user():
+            self._probe(returncode=1)
+            checkconfig._NOEXEC_VERDICTS.clear()
+            usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+    def test_private_unusable_verdict_is_ignored(self):
+        """A private verdict cannot turn LD_PRELOAD off."""
+        with self._as_user():
+            self._probe(returncode=0)
+            bash_path = shutil.which("bash")
+            cache_name = f"{self.library}:{bash_path}"
+            verdict = statecache.load("noexec", cache_name)
+            statecache.store("noexec", cache_name, dict(verdict, usable=False))
+            checkconfig._NOEXEC_VERDICTS.clear()
+            usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+    def test_root_does_not_store_private_verdicts(self):
+        """Root writes the system verdict only."""
+        self._probe(returncode=0)
+        self.assertIsNone(
+            statecache._cache_dir("noexec", shared=False, system=False)
+        )
+
+    def test_reload_reuses_the_session_verdict(self):
+        """A reloaded configuration does not probe again."""
+        with patch("lshell.statecache.os.geteuid", return_value=65534):
+            self._probe(returncode=0)
+            self.conf = CheckConfig([f"--config={CONFIG}", "--quiet=1"], refresh=1)
+            usable, mock_run = self._probe(returncode=1)
+        self.assertTrue(usable)
+        mock_run.assert_not_called()
+
+    def test_missing_bash_is_not_cached(self):
+        """Without a bash binary to fingerprint, the probe always runs."""
+        with patch("lshell.checkconfig.shutil.which", return_value=None):
+            self._probe(returncode=0)
+            usable, mock_run = self._probe(returncode=0)
+        self.assertTrue(usable)
+        mock_run.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
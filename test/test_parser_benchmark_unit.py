@@ -0,0 +1,85 @@
+"""Throughput benchmark of LshellParser on a realistic command corpus."""
+
+import os
+import time
+import unittest
+
+from pyparsing import ParserElement
+
+from lshell.parser import LshellParser
+
+CORPUS = [
+    'echo "hello world"',
+    'grep "error" /var/log/syslog | sort -u > errors.txt',
+    'find / -name "*.py" -print | xargs grep "def \\"test\\""',
+    "tar -czf backup.tar.gz /home/user/data && mv backup.tar.gz /mnt/backup/ "
+    '|| echo "Backup failed"',
+    'echo "hello" &',
+    "ls -la /tmp; echo $?",
+    "LANG=C sort -k2 data.txt | uniq -c > counts.txt",
+    "cd /var/www && git status",
+    "echo $(date) `whoami` ${HOME}",
+    "cat notes.txt | head -n 20",
+]
+ROUNDS = 20
+# typical speedup is 6x; keep headroom for noisy runners. Timings depend on
+# the machine, so speedups are only checked when LSHELL_BENCHMARKS=1.
+MIN_SPEEDUP = 3
+
+
+def _commands_per_second(parse):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for command in CORPUS:
+                parse(command)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(CORPUS) * ROUNDS / best
+
+
+class TestParserThroughput(unittest.TestCase):
+    """The grammar is built once, not for every parsed command."""
+
+    def setUp(self):
+        self.parser = LshellParser()
+
+    def _rebuild_and_parse(self, command):
+        """Reference: build the grammar for every command, as parse used to."""
+        grammar = LshellParser._build_grammar()
+        return grammar.parse_string(self.parser._clean_input(command), parse_all=True)
+
+    def test_grammar_is_shared(self):
+        """All parsers use the same grammar object."""
+        self.assertIs(LshellParser().grammar(), self.parser.grammar())
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_shared_grammar_throughput(self):
+        """Parsing with the shared grammar is clearly faster."""
+        rebuilt = _commands_per_second(self._rebuild_and_parse)
+        shared = _commands_per_second(self.parser.parse)
+        self.assertGreaterEqual(
+            shared / rebuilt,
+            MIN_SPEEDUP,
+            f"shared grammar {shared:.0f} commands/s vs rebuilt {rebuilt:.0f} commands/s",
+        )
+
+    def test_packrat_results_are_unchanged(self):
+        """Packrat memoization does not change parse results."""
+        expected = [self.parser.parse(command) for command in CORPUS]
+        try:
+            packrat_parser = LshellParser(packrat=True, packrat_cache_size=64)
+            results = [packrat_parser.parse(command) for command in CORPUS]
+        finally:
+            ParserElement.disable_memoization()
+        self.assertEqual(
+            [result.as_list() for result in results],
+            [result.as_list() for result in expected],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
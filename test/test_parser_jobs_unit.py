@@ -9,6 +9,7 @@ from unittest.mock import patch
 
 from lshell import builtincmd
 from lshell import completion
+from lshell import jobtable
 from lshell import utils
 
 
@@ -305,14 +306,14 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
     """Tests for built-in commands around job control."""
 
     def setUp(self):
-        """Save and clear global background job state before each test."""
-        self._previous_jobs = list(builtincmd.BACKGROUND_JOBS)
-        builtincmd.BACKGROUND_JOBS.clear()
+        """Use an empty background job table in each test."""
+        table_patch = patch.object(builtincmd, "BACKGROUND_JOBS", jobtable.JobTable())
+        table_patch.start()
+        self.addCleanup(table_patch.stop)
 
-    def tearDown(self):
-        """Restore global background job state after each test."""
-        builtincmd.BACKGROUND_JOBS.clear()
-        builtincmd.BACKGROUND_JOBS.extend(self._previous_jobs)
+    def _add_jobs(self, *jobs):
+        for job in jobs:
+            builtincmd.BACKGROUND_JOBS.add(job)
 
     def test_cmd_bg_fg_no_jobs(self):
         """Report failure when attempting fg with no jobs queued."""
@@ -324,7 +325,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
 
     def test_cmd_bg_fg_invalid_job_id(self):
         """Reject non-numeric fg job identifiers."""
-        builtincmd.BACKGROUND_JOBS.append(FakeJob())
+        builtincmd.BACKGROUND_JOBS.add(FakeJob())
         stdout = io.StringIO()
         with redirect_stdout(stdout):
             ret = builtincmd.cmd_bg_fg("fg", "abc")
@@ -336,7 +337,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
     def test_cmd_bg_fg_resumes_and_removes_job(self, mock_killpg, _mock_getpgid):
         """Resume a running job in foreground and remove it once completed."""
         job = FakeJob(poll_value=None, returncode=0, pid=9876, cmd="sleep 10")
-        builtincmd.BACKGROUND_JOBS.append(job)
+        builtincmd.BACKGROUND_JOBS.add(job)
         stdout = io.StringIO()
 
         with redirect_stdout(stdout):
@@ -353,7 +354,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
     def test_cmd_bg_fg_ctrl_z_keeps_single_job_entry(self, mock_killpg, _mock_getpgid):
         """Ctrl+Z during fg should not duplicate the same job or raise."""
         job = FakeJob(poll_value=None, returncode=0, pid=9876, cmd="tail -f blabla")
-        builtincmd.BACKGROUND_JOBS.append(job)
+        builtincmd.BACKGROUND_JOBS.add(job)
         stdout = io.StringIO()
         handlers = {}
 
@@ -386,7 +387,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
     ):
         """exec_cmd should restore original handlers and avoid duplicate job entries."""
         fake_proc = FakeProcess(pid=9876, trigger_suspend=True)
-        builtincmd.BACKGROUND_JOBS.append(fake_proc)
+        builtincmd.BACKGROUND_JOBS.add(fake_proc)
         signal_handlers = {}
         initial_sigtstp = object()
         initial_sigcont = object()
@@ -415,12 +416,10 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
 
     def test_cmd_jobs_displays_symbols(self):
         """Render job list with expected current and previous markers."""
-        builtincmd.BACKGROUND_JOBS.extend(
-            [
-                FakeJob(poll_value=None, cmd="sleep 1"),
-                FakeJob(poll_value=None, cmd="sleep 2"),
-                FakeJob(poll_value=None, cmd="sleep 3"),
-            ]
+        self._add_jobs(
+            FakeJob(poll_value=None, cmd="sleep 1"),
+            FakeJob(poll_value=None, cmd="sleep 2"),
+            FakeJob(poll_value=None, cmd="sleep 3"),
         )
         stdout = io.StringIO()
         with redirect_stdout(stdout):
@@ -434,7 +433,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
 
     def test_check_background_jobs_removes_completed_job(self):
         """Drop completed jobs and print completion status."""
-        builtincmd.BACKGROUND_JOBS.append(
+        builtincmd.BACKGROUND_JOBS.add(
             FakeJob(poll_value=0, returncode=0, cmd="sleep 1")
         )
         stdout = io.StringIO()
@@ -446,7 +445,7 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
 
     def test_check_background_jobs_suppresses_user_interrupted_job_message(self):
         """Do not print completion output for user-interrupted jobs."""
-        builtincmd.BACKGROUND_JOBS.append(
+        builtincmd.BACKGROUND_JOBS.add(
             FakeJob(poll_value=130, returncode=-2, cmd="sleep 1")
         )
         stdout = io.StringIO()
@@ -458,12 +457,10 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
 
     def test_check_background_jobs_prunes_all_completed_entries(self):
         """Completed jobs should all be removed without skipping entries."""
-        builtincmd.BACKGROUND_JOBS.extend(
-            [
-                FakeJob(poll_value=0, returncode=0, cmd="sleep 1"),
-                FakeJob(poll_value=1, returncode=1, cmd="sleep 2"),
-                FakeJob(poll_value=0, returncode=0, cmd="sleep 3"),
-            ]
+        self._add_jobs(
+            FakeJob(poll_value=0, returncode=0, cmd="sleep 1"),
+            FakeJob(poll_value=1, returncode=1, cmd="sleep 2"),
+            FakeJob(poll_value=0, returncode=0, cmd="sleep 3"),
         )
         stdout = io.StringIO()
         with redirect_stdout(stdout):
@@ -474,18 +471,39 @@ class TestBuiltinsJobsAndSource(unittest.TestCase):
         self.assertEqual(output.count("Done"), 2)
         self.assertEqual(output.count("Failed"), 1)
 
-    def test_jobs_prunes_finished_and_reindexes_running(self):
-        """jobs() should drop non-running jobs and reindex active ones from 1."""
-        builtincmd.BACKGROUND_JOBS.extend(
-            [
-                FakeJob(poll_value=0, returncode=0, cmd="done job"),
-                FakeJob(poll_value=1, returncode=1, cmd="failed job"),
-                FakeJob(poll_value=None, returncode=0, cmd="running job"),
-            ]
+    def test_jobs_prunes_finished_and_keeps_job_ids(self):
+        """jobs() should drop non-running jobs, which keep their job IDs."""
+        self._add_jobs(
+            FakeJob(poll_value=0, returncode=0, cmd="done job"),
+            FakeJob(poll_value=1, returncode=1, cmd="failed job"),
+            FakeJob(poll_value=None, returncode=0, cmd="running job"),
         )
 
         joblist = builtincmd.jobs()
 
-        self.assertEqual(joblist, [[1, "Stopped", "running job"]])
+        self.assertEqual(joblist, [[3, "Stopped", "running job"]])
         self.assertEqual(len(builtincmd.BACKGROUND_JOBS), 1)
-        self.assertEqual(builtincmd.BACKGROUND_JOBS[0].lshell_cmd, "running job")
+        self.assertEqual(builtincmd.BACKGROUND_JOBS.get(3).lshell_cmd, "running job")
+
+        # the finished jobs are reported at the next prompt
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            builtincmd.check_background_jobs()
+        self.assertIn("[1]+  Done", stdout.getvalue())
+        self.assertIn("[2]+  Failed", stdout.getvalue())
+
+    def test_job_ids_are_stable(self):
+        """A job keeps its ID when earlier jobs finish, fg finds it by ID."""
+        first = FakeJob(poll_value=None, cmd="sleep 1")
+        second = FakeJob(poll_value=None, cmd="sleep 2")
+        self._add_jobs(first, second)
+        first._poll_value = 0
+        with redirect_stdout(io.StringIO()):
+            builtincmd.check_background_jobs()
+        self.assertEqual(builtincmd.jobs(), [[2, "Stopped", "sleep 2"]])
+        self.assertEqual(builtincmd.BACKGROUND_JOBS.add(second), 2)
+        self.assertEqual(builtincmd.BACKGROUND_JOBS.current(), 2)
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            self.assertEqual(builtincmd.cmd_bg_fg("fg", "1"), 1)
+        self.assertIn("fg: 1: no such job", stdout.getvalue())
@@ -0,0 +1,127 @@
+"""Unit tests for the compiled path ACL."""
+
+import itertools
+import os
+import unittest
+from unittest.mock import patch
+
+from lshell import pathacl
+from lshell import sec
+
+
+def _legacy_is_path_allowed(candidate, allowed_roots, denied_roots):
+    """Reference implementation: compare the candidate with every root."""
+
+    def within(path, base):
+        try:
+            return os.path.commonpath([path, base]) == base
+        except ValueError:
+            return False
+
+    def specificity(path):
+        normalized = os.path.normpath(path)
+        if normalized == os.sep:
+            return 0
+        return len([segment for segment in normalized.split(os.sep) if segment])
+
+    matching_allows = [root for root in allowed_roots if within(candidate, root)]
+    matching_denies = [root for root in denied_roots if within(candidate, root)]
+    if not allowed_roots:
+        return not matching_denies
+    if not matching_allows:
+        return False
+    best_allow = max(specificity(root) for root in matching_allows)
+    best_deny = max((specificity(root) for root in matching_denies), default=-1)
+    return best_allow > best_deny
+
+
+ROOTS = ["/", "/var", "/var/log", "/var/log/app", "/home/alice", "/home/al"]
+CANDIDATES = [
+    "/",
+    "/var",
+    "/var/",
+    "/var/lib",
+    "/var/log",
+    "/var/log/syslog",
+    "/var/log/app/x/y",
+    "/variable",
+    "/home/alice/notes",
+    "/home/alice2",
+    "/home/al",
+    "/home",
+    "/./var/log",
+    "relative/path",
+]
+
+
+class TestPathACL(unittest.TestCase):
+    """The trie resolves paths exactly like the linear root scan."""
+
+    def test_matches_linear_scan(self):
+        """Every allow/deny combination of the sample roots agrees."""
+        for allowed_count in range(3):
+            for allowed in itertools.combinations(ROOTS, allowed_count):
+                for denied in itertools.combinations(ROOTS, 2):
+                    acl = pathacl.PathACL(list(allowed), list(denied))
+                    for candidate in CANDIDATES:
+                        self.assertEqual(
+                            acl.allows(candidate),
+                            _legacy_is_path_allowed(candidate, allowed, denied),
+                            (allowed, denied, candidate),
+                        )
+
+    def test_most_specific_root_wins(self):
+        """['/'] - ['/var'] + ['/var/log'] allows /var/log but denies /var."""
+        acl = pathacl.PathACL(["/", "/var/log"], ["/var"])
+        self.assertTrue(acl.allows("/var/log/syslog"))
+        self.assertFalse(acl.allows("/var/lib"))
+        self.assertTrue(acl.allows("/etc"))
+
+    def test_ties_deny(self):
+        """A directory both allowed and denied is denied."""
+        acl = pathacl.PathACL(["/srv"], ["/srv"])
+        self.assertFalse(acl.allows("/srv/data"))
+
+    def test_empty_allow_list_is_unrestricted(self):
+        """Without allowed roots only denied roots are refused."""
+        acl = pathacl.PathACL([], ["/root"])
+        self.assertTrue(acl.allows("/tmp"))
+        self.assertFalse(acl.allows("/root/.ssh"))
+
+    def test_denies_subtree(self):
+        """Only denied directories without an allowed root below are pruned."""
+        acl = pathacl.PathACL(["/var/log", "/home"], ["/home/secret"])
+        self.assertTrue(acl.denies_subtree("/etc"))
+        self.assertTrue(acl.denies_subtree("/home/secret"))
+        self.assertTrue(acl.denies_subtree("/var/lib"))
+        self.assertFalse(acl.denies_subtree("/"))
+        self.assertFalse(acl.denies_subtree("/var"))
+        self.assertFalse(acl.denies_subtree("/var/log/app"))
+        self.assertFalse(acl.denies_subtree("/home"))
+
+
+class TestCompiledConfACL(unittest.TestCase):
+    """check_path compiles the ACL once per path policy."""
+
+    def test_acl_is_compiled_once(self):
+        """ACL entries are resolved once, not on every check."""
+        conf = {"path": ["/tmp/|/var/|", "/var/lib/|"]}
+        with patch.object(sec, "_safe_realpath", side_effect=os.path.realpath) as mock:
+            acl = sec.path_acl(conf)
+            self.assertIs(sec.path_acl(conf), acl)
+        self.assertEqual(mock.call_count, 3)
+        self.assertTrue(acl.allows("/tmp"))
+        self.assertFalse(acl.allows(os.path.realpath("/var/lib") + "/x"))
+
+    def test_changed_policy_is_recompiled(self):
+        """Replacing the path policy compiles a new ACL."""
+        conf = {"path": ["/tmp/|", ""]}
+        self.assertTrue(sec.path_acl(conf).allows("/tmp/file"))
+        conf["path"] = ["/srv/|", ""]
+        self.assertFalse(sec.path_acl(conf).allows("/tmp/file"))
+        conf["path"][0] += "/tmp/|"
+        self.assertTrue(sec.path_acl(conf).allows("/tmp/file"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Unit tests for the PATH executable catalog."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import configschema
+from lshell import pathcatalog
+from lshell import policyresolver
+from lshell import statecache
+
+
+class TestPathCatalog(unittest.TestCase):
+    """The catalog must agree with listdir() + access(X_OK)."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-catalog-")
+        self.bindir = os.path.join(self.tmpdir, "bin")
+        os.mkdir(self.bindir)
+        for name, mode in (("tool", 0o755), ("data", 0o644), ("owner", 0o700)):
+            self._create(name, mode)
+        os.mkdir(os.path.join(self.bindir, "subdir"))
+        os.symlink(
+            os.path.join(self.bindir, "missing"), os.path.join(self.bindir, "dangling")
+        )
+        self.env = patch.dict(
+            os.environ, {statecache.STATE_DIR_ENV: os.path.join(self.tmpdir, "state")}
+        )
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _create(self, name, mode):
+        path = os.path.join(self.bindir, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write("#!/bin/sh\n")
+        os.chmod(path, mode)
+
+    def _reference(self):
+        return [
+            item
+            for item in os.listdir(self.bindir)
+            if os.access(os.path.join(self.bindir, item), os.X_OK)
+        ]
+
+    def test_matches_listdir_and_access(self):
+        """Cold and warm lookups return the listdir/access result in order."""
+        self.assertEqual(pathcatalog.executables(self.bindir), self._reference())
+        self.assertEqual(pathcatalog.executables(self.bindir), self._reference())
+
+    def test_warm_lookup_does_not_rescan(self):
+        """An unchanged directory is served from the stored index."""
+        pathcatalog.executables(self.bindir)
+        with patch("lshell.pathcatalog.os.scandir") as mock_scandir:
+            pathcatalog.executables(self.bindir)
+        mock_scandir.assert_not_called()
+
+    def test_directory_change_triggers_rescan(self):
+        """Adding an entry changes the directory mtime and refreshes the index."""
+        pathcatalog.executables(self.bindir)
+        self._create("newtool", 0o755)
+        later = time.time() + 5
+        os.utime(self.bindir, (later, later))
+
+        self.assertIn("newtool", pathcatalog.executables(self.bindir))
+
+    def test_warm_lookup_does_not_stat_entries(self):
+        """Regular entries are trusted as of the directory fingerprint."""
+        pathcatalog.executables(self.bindir)
+        with patch("lshell.pathcatalog.os.stat", wraps=os.stat) as mock_stat:
+            pathcatalog.executables(self.bindir)
+        entries = [
+            call.args[0]
+            for call in mock_stat.call_args_list
+            if os.path.dirname(str(call.args[0])) == self.bindir
+        ]
+        self.assertEqual(entries, [os.path.join(self.bindir, "dangling")])
+
+    def test_entry_mode_change_is_seen_with_directory_change(self):
+        """chmod leaves the directory unchanged: it is seen on its next change."""
+        pathcatalog.executables(self.bindir)
+        os.chmod(os.path.join(self.bindir, "data"), 0o755)
+        os.chmod(os.path.join(self.bindir, "tool"), 0o644)
+        later = time.time() + 5
+        os.utime(self.bindir, (later, later))
+        self.assertEqual(pathcatalog.executables(self.bindir), self._reference())
+        self.assertIn("data", pathcatalog.executables(self.bindir))
+        self.assertNotIn("tool", pathcatalog.executables(self.bindir))
+
+    def test_entries_with_acl_use_access(self):
+        """Mode bits do not show ACLs: such entries are checked with access(2)."""
+        data = os.path.join(self.bindir, "data")
+
+        def listxattr(path):
+            return ["system.posix_acl_access"] if path == data else []
+
+        def access(path, mode):
+            return path == data and mode == os.X_OK
+
+        with patch("lshell.pathcatalog.os.listxattr", side_effect=listxattr):
+            with patch("lshell.pathcatalog.os.access", side_effect=access):
+                names = pathcatalog.executables(self.bindir)
+        self.assertIn("data", names)
+        self.assertIn("tool", names)
+
+    def test_symlink_target_creation_is_seen(self):
+        """A dangling symlink becomes executable with its target."""
+        target = os.path.join(self.tmpdir, "target")
+        os.symlink(target, os.path.join(self.bindir, "link"))
+        pathcatalog.executables(self.bindir)
+        with open(target, "w", encoding="utf-8") as handle:
+            handle.write("#!/bin/sh\n")
+        os.chmod(target, 0o755)
+        self.assertIn("link", pathcatalog.executables(self.bindir))
+
+    def test_catalog_not_written_by_root_is_ignored(self):
+        """A user cannot forge the executables of a directory."""
+        pathcatalog.executables(self.bindir)
+        catalog = statecache.load("catalog", self.bindir, system=True)
+        catalog["entries"] = [
+            item for item in catalog["entries"] if item[0] != "tool"
+        ]
+        statecache.store("catalog", self.bindir, catalog, system=True)
+        directory = statecache._cache_dir("catalog", shared=False, system=True)
+        for name in os.listdir(directory):
+            os.chown(os.path.join(directory, name), 65534, -1)
+        with patch("lshell.pathcatalog.os.scandir", wraps=os.scandir) as mock_scandir:
+            self.assertIn("tool", pathcatalog.executables(self.bindir))
+        mock_scandir.assert_called_once()
+
+    def test_missing_directory_raises(self):
+        """Unreadable directories behave like os.listdir()."""
+        with self.assertRaises(OSError):
+            pathcatalog.executables(os.path.join(self.tmpdir, "nope"))
+
+    def test_resolver_expand_all_uses_catalog(self):
+        """'all' expansion lists the catalog executables."""
+        resolver = policyresolver.PolicyResolver({"default": {"allowed": "all"}})
+        with patch.dict(os.environ, {"PATH": self.bindir}):
+            conf_raw = resolver.resolve(["default"]).conf_raw
+        expanded = configschema.parse_config_value(conf_raw["allowed"], "allowed")
+        for name in self._reference():
+            self.assertIn(name, expanded)
+        self.assertNotIn("dangling", expanded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Pipelines of simple commands spawned without bash."""
+
+import os
+import signal
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import builtincmd
+from lshell import containment
+from lshell import pipeline
+from lshell import utils
+
+# typical speedup is 1.7x (no bash process, no second parse of the line);
+# keep headroom for noisy runners. Timings depend on the machine, so the
+# speedup is only checked when LSHELL_BENCHMARKS=1.
+MIN_SPEEDUP = 1.2
+RUNS = 20
+
+
+def _latency(command, runs=RUNS):
+    """Return the mean latency of exec_cmd(command), best of three."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(runs):
+            utils.exec_cmd(command)
+        elapsed = (time.perf_counter() - start) / runs
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@unittest.skipUnless(pipeline.SUPPORTED, "needs subprocess process_group")
+class TestPipelineSpawn(unittest.TestCase):
+    """spawn() connects the stages and groups them."""
+
+    def test_stages_are_connected(self):
+        """The output of each stage feeds the next one."""
+        with tempfile.TemporaryFile() as output:
+            proc = pipeline.spawn(
+                [(None, ["seq", "3"]), (None, ["tr", "1", "X"]), (None, ["sort"])],
+                stdout=output,
+            )
+            self.assertEqual(proc.wait(), 0)
+            output.seek(0)
+            self.assertEqual(output.read(), b"2\n3\nX\n")
+        self.assertEqual(proc.args, ["seq", "3", "|", "tr", "1", "X", "|", "sort"])
+
+    def test_stages_share_one_process_group(self):
+        """The group of the first stage holds every stage."""
+        proc = pipeline.spawn([(None, ["sleep", "5"]), (None, ["sleep", "5"])])
+        try:
+            groups = {os.getpgid(process.pid) for process in proc.processes}
+            self.assertEqual(groups, {proc.pid})
+            self.assertNotEqual(proc.pid, os.getpgrp())
+            self.assertIsNone(proc.poll())
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+        self.assertEqual(proc.wait(), 128 + signal.SIGTERM)
+
+    def test_status_is_the_last_stage(self):
+        """As in bash without pipefail."""
+        self.assertEqual(pipeline.spawn([(None, ["false"]), (None, ["true"])]).wait(), 0)
+        self.assertEqual(pipeline.spawn([(None, ["true"]), (None, ["false"])]).wait(), 1)
+
+    def test_failed_spawn_kills_started_stages(self):
+        """A stage that cannot start takes the pipeline down."""
+        with patch.object(
+            pipeline.subprocess,
+            "Popen",
+            side_effect=[pipeline.subprocess.Popen(["sleep", "5"], process_group=0), OSError],
+        ):
+            with self.assertRaises(OSError):
+                pipeline.spawn([(None, ["sleep", "5"]), (None, ["sleep", "5"])])
+
+    def test_wait_timeout(self):
+        """wait() gives up after the timeout, like Popen.wait()."""
+        proc = pipeline.spawn([(None, ["sleep", "5"]), (None, ["true"])])
+        with self.assertRaises(pipeline.subprocess.TimeoutExpired):
+            proc.wait(timeout=0.1)
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+@unittest.skipUnless(pipeline.SUPPORTED, "needs subprocess process_group")
+@patch.object(utils.os, "isatty", return_value=False)
+class TestExecPipeline(unittest.TestCase):
+    """exec_cmd spawns pipelines of simple commands itself."""
+
+    def tearDown(self):
+        builtincmd.BACKGROUND_JOBS.clear()
+
+    def test_pipeline_args(self, _isatty):
+        """Only pipelines of commands without shell syntax are direct."""
+        env = dict(os.environ)
+        stages = utils._direct_pipeline_args("seq 3 | tr 1 X|wc -l", env)
+        self.assertEqual(
+            [argv for _, argv in stages], [["seq", "3"], ["tr", "1", "X"], ["wc", "-l"]]
+        )
+        for command in ["seq 3", "seq 3 | echo", "seq 3 | wc > out", "seq 3 || wc", "seq 3 |& wc"]:
+            self.assertIsNone(utils._direct_pipeline_args(command, env), command)
+
+    def test_exec_cmd_spawns_pipeline(self, _isatty):
+        """The status of the last stage is the status of the line."""
+        with patch.object(pipeline, "spawn", wraps=pipeline.spawn) as spawn:
+            self.assertEqual(utils.exec_cmd("seq 3 | grep -q 2"), 0)
+            self.assertEqual(utils.exec_cmd("seq 3 | grep -q 4"), 1)
+        self.assertEqual(spawn.call_count, 2)
+        self.assertNotIn("start_new_session", spawn.call_args.kwargs)
+
+    def test_terminal_input_keeps_bash(self, isatty):
+        """The first stage could not read a terminal from its process group."""
+        isatty.return_value = True
+        with patch.object(pipeline, "spawn") as spawn:
+            self.assertEqual(utils.exec_cmd("seq 3 | grep -q 2"), 0)
+        spawn.assert_not_called()
+
+    def test_script_without_shebang_runs_in_bash(self, _isatty):
+        """ENOEXEC in a stage falls back to bash for the whole line."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = os.path.join(tmpdir, "script")
+            with open(script, "w", encoding="utf-8") as handle:
+                handle.write("read line; exit $line\n")
+            os.chmod(script, 0o755)
+            with patch.object(pipeline, "spawn", wraps=pipeline.spawn) as spawn:
+                self.assertEqual(utils.exec_cmd(f"seq 3 3 | {script}"), 3)
+                self.assertEqual(utils.exec_cmd(f"seq 3 | {script}"), 1)
+        self.assertEqual(spawn.call_count, 2)
+
+    def test_script_without_shebang_runs_in_bash_under_prlimit(self, _isatty):
+        """The rlimit wrapper would run a stage script with /bin/sh."""
+        conf = {"max_processes": 4096}
+        if not containment.rlimit_wrapper(containment.get_runtime_limits(conf)):
+            self.skipTest("prlimit is not available")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = os.path.join(tmpdir, "script")
+            with open(script, "w", encoding="utf-8") as handle:
+                handle.write("read line; exit ${BASH_VERSION:+$line}\n")
+            os.chmod(script, 0o755)
+            self.assertEqual(utils.exec_cmd(f"seq 3 3 | {script}", conf=conf), 3)
+
+    def test_exec_errors_map_to_bash_statuses(self, _isatty):
+        """A stage that cannot be executed sets the status bash would."""
+        error = PermissionError(13, "Permission denied", "/bin/tr")
+        with patch.object(pipeline, "spawn", side_effect=error), patch(
+            "sys.stderr"
+        ) as stderr:
+            self.assertEqual(utils.exec_cmd("seq 3 | tr 1 X"), 126)
+        stderr.write.assert_called_once_with("lshell: /bin/tr: Permission denied\n")
+
+    def test_timeout_kills_the_pipeline(self, _isatty):
+        """command_timeout applies to the whole process group."""
+        start = time.monotonic()
+        with patch("sys.stderr"):
+            retcode = utils.exec_cmd("sleep 5 | sleep 5", conf={"command_timeout": 1})
+        self.assertEqual(retcode, 124)
+        self.assertLess(time.monotonic() - start, 4)
+
+    def test_background_pipeline_is_a_job(self, _isatty):
+        """Background pipelines are tracked as one job."""
+        with patch("builtins.print"):
+            self.assertEqual(utils.exec_cmd("sleep 5 | sleep 5", background=True), 0)
+        job = builtincmd.BACKGROUND_JOBS.get(builtincmd.BACKGROUND_JOBS.current())
+        self.assertIsInstance(job, pipeline.Pipeline)
+        self.assertEqual(builtincmd._job_command(job), "sleep 5 | sleep 5")
+        os.killpg(os.getpgid(job.pid), signal.SIGKILL)
+        self.assertEqual(job.wait(), 128 + signal.SIGKILL)
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_pipeline_is_faster(self, _isatty):
+        """Per-line latency of the direct and bash pipelines."""
+        direct = _latency("seq 3 | tr 1 X")
+        with patch.object(utils, "_direct_pipeline_args", return_value=None):
+            bash = _latency("seq 3 | tr 1 X")
+        self.assertGreaterEqual(
+            bash / direct,
+            MIN_SPEEDUP,
+            f"direct {direct * 1000:.2f}ms vs bash -c {bash * 1000:.2f}ms per line",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
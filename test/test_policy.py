@@ -265,9 +265,9 @@ class TestPolicy(unittest.TestCase):
         )
         self.assertEqual([r["key"] for r in grouped["user:bleh"]], ["umask"])
 
-    @patch("lshell.policy.grp.getgrall")
-    @patch("lshell.policy.grp.getgrgid")
-    @patch("lshell.policy.pwd.getpwnam")
+    @patch("lshell.groupcache.grp.getgrall")
+    @patch("lshell.groupcache.grp.getgrgid")
+    @patch("lshell.groupcache.pwd.getpwnam")
     def test_resolve_user_groups_auto_lookup(
         self, mock_getpwnam, mock_getgrgid, mock_getgrall
     ):
@@ -0,0 +1,124 @@
+"""Benchmark of policy-show configuration loading on a 10k-section config."""
+
+import configparser
+import glob
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from lshell import policy
+
+INCLUDE_FILES = 100
+SECTIONS_PER_FILE = 100
+# typical speedup is 2.5x; keep headroom for noisy runners. Timings depend
+# on the machine, so speedups are only checked when LSHELL_BENCHMARKS=1.
+MIN_SPEEDUP = 1.5
+
+
+def _legacy_read_config_with_sources(configfile):
+    """Reference two-pass loader: one combined parse, then one parse per file."""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(configfile)
+    include_dir = parser.get("global", "include_dir")
+
+    parser = configparser.ConfigParser(interpolation=None)
+    include_files = glob.glob(f"{include_dir}*")
+    read_files = [configfile] + include_files
+    parser.read(read_files)
+
+    key_sources = {}
+    for file_path in read_files:
+        file_parser = configparser.ConfigParser(interpolation=None)
+        file_parser.read(file_path)
+        for section in file_parser.sections():
+            for key, _ in file_parser.items(section):
+                key_sources[(section, key)] = file_path
+    return parser, include_files, key_sources
+
+
+def _best_time(function, *args, runs=3):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class TestPolicyLoadBenchmark(unittest.TestCase):
+    """Single-pass loading matches the two-pass loader and is faster."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp(prefix="lshell-policy-bench-")
+        include_dir = os.path.join(cls.tmpdir, "lshell.d")
+        os.mkdir(include_dir)
+        cls.configfile = os.path.join(cls.tmpdir, "lshell.conf")
+        with open(cls.configfile, "w", encoding="utf-8") as handle:
+            handle.write(
+                "[global]\n"
+                f"logpath : {cls.tmpdir}\n"
+                f"include_dir : {include_dir}/\n"
+                "\n"
+                "[default]\n"
+                "allowed : ['ls']\n"
+                "forbidden : [';']\n"
+                "warning_counter : 2\n"
+                "strict : 0\n"
+            )
+        for file_number in range(INCLUDE_FILES):
+            path = os.path.join(include_dir, f"users-{file_number:03d}.conf")
+            with open(path, "w", encoding="utf-8") as handle:
+                if file_number == 0:
+                    handle.write("[DEFAULT]\numask : 0077\n\n")
+                for section_number in range(SECTIONS_PER_FILE):
+                    handle.write(
+                        f"[user{file_number:03d}{section_number:03d}]\n"
+                        "allowed : + ['cat', 'head']\n"
+                        "warning_counter : 3\n"
+                        "\n"
+                    )
+                if file_number:
+                    # override a section defined in the previous file
+                    handle.write(f"[user{file_number - 1:03d}000]\nstrict : 1\n\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+
+    def test_matches_two_pass_loader(self):
+        """Merged sections and key provenance are unchanged."""
+        config, include_files, key_sources = policy._read_config_with_sources(
+            self.configfile
+        )
+        expected_parser, expected_files, expected_sources = (
+            _legacy_read_config_with_sources(self.configfile)
+        )
+        self.assertEqual(include_files, expected_files)
+        self.assertEqual(key_sources, expected_sources)
+        self.assertEqual(list(config), expected_parser.sections())
+        for section in expected_parser.sections():
+            self.assertEqual(
+                list(config[section].items()), expected_parser.items(section)
+            )
+        self.assertEqual(len(config), INCLUDE_FILES * SECTIONS_PER_FILE + 2)
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_single_pass_is_faster(self):
+        """Loading 10k sections is clearly faster than with the two-pass loader."""
+        legacy = _best_time(_legacy_read_config_with_sources, self.configfile)
+        single_pass = _best_time(policy._read_config_with_sources, self.configfile)
+        self.assertGreaterEqual(
+            legacy / single_pass,
+            MIN_SPEEDUP,
+            f"single pass {single_pass:.3f}s vs two-pass {legacy:.3f}s",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
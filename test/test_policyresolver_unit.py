@@ -0,0 +1,155 @@
+"""Unit tests for the shared policy resolver."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lshell import configschema
+from lshell import policy
+from lshell import policyresolver
+
+
+SECTIONS = {
+    "default": {"allowed": "['ls', 'echo']", "warning_counter": "2"},
+    "grp:ops": {"allowed": "+ ['cat'] - ['echo']", "strict": "1"},
+    "alice": {"allowed": "+ ['vim']"},
+    "bob": {"allowed": "- ['missing']", "warning_counter": "5"},
+}
+
+
+def _allowed(resolution):
+    return sorted(
+        configschema.parse_config_value(resolution.conf_raw["allowed"], "allowed")
+    )
+
+
+class TestPolicyResolver(unittest.TestCase):
+    """Section chains are merged once and shared between users."""
+
+    def test_merge_operators(self):
+        """+/- operators apply in precedence order."""
+        resolution = policyresolver.PolicyResolver(SECTIONS).resolve(
+            ["default", "grp:ops", "alice"]
+        )
+        self.assertEqual(_allowed(resolution), ["cat", "ls", "vim"])
+        self.assertEqual(resolution.conf_raw["strict"], "1")
+        self.assertEqual(resolution.applied_sections, ["default", "grp:ops", "alice"])
+        self.assertEqual(
+            [event["op"] for event in resolution.trace if event["key"] == "allowed"],
+            ["set", "+", "-", "+"],
+        )
+
+    def test_shared_chain_prefix_is_reused(self):
+        """Users sharing default and grp:ops only merge their own section."""
+        resolver = policyresolver.PolicyResolver(SECTIONS)
+        alice = resolver.resolve(["default", "grp:ops", "alice"])
+        self.assertEqual((resolver.hits, resolver.misses), (0, 3))
+
+        bob = resolver.resolve(["default", "grp:ops", "bob"])
+        self.assertEqual((resolver.hits, resolver.misses), (2, 4))
+        self.assertEqual(_allowed(bob), ["cat", "ls"])
+        self.assertEqual(bob.warnings, ["-['missing'] ignored in 'allowed' list."])
+        self.assertEqual(alice.warnings, [])
+
+    def test_results_are_independent(self):
+        """Changing a returned resolution does not alter the memo."""
+        resolver = policyresolver.PolicyResolver(SECTIONS)
+        first = resolver.resolve(["default", "alice"])
+        first.conf_raw["allowed"] = "[]"
+        first.trace.clear()
+        second = resolver.resolve(["default", "alice"])
+        self.assertEqual(_allowed(second), ["echo", "ls", "vim"])
+        self.assertEqual(len(second.trace), 3)
+
+    def test_missing_sections_are_skipped(self):
+        """Sections absent from the configuration do not break the memo."""
+        resolver = policyresolver.PolicyResolver(SECTIONS)
+        resolution = resolver.resolve(["default", "grp:none", "alice", "user:alice"])
+        self.assertEqual(resolution.applied_sections, ["default", "alice"])
+
+    def test_overrides_follow_each_section(self):
+        """Overrides, like command line options, win over every section."""
+        resolver = policyresolver.PolicyResolver(
+            SECTIONS, overrides=[("warning_counter", 9)]
+        )
+        resolution = resolver.resolve(["default", "bob"])
+        self.assertEqual(resolution.conf_raw["warning_counter"], 9)
+
+    def test_invalid_all_raises(self):
+        """'all' is only accepted for allowed."""
+        resolver = policyresolver.PolicyResolver(
+            {"default": {"allowed_shell_escape": "all"}}
+        )
+        with self.assertRaises(ValueError):
+            resolver.resolve(["default"])
+
+    def test_dependencies_survive_memo_hits(self):
+        """Cached prefixes still report the filesystem state they read."""
+        tmpdir = tempfile.mkdtemp(prefix="lshell-resolver-")
+        self.addCleanup(shutil.rmtree, tmpdir, True)
+        sections = {
+            "default": {"path": f"['{tmpdir}']"},
+            "alice": {"path": "+ ['/tmp']"},
+            "bob": {"strict": "1"},
+        }
+        resolver = policyresolver.PolicyResolver(sections)
+        resolver.resolve(["default", "alice"])
+        dependencies = resolver.resolve(["default", "bob"]).dependencies
+        self.assertEqual(
+            dependencies,
+            [["glob", tmpdir, [[tmpdir, os.path.realpath(tmpdir)]]]],
+        )
+
+
+class TestPolicyShowResolver(unittest.TestCase):
+    """policy-show can share one resolver across users."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="lshell-resolver-")
+        self.configfile = os.path.join(self.tmpdir, "lshell.conf")
+        with open(self.configfile, "w", encoding="utf-8") as handle:
+            handle.write(
+                "[global]\n"
+                f"logpath : {self.tmpdir}\n"
+                "\n"
+                "[default]\n"
+                "allowed : ['ls']\n"
+                "forbidden : [';']\n"
+                "warning_counter : 2\n"
+                "strict : 0\n"
+                "\n"
+                "[grp:ops]\n"
+                "allowed : + ['cat']\n"
+                "\n"
+                "[alice]\n"
+                "allowed : + ['vim']\n"
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_bulk_resolution_reuses_group_chain(self):
+        """Resolving users of the same group merges the group chain once."""
+        loaded = policy.load_policy_config(self.configfile)
+        with patch.object(
+            policyresolver.PolicyResolver,
+            "_merge_section",
+            autospec=True,
+            side_effect=policyresolver.PolicyResolver._merge_section,
+        ) as mock_merge:
+            alice = policy.resolve_policy(self.configfile, "alice", ["ops"], loaded)
+            bob = policy.resolve_policy(self.configfile, "bob", ["ops"], loaded)
+        merged = [call.args[2] for call in mock_merge.call_args_list]
+        self.assertEqual(merged, ["default", "grp:ops", "alice"])
+        self.assertIn("vim", alice["policy"]["allowed"])
+        self.assertEqual(bob["applied_sections"], ["default", "grp:ops"])
+        self.assertEqual(
+            bob["policy"]["allowed"],
+            policy.resolve_policy(self.configfile, "bob", ["ops"])["policy"]["allowed"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
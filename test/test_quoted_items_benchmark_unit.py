@@ -0,0 +1,109 @@
+"""Worst-case benchmark of the quoted item extraction of check_secure."""
+
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from lshell import fsmemo
+from lshell import lexer
+from lshell import sec
+from lshell.checkconfig import CheckConfig
+
+CONFIG = f"{os.path.dirname(os.path.realpath(__file__))}/../etc/lshell.conf"
+
+# hostile patterns, repeated up to the size of the line
+PATTERNS = {
+    "open double quotes": 'x"',
+    "open single quotes": "x'",
+    "alternating quotes": "a'b\"",
+    "quoted words": '"a" ',
+    "distinct quoted words": None,
+    "assignments": '="=',
+    "escaped quotes": '"\\"',
+}
+SMALL_KB = 2
+LARGE_KB = 64
+# time per kilobyte may grow this much from SMALL_KB to LARGE_KB input;
+# a quadratic extraction grows by LARGE_KB / SMALL_KB = 32. Timings depend on
+# the machine, so the growth is only checked when LSHELL_BENCHMARKS=1.
+MAX_GROWTH = 4
+
+
+def _line(pattern, kilobytes):
+    size = kilobytes * 1024
+    if pattern is None:
+        words = []
+        total = 0
+        number = 0
+        while total < size:
+            word = f'"/tmp/{number}" '
+            words.append(word)
+            total += len(word)
+            number += 1
+        return "ls " + "".join(words)
+    return "ls " + pattern * (size // len(pattern))
+
+
+def _per_kb(line, kilobytes, runs=3):
+    best = None
+    for _ in range(runs):
+        lexer.parse.cache_clear()
+        lexer.parse_segment.cache_clear()
+        start = time.perf_counter()
+        sec._quoted_items(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / kilobytes
+
+
+class TestQuotedItemsBenchmark(unittest.TestCase):
+    """Quoted items are extracted in time linear in the line length."""
+
+    @unittest.skipUnless(
+        os.environ.get("LSHELL_BENCHMARKS") == "1", "set LSHELL_BENCHMARKS=1"
+    )
+    def test_bounded_time_per_kilobyte(self):
+        """Hostile lines cost about the same per kilobyte at any size."""
+        for name, pattern in PATTERNS.items():
+            with self.subTest(pattern=name):
+                small = _per_kb(_line(pattern, SMALL_KB), SMALL_KB)
+                large = _per_kb(_line(pattern, LARGE_KB), LARGE_KB)
+                self.assertLessEqual(
+                    large / small,
+                    MAX_GROWTH,
+                    f"{name}: {small * 1000:.3f}ms/KB at {SMALL_KB}KB, "
+                    f"{large * 1000:.3f}ms/KB at {LARGE_KB}KB",
+                )
+
+    def test_each_quoted_value_is_probed_once(self):
+        """Repeated quoted words do not multiply filesystem checks."""
+        line = "ls " + '"/nonexistent" ' * 2000 + "'/nonexistent'"
+        conf = CheckConfig([f"--config={CONFIG}", "--quiet=1"]).returnconf()
+        with patch.object(fsmemo, "exists", return_value=False) as mock:
+            sec.check_secure(line, conf)
+        self.assertEqual(mock.call_count, 1)
+
+    def test_quoted_items(self):
+        """Every quoted word is found, across segments, by its value."""
+        self.assertEqual(
+            sec._quoted_items('cat "/etc/a" \'/etc/b\' && ls "/etc/a" x"y" plain'),
+            ["/etc/a", "/etc/b", "xy"],
+        )
+        self.assertEqual(sec._quoted_items('ls "unterminated'), [])
+
+    def test_nested_quoted_spans(self):
+        """Paths quoted inside a quoted script are checked too."""
+        line = "awk 'BEGIN {system(\"/usr/bin/id\")}' \"a 'b \\\"c\\\"'\""
+        items = sec._quoted_items(line)
+        self.assertIn("/usr/bin/id", items)
+        self.assertIn("c", items)
+        conf = CheckConfig(
+            [f"--config={CONFIG}", "--quiet=1", "--allowed=+['awk']"]
+        ).returnconf()
+        ret, _ = sec.check_secure("awk 'BEGIN {system(\"/usr/bin/id\")}'", conf)
+        self.assertEqual(ret, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
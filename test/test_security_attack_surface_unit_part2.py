@@ -415,10 +415,10 @@ class TestAttackSurfacePart2(unittest.TestCase):
         self.assertEqual(ret, 1)
 
     @patch("lshell.sec._safe_realpath", side_effect=lambda path: path)
-    @patch("lshell.sec.glob.iglob")
-    def test_expand_shell_wildcards_rejects_excessive_matches(self, mock_iglob, _mock_realpath):
+    @patch("lshell.sec.wildcard.iter_matches")
+    def test_expand_shell_wildcards_rejects_excessive_matches(self, mock_iter, _mock_realpath):
         """Massive wildcard expansions should fail closed instead of exhausting memory."""
-        mock_iglob.return_value = (
+        mock_iter.return_value = (
             f"/tmp/match-{index}" for index in range(sec.MAX_WILDCARD_MATCHES + 1)
         )
         self.assertEqual(sec.expand_shell_wildcards("/tmp/**"), [])
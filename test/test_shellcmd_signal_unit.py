@@ -42,7 +42,7 @@ class TestShellCmdSignalUnit(unittest.TestCase):
                 "lshell.shellcmd.utils.updateprompt",
                 return_value="unit-prompt$ ",
             ) as mock_prompt:
-                with patch("lshell.shellcmd.readline.write_history_file"):
+                with patch("readline.write_history_file"):
                     with patch("lshell.shellcmd.sys.exit", side_effect=SystemExit):
                         with self.assertRaises(SystemExit):
                             shell.cmdloop()
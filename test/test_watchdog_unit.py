@@ -0,0 +1,151 @@
+"""Single watchdog thread serving the command_timeout deadlines."""
+
+import os
+import signal
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from lshell import builtincmd
+from lshell import utils
+from lshell import watchdog
+
+
+def _watchdog_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "lshell-watchdog"]
+
+
+def _wait_for(predicate, timeout=5):
+    """Poll predicate until it is true or timeout seconds passed."""
+    end = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestWatchdog(unittest.TestCase):
+    """Deadlines run in order, once, unless cancelled."""
+
+    def test_callbacks_run_in_deadline_order(self):
+        """Deadlines scheduled out of order still run by time."""
+        dog = watchdog.Watchdog()
+        ran = []
+        for delay in (0.3, 0.1, 0.2):
+            dog.schedule(delay, lambda delay=delay: ran.append(delay))
+        self.assertTrue(_wait_for(lambda: len(ran) == 3))
+        self.assertEqual(ran, [0.1, 0.2, 0.3])
+        self.assertEqual(dog.pending(), 0)
+
+    def test_earlier_deadline_wakes_the_thread(self):
+        """A new earliest deadline does not wait for the previous one."""
+        dog = watchdog.Watchdog()
+        ran = threading.Event()
+        dog.schedule(60, lambda: None)
+        start = time.monotonic()
+        dog.schedule(0.05, ran.set)
+        self.assertTrue(ran.wait(5))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_cancelled_deadlines_do_not_run(self):
+        """cancel() before the deadline, the callback never runs."""
+        dog = watchdog.Watchdog()
+        ran = []
+        deadline = dog.schedule(0.05, lambda: ran.append("cancelled"))
+        dog.schedule(0.1, lambda: ran.append("kept"))
+        deadline.cancel()
+        deadline.cancel()
+        self.assertTrue(_wait_for(lambda: ran))
+        time.sleep(0.1)
+        self.assertEqual(ran, ["kept"])
+
+    def test_cancelled_deadlines_are_dropped(self):
+        """The heap does not grow with the cancelled deadlines."""
+        dog = watchdog.Watchdog()
+        for _ in range(500):
+            dog.schedule(60, lambda: None).cancel()
+        self.assertEqual(dog.pending(), 0)
+        self.assertLessEqual(len(dog._heap), 1)
+
+    def test_failing_callback_keeps_the_thread(self):
+        """An exception in a callback does not stop later deadlines."""
+        dog = watchdog.Watchdog()
+        ran = threading.Event()
+        dog.schedule(0.01, lambda: 1 / 0)
+        dog.schedule(0.05, ran.set)
+        self.assertTrue(ran.wait(5))
+
+    def test_one_thread_for_many_deadlines(self):
+        """Hundreds of deadlines share one thread."""
+        dog = watchdog.Watchdog()
+        before = len(_watchdog_threads())
+        deadlines = [dog.schedule(60, lambda: None) for _ in range(300)]
+        self.assertEqual(len(_watchdog_threads()), before + 1)
+        self.assertEqual(dog.pending(), 300)
+        for deadline in deadlines:
+            deadline.cancel()
+
+
+class TestExecTimeouts(unittest.TestCase):
+    """exec_cmd watches its commands through the session watchdog."""
+
+    def tearDown(self):
+        for job in builtincmd.BACKGROUND_JOBS:
+            if job.poll() is None:
+                os.killpg(os.getpgid(job.pid), signal.SIGKILL)
+                job.wait()
+        builtincmd.BACKGROUND_JOBS.clear()
+
+    def test_background_jobs_share_the_watchdog(self):
+        """No thread per background job, and the deadline is cancelled
+        when the job is reaped.
+        """
+        conf = {"command_timeout": 60}
+        before = len(_watchdog_threads())
+        with patch("builtins.print"), patch.object(
+            threading, "Timer", side_effect=AssertionError("one thread per job")
+        ):
+            for _ in range(20):
+                utils.exec_cmd("sleep 60", background=True, conf=conf)
+        self.assertLessEqual(len(_watchdog_threads()), before + 1)
+        pending = watchdog.get().pending()
+        job = builtincmd.BACKGROUND_JOBS.get(1)
+        os.killpg(os.getpgid(job.pid), signal.SIGKILL)
+        job.wait()
+        with patch("builtins.print"):
+            builtincmd.check_background_jobs()
+        self.assertEqual(watchdog.get().pending(), pending - 1)
+
+    def test_background_timeout_is_reported(self):
+        """The timeout kills the job and emits the same events."""
+        conf = {"command_timeout": 1}
+        log = Mock()
+        with patch("builtins.print"):
+            utils.exec_cmd("sleep 5", background=True, conf=conf, log=log)
+        job = builtincmd.BACKGROUND_JOBS.get(builtincmd.BACKGROUND_JOBS.current())
+        with patch("sys.stderr") as stderr:
+            self.assertTrue(_wait_for(lambda: stderr.write.called))
+        job.wait()
+        self.assertTrue(job.lshell_timeout_triggered)
+        self.assertEqual(log.warning.call_count, 1)
+        self.assertEqual(builtincmd.get_job_status(job), "Timed Out")
+        self.assertIn("timed out after 1s: sleep 5", stderr.write.call_args[0][0])
+
+    def test_foreground_timeout_is_reported_once(self):
+        """The foreground command reports its own timeout, with status 124."""
+        log = Mock()
+        with patch("sys.stderr") as stderr:
+            retcode = utils.exec_cmd("sleep 5", conf={"command_timeout": 1}, log=log)
+        self.assertEqual(retcode, 124)
+        self.assertEqual(log.warning.call_count, 1)
+        self.assertEqual(stderr.write.call_count, 1)
+
+    def test_foreground_deadline_is_cancelled(self):
+        """A command ending in time leaves no deadline behind."""
+        pending = watchdog.get().pending()
+        self.assertEqual(utils.exec_cmd("sleep 0", conf={"command_timeout": 60}), 0)
+        self.assertEqual(watchdog.get().pending(), pending)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Unit tests for the bounded wildcard expansion."""
+
+import glob
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lshell import sec
+from lshell import wildcard
+
+
+PATTERNS = [
+    "*",
+    "*/",
+    "a*",
+    ".*",
+    "**",
+    "**/",
+    "**/*.log",
+    "a/**",
+    "a/**/f*",
+    "*/b/*",
+    "a/b/c.log",
+    "a/[bc]/?.log",
+    "nomatch*",
+]
+
+
+class TestIterMatches(unittest.TestCase):
+    """iter_matches() expands like glob.iglob(recursive=True)."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="lshell-wildcard-")
+        self.root = self.tmpdir.name
+        for directory in ["a/b", "a/c", "a/.hidden", "d"]:
+            os.makedirs(os.path.join(self.root, directory))
+        for path in ["a/b/c.log", "a/c/f.txt", "a/.hidden/f.log", "d/e.log", ".dot"]:
+            with open(os.path.join(self.root, path), "w", encoding="utf-8"):
+                pass
+        os.symlink(os.path.join(self.root, "d"), os.path.join(self.root, "a/link"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_matches_glob(self):
+        """Absolute and relative patterns yield the same paths as glob."""
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.root)
+            for pattern in PATTERNS:
+                for prefix in ["", self.root + os.sep]:
+                    self.assertEqual(
+                        sorted(wildcard.iter_matches(prefix + pattern, wildcard.Budget())),
+                        sorted(glob.glob(prefix + pattern, recursive=True)),
+                        prefix + pattern,
+                    )
+        finally:
+            os.chdir(cwd)
+
+    def test_max_dirs_budget(self):
+        """Listing more directories than allowed raises BudgetExceeded."""
+        budget = wildcard.Budget(max_dirs=2)
+        with self.assertRaises(wildcard.BudgetExceeded):
+            list(wildcard.iter_matches(self.root + "/**/nomatch*", budget))
+
+    def test_timeout_budget(self):
+        """A walk past its deadline raises BudgetExceeded."""
+        with patch.object(wildcard.time, "monotonic", side_effect=[0, 0, 5, 5]):
+            budget = wildcard.Budget(timeout=1)
+            with self.assertRaises(wildcard.BudgetExceeded):
+                list(wildcard.iter_matches(self.root + "/**/nomatch*", budget))
+
+    def test_pruned_directory_is_not_walked(self):
+        """A pruned directory is yielded in place of its content."""
+        denied = os.path.realpath(os.path.join(self.root, "a"))
+        seen = []
+
+        def prune(path):
+            seen.append(path)
+            return path == denied
+
+        matches = list(
+            wildcard.iter_matches(self.root + "/a/**/*.log", wildcard.Budget(), prune)
+        )
+        self.assertEqual(matches, [self.root + "/a"])
+        self.assertEqual(seen, [denied])
+
+
+class TestExpandShellWildcards(unittest.TestCase):
+    """expand_shell_wildcards() fails closed over its budget."""
+
+    def test_budget_exceeded_fails_closed(self):
+        """A walk over wildcard_max_dirs returns no candidates."""
+        with tempfile.TemporaryDirectory(prefix="lshell-wildcard-") as tmpdir:
+            for index in range(5):
+                os.makedirs(os.path.join(tmpdir, f"dir{index}"))
+            conf = {"wildcard_max_dirs": 3, "wildcard_timeout": 0}
+            self.assertEqual(sec.expand_shell_wildcards(tmpdir + "/**/x*", conf), [])
+            conf["wildcard_max_dirs"] = 0
+            self.assertEqual(
+                sec.expand_shell_wildcards(tmpdir + "/**/x*", conf),
+                [tmpdir + "/**/x*"],
+            )
+
+    def test_denied_subtree_is_refused_without_walk(self):
+        """Wildcards under a denied directory expand to the directory."""
+        with tempfile.TemporaryDirectory(prefix="lshell-wildcard-") as tmpdir:
+            tmpdir = os.path.realpath(tmpdir)
+            os.makedirs(os.path.join(tmpdir, "allowed"))
+            os.makedirs(os.path.join(tmpdir, "denied", "sub"))
+            conf = {"path": [os.path.join(tmpdir, "allowed") + "|", ""]}
+            with patch.object(wildcard, "_listdir", wraps=wildcard._listdir) as mock:
+                candidates = sec.expand_shell_wildcards(tmpdir + "/denied/**/*", conf)
+            self.assertEqual(candidates, [os.path.join(tmpdir, "denied")])
+            mock.assert_not_called()
+            ret, _conf = sec.check_path(
+                f"ls {tmpdir}/denied/**/*", dict(conf, strict=0), completion=1
+            )
+            self.assertEqual(ret, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()